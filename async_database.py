@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional
+import config
+import metrics
+from database import ZinDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncZinDatabase:
+    """
+    Асинхронный интерфейс к базе данных ЦДЗ для бота
+    
+    Методы ZinDatabase выполняются в ограниченном пуле потоков, у каждого
+    потока свое соединение только для чтения, поэтому медленный запрос не
+    блокирует цикл событий. Каждый вызов ограничен по времени: при таймауте
+    или отмене корутины выполняемый SQLite запрос прерывается через
+    Connection.interrupt(), и поток сразу освобождается.
+    
+    При таймауте вызывается asyncio.TimeoutError, при отмене -
+    asyncio.CancelledError; остальные ошибки, как и в ZinDatabase,
+    логируются и дают пустой результат. Время, ошибки и таймауты вызовов
+    попадают в метрики запросов (metrics.py); при config.METRICS_HTTP_PORT
+    они отдаются по HTTP в формате Prometheus.
+    
+    При config.SNAPSHOT_ENABLED запросы чтения обслуживает снимок в памяти
+    (snapshot.SnapshotDatabase), который сам обновляется, когда парсер
+    публикует новое поколение БД. Вызовы снимка выполняются без SQLite и
+    прервать их нельзя: по таймауту корутина получает asyncio.TimeoutError
+    сразу, а поток пула освобождается, когда вызов доработает (обычно
+    миллисекунды).
+    
+    Общий экземпляр для бота - get_async_db().
+    """
+    
+    def __init__(self, db_path: str = None, max_workers: int = None, timeout: float = None):
+        if config.SNAPSHOT_ENABLED:
+            from snapshot import SnapshotDatabase
+            self._db = SnapshotDatabase(db_path)
+        else:
+            self._db = ZinDatabase(db_path)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or config.ASYNC_DB_WORKERS,
+                                            thread_name_prefix="zin-db")
+        self.timeout = timeout or config.ASYNC_DB_TIMEOUT
+        metrics.start_http_server()
+    
+    def _interruptible(self, method_name: str) -> bool:
+        """Выполняется ли метод через SQLite (его можно прервать Connection.interrupt())"""
+        serves_from_snapshot = getattr(self._db, 'serves_from_snapshot', None)
+        return serves_from_snapshot is None or not serves_from_snapshot(method_name)
+    
+    async def _call(self, method_name: str, *args, timeout: float = None):
+        """Выполняет метод ZinDatabase в пуле с таймаутом и прерыванием запроса"""
+        loop = asyncio.get_running_loop()
+        state = {'conn': None, 'done': False, 'lock': threading.Lock()}
+        
+        interruptible = self._interruptible(method_name)
+        
+        def run():
+            if interruptible:
+                with state['lock']:
+                    state['conn'] = self._db.get_connection()
+            try:
+                return getattr(self._db, method_name)(*args)
+            finally:
+                with state['lock']:
+                    state['done'] = True
+        
+        future = loop.run_in_executor(self._executor, run)
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Прерываем запрос, только если поток все еще выполняет именно его:
+            # после завершения то же соединение может обслуживать другой вызов
+            with state['lock']:
+                if state['conn'] is not None and not state['done']:
+                    state['conn'].interrupt()
+            if isinstance(e, asyncio.TimeoutError):
+                if interruptible:
+                    logger.warning(f"Таймаут запроса {method_name}{args!r}: запрос прерван")
+                else:
+                    logger.warning(f"Таймаут запроса {method_name}{args!r} к снимку БД: "
+                                   f"вызов не прерывается и дорабатывает в пуле")
+                if self._db.metrics is not None:
+                    self._db.metrics.count_timeout(self._db.metrics_backend, method_name)
+            raise
+    
+    async def search_questions(self, query: str, limit: int = 20, timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.search_questions"""
+        return await self._call('search_questions', query, limit, timeout=timeout)
+    
+    async def search_fuzzy(self, query: str, limit: int = 20, timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.search_fuzzy"""
+        return await self._call('search_fuzzy', query, limit, timeout=timeout)
+    
+    async def search_semantic(self, query: str, limit: int = 20, timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.search_semantic"""
+        return await self._call('search_semantic', query, limit, timeout=timeout)
+    
+    async def search_unique_questions(self, query: str, limit: int = 20, timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.search_unique_questions"""
+        return await self._call('search_unique_questions', query, limit, timeout=timeout)
+    
+    async def search_by_keywords(self, keywords: List[str], limit: int = 20,
+                                 timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.search_by_keywords"""
+        return await self._call('search_by_keywords', keywords, limit, timeout=timeout)
+    
+    async def search_by_any_keywords(self, keywords: List[str], limit: int = 20,
+                                     timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.search_by_any_keywords"""
+        return await self._call('search_by_any_keywords', keywords, limit, timeout=timeout)
+    
+    async def get_test_by_id(self, test_id: int, timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.get_test_by_id"""
+        return await self._call('get_test_by_id', test_id, timeout=timeout)
+    
+    async def get_random_questions(self, count: int = 5, seed: Optional[int] = None,
+                                   timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.get_random_questions"""
+        return await self._call('get_random_questions', count, seed, timeout=timeout)
+    
+    async def get_similar_questions(self, test_id: int, question_idx: int, limit: int = 20,
+                                    timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.get_similar_questions"""
+        return await self._call('get_similar_questions', test_id, question_idx, limit, timeout=timeout)
+    
+    async def get_statistics(self, timeout: float = None) -> dict:
+        """Асинхронный ZinDatabase.get_statistics"""
+        return await self._call('get_statistics', timeout=timeout)
+    
+    async def get_tests_count_by_date(self, timeout: float = None) -> List[Tuple]:
+        """Асинхронный ZinDatabase.get_tests_count_by_date"""
+        return await self._call('get_tests_count_by_date', timeout=timeout)
+    
+    async def get_test_html_content(self, test_id: int, timeout: float = None) -> Optional[str]:
+        """Асинхронный ZinDatabase.get_test_html_content"""
+        return await self._call('get_test_html_content', test_id, timeout=timeout)
+    
+    async def get_test_html_file_path(self, test_id: int, timeout: float = None) -> Optional[str]:
+        """Асинхронный ZinDatabase.get_test_html_file_path"""
+        return await self._call('get_test_html_file_path', test_id, timeout=timeout)
+    
+    def get_pool_stats(self) -> dict:
+        """Статистика соединений пула (см. ZinDatabase.get_pool_stats)"""
+        return self._db.get_pool_stats()
+    
+    def get_query_metrics(self) -> dict:
+        """Сводка метрик запросов по методам (см. ZinDatabase.get_query_metrics)"""
+        return self._db.get_query_metrics()
+    
+    def close(self):
+        """Останавливает пул потоков и закрывает соединения"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._db.close()
+
+
+_async_db = None
+_async_db_lock = threading.Lock()
+
+
+def get_async_db() -> AsyncZinDatabase:
+    """
+    Общий экземпляр AsyncZinDatabase для бота
+    
+    Создается при первом обращении, а не при импорте модуля: пул потоков,
+    сервер метрик и снимок БД (config.SNAPSHOT_ENABLED) запускаются только
+    тогда, когда база действительно нужна.
+    """
+    global _async_db
+    with _async_db_lock:
+        if _async_db is None:
+            _async_db = AsyncZinDatabase()
+        return _async_db
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарки парсера и базы данных на синтетических данных.
+
+corpus.py генерирует страницы тестов в формате Next.js со всеми видами
+ответов, которые понимает parse_test_html, и базы данных заданного
+размера. Наборы bench_*.py написаны для pytest-benchmark и запускаются
+явно (в обычный прогон pytest они не попадают):
+
+    pip install pytest pytest-benchmark
+    pytest benchmarks/bench_parse.py benchmarks/bench_db_insert.py benchmarks/bench_search.py
+    pytest benchmarks/bench_download.py   # нужен aiohttp
+    pytest benchmarks/bench_semantic.py   # нужен numpy
+    pytest benchmarks/bench_snapshot.py   # нужен numpy, сверяет снимок с ZinDatabase
+    pytest benchmarks/bench_export.py     # Parquet и Arrow - нужен pyarrow
+
+Модульные тесты с проверками поведения (журнал скачивания, кодеки
+упакованного хранилища, export --since, AdaptiveBackoff и др.) лежат в
+каталоге tests/ и запускаются обычным прогоном: python -m pytest -q
+
+Асинхронное скачивание проверяется на сервере-заглушке stub_server.py,
+который можно запустить и отдельно (см. config.TEST_URL_TEMPLATE).
+
+Размеры БД для поиска задаются переменной окружения ZIN_BENCH_ROWS
+(по умолчанию "10000,100000,1000000"), построенные базы кэшируются в
+ZIN_BENCH_CACHE (по умолчанию .bench_cache).
+"""
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""Скорость записи результатов парсинга в БД (BatchWriter, с триггерами индексов)"""
+
+import os
+import sqlite3
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import html_parser
+from benchmarks.corpus import generate_tests
+
+INSERT_ROWS = int(os.environ.get("ZIN_BENCH_INSERT_ROWS", "12000"))
+
+
+@pytest.fixture(scope="module")
+def tests():
+    return list(generate_tests(INSERT_ROWS, seed=1))
+
+
+@pytest.mark.parametrize("batch_size", [50, 500, 5000])
+@pytest.mark.parametrize("bulk_load", [False, True], ids=["default", "bulk_pragmas"])
+def test_batch_writer(benchmark, tmp_path, tests, batch_size, bulk_load):
+    counter = iter(range(1_000_000))
+    
+    def setup():
+        conn = sqlite3.connect(str(tmp_path / f"insert_{next(counter)}.db"))
+        html_parser.init_db(conn, bulk_load=bulk_load)
+        return (conn,), {}
+    
+    def insert(conn):
+        writer = html_parser.BatchWriter(conn, batch_size=batch_size, flush_interval=3600)
+        for test_id, questions_answers in tests:
+            writer.add(test_id, questions_answers, f"html_files/test_{test_id}.html")
+        writer.flush()
+        conn.close()
+        return writer.written_count
+    
+    benchmark.extra_info["rows"] = INSERT_ROWS
+    written = benchmark.pedantic(insert, setup=setup, rounds=3)
+    assert written == len(tests)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""Асинхронное скачивание (downloader.download_async) с сервера-заглушки stub_server.py"""
+
+import os
+import time
+import asyncio
+import importlib
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("aiohttp")
+
+import config
+import html_store
+from benchmarks.stub_server import StubServer
+
+PAGES = 200
+
+
+@pytest.fixture(scope="module")
+def downloader(tmp_path_factory):
+    # downloader.py при импорте открывает downloader.log в текущем каталоге
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("downloader"))
+    try:
+        return importlib.import_module("downloader")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server = StubServer(PAGES, errors={7: 429}).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path, stub):
+    """Отдельный каталог страниц и адрес заглушки на время теста"""
+    monkeypatch.setattr(config, "TEST_URL_TEMPLATE", stub.url_template)
+    monkeypatch.setattr(config, "HTML_STORAGE_BACKEND", "files")
+    monkeypatch.setattr(html_store, "_stores", {})
+    
+    def make(name):
+        directory = tmp_path / name
+        directory.mkdir()
+        monkeypatch.setattr(config, "HTML_STORAGE_DIR", str(directory))
+        html_store._stores.clear()
+        return directory
+    
+    return make
+
+
+def run_download(downloader, test_ids, concurrency=8, rate=1000.0):
+    journal = downloader.DownloadJournal()
+    try:
+        return asyncio.run(downloader.download_async(test_ids, journal, concurrency, rate)), journal
+    finally:
+        journal.close()
+
+
+def test_download_async(benchmark, downloader, storage, stub):
+    test_ids = [test_id for test_id in range(1, PAGES + 1) if test_id not in stub.errors]
+    counter = iter(range(1_000_000))
+    
+    def setup():
+        return (storage(f"round_{next(counter)}"),), {}
+    
+    def download(directory):
+        (downloaded, errors), _ = run_download(downloader, test_ids)
+        return directory, downloaded, errors
+    
+    benchmark.extra_info["pages"] = len(test_ids)
+    directory, downloaded, errors = benchmark.pedantic(download, setup=setup, rounds=3)
+    assert (downloaded, errors) == (len(test_ids), 0)
+    for test_id in test_ids[::17]:
+        assert (directory / f"test_{test_id}.html").read_text(encoding="utf-8") == stub.page(test_id)
+
+
+def test_download_server_error(downloader, storage, stub):
+    storage("errors")
+    (downloaded, errors), journal = run_download(downloader, list(range(1, 21)))
+    assert (downloaded, errors) == (19, 1)
+    assert journal.total_failed == 1
+    assert journal.last_processed == 20
+
+
+def test_save_does_not_block_event_loop(downloader, storage, stub, monkeypatch):
+    """Медленная запись страниц (диск, сжатие) не должна останавливать цикл событий"""
+    storage("slow_disk")
+    save = downloader.save_html_file
+    
+    def slow_save(*args):
+        time.sleep(0.05)
+        return save(*args)
+    
+    monkeypatch.setattr(downloader, "save_html_file", slow_save)
+    
+    async def main(journal):
+        lag = 0.0
+        task = asyncio.create_task(downloader.download_async(list(range(21, 41)), journal, 8, 1000.0))
+        while not task.done():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - started - 0.005)
+        return await task, lag
+    
+    journal = downloader.DownloadJournal()
+    try:
+        (downloaded, errors), lag = asyncio.run(main(journal))
+    finally:
+        journal.close()
+    assert (downloaded, errors) == (20, 0)
+    assert lag < 0.04
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""Выгрузка tests (export.py): все форматы при выгрузке в несколько пакетов и скорость"""
+
+import json
+import sqlite3
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import export
+from benchmarks.corpus import build_database
+
+ROWS = 2000
+CHUNK_SIZE = 500
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("export") / "tests.db")
+    build_database(path, ROWS)
+    return path
+
+
+def read_export(path, fmt):
+    """Строки выгрузки как список словарей"""
+    if fmt == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+    pa = pytest.importorskip("pyarrow")
+    if fmt == "parquet":
+        table = pa.parquet.read_table(path)
+    else:
+        with pa.ipc.open_file(path) as reader:
+            table = reader.read_all()
+    return table.to_pylist()
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow", "jsonl"])
+def test_export_chunks(db_path, tmp_path, fmt):
+    """Выгрузка в несколько пакетов читается целиком и совпадает с БД"""
+    if fmt != "jsonl":
+        pytest.importorskip("pyarrow")
+    output = str(tmp_path / f"tests.{fmt}")
+    result = export.export(output, fmt, db_path=db_path, chunk_size=CHUNK_SIZE)
+    assert result["rows"] == ROWS
+    
+    rows = read_export(output, fmt)
+    conn = sqlite3.connect(db_path)
+    try:
+        expected = conn.execute("""
+            SELECT test_id, question_idx, question, answer, html_file_path FROM tests
+            ORDER BY test_id, question_idx
+        """).fetchall()
+    finally:
+        conn.close()
+    assert [(row["test_id"], row["question_idx"], row["question"], row["answer"], row["html_file_path"])
+            for row in rows] == expected
+    assert not (tmp_path / f"tests.{fmt}.tmp").exists()
+
+
+def test_export_failure_removes_tmp(db_path, tmp_path, monkeypatch):
+    def broken_chunks(*args, **kwargs):
+        yield from []
+        raise sqlite3.OperationalError("disk I/O error")
+    
+    monkeypatch.setattr(export, "iter_chunks", broken_chunks)
+    with pytest.raises(sqlite3.OperationalError):
+        export.export(str(tmp_path / "tests.jsonl"), db_path=db_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_export_speed(benchmark, db_path, tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    output = str(tmp_path / f"tests.{fmt}")
+    result = benchmark(export.export, output, fmt, db_path=db_path)
+    assert result["rows"] == ROWS
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""Скорость парсинга страниц (страниц/с; байт/с - по extra_info["bytes"])"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import html_parser
+from benchmarks.corpus import ANSWER_SHAPES, generate_page
+
+BACKENDS = ["bs4"] + (["lxml"] if html_parser.lxml_html is not None else [])
+
+# Количество вопросов как у страниц, на которых отлаживался парсер (debug_parser.py)
+QUESTION_COUNTS = [1, 12, 17, 40]
+
+
+@pytest.mark.parametrize("questions", QUESTION_COUNTS)
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_parse_page(benchmark, backend, questions):
+    html, expected = generate_page(questions, questions)
+    benchmark.extra_info["bytes"] = len(html.encode("utf-8"))
+    assert benchmark(html_parser.parse_test_html, html, backend) == expected
+
+
+@pytest.mark.parametrize("shape", ANSWER_SHAPES)
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_parse_answer_shape(benchmark, backend, shape):
+    html, expected = generate_page(1, 12, shapes=[shape])
+    benchmark.extra_info["bytes"] = len(html.encode("utf-8"))
+    assert benchmark(html_parser.parse_test_html, html, backend) == expected
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_parse_with_stats(benchmark, backend):
+    """Накладные расходы сбора времени стадий (сравнить с test_parse_page[12])"""
+    from parse_stats import PageStats
+    html, expected = generate_page(12, 12)
+    assert benchmark(lambda: html_parser.parse_test_html(html, backend, PageStats())) == expected
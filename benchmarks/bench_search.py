@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+Скорость методов ZinDatabase на базах разного размера (ZIN_BENCH_ROWS).
+
+Кэш результатов отключен: измеряются сами запросы к SQLite.
+"""
+
+import sqlite3
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from database import ZinDatabase
+from benchmarks.corpus import WORDS
+
+
+@pytest.fixture(scope="module")
+def db(search_db_path):
+    database = ZinDatabase(search_db_path, cache=False)
+    yield database
+    database.close()
+
+
+@pytest.fixture(scope="module")
+def sample(search_db_path):
+    """Вопрос и тест из середины базы для запросов, у которых точно есть результаты"""
+    conn = sqlite3.connect(search_db_path)
+    try:
+        test_id, question_idx, question = conn.execute("""
+            SELECT test_id, question_idx, question FROM tests
+            WHERE rowid >= (SELECT MAX(rowid) / 2 FROM tests) AND question != ''
+            LIMIT 1
+        """).fetchone()
+    finally:
+        conn.close()
+    return {'test_id': test_id, 'question_idx': question_idx, 'question': question}
+
+
+def test_search_questions_phrase(benchmark, db, sample):
+    phrase = " ".join(sample['question'].split()[:3])
+    assert benchmark(db.search_questions, phrase)
+
+
+def test_search_questions_common_word(benchmark, db):
+    assert benchmark(db.search_questions, WORDS[0])
+
+
+def test_search_questions_rare_word(benchmark, db):
+    benchmark(db.search_questions, WORDS[-1])
+
+
+def test_search_by_keywords(benchmark, db, sample):
+    assert benchmark(db.search_by_keywords, sample['question'].split()[:2])
+
+
+def test_search_by_any_keywords(benchmark, db):
+    assert benchmark(db.search_by_any_keywords, [WORDS[5], WORDS[-1]])
+
+
+def test_search_fuzzy(benchmark, db, sample):
+    fragment = sample['question'][3:30]
+    assert benchmark(db.search_fuzzy, fragment)
+
+
+def test_search_unique_questions(benchmark, db, sample):
+    phrase = " ".join(sample['question'].split()[:3])
+    assert benchmark(db.search_unique_questions, phrase)
+
+
+def test_get_test_by_id(benchmark, db, sample):
+    assert benchmark(db.get_test_by_id, sample['test_id'])
+
+
+def test_get_similar_questions(benchmark, db, sample):
+    # Без таблицы question_clusters (clustering.py) измеряется путь с пустым результатом
+    benchmark(db.get_similar_questions, sample['test_id'], sample['question_idx'])
+
+
+def test_get_random_questions(benchmark, db):
+    assert len(benchmark(db.get_random_questions, 5)) == 5
+
+
+def test_get_statistics(benchmark, db):
+    assert benchmark(db.get_statistics)
+
+
+def test_get_tests_count_by_date(benchmark, db):
+    benchmark(db.get_tests_count_by_date)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""Семантический индекс (semantic_index.py): корректность оценок и скорость поиска"""
+
+import sqlite3
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("numpy")
+
+import semantic_index
+
+
+@pytest.fixture(scope="module")
+def index(search_db_path, tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("semantic_index"))
+    conn = sqlite3.connect(search_db_path)
+    try:
+        semantic_index.build_index(conn, directory)
+    finally:
+        conn.close()
+    return semantic_index.SemanticIndex(directory)
+
+
+@pytest.fixture(scope="module")
+def question(search_db_path):
+    conn = sqlite3.connect(search_db_path)
+    try:
+        return conn.execute("SELECT question FROM questions WHERE question != '' LIMIT 1 OFFSET 100").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_self_similarity(index, search_db_path):
+    """Вопрос из индекса находит сам себя со сходством ~1"""
+    conn = sqlite3.connect(search_db_path)
+    try:
+        check = semantic_index.check_self_similarity(index, conn, sample=50)
+    finally:
+        conn.close()
+    assert check['checked'] > 0
+    assert check['failed'] == []
+
+
+def test_search_semantic(benchmark, index, question):
+    hits = benchmark(index.search, question)
+    assert hits and hits[0][1] == pytest.approx(1.0, abs=1e-3)
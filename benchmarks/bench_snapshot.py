@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+SnapshotDatabase против ZinDatabase: разбиение на слова и выдача поиска
+должны совпадать с FTS5, в том числе для кириллицы с й и ё и для букв
+с диакритикой; плюс скорость поиска по снимку.
+"""
+
+import random
+import sqlite3
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("numpy")
+
+import html_parser
+from database import ZinDatabase
+from snapshot import SnapshotDatabase, index_tokens
+from benchmarks.corpus import WORDS, build_database
+
+ROWS = 3000
+
+# Слова, которые различаются только й/и, ё/е или диакритикой
+SIMILAR_WORDS = [
+    "мой мои моё мойка", "твой твои", "край краи крайний", "Ёлка елка ёж", "йод иод",
+    "чай чаи", "герой герои героический", "café cafe naïve naive", "Straße strasse",
+]
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("snapshot") / "tests.db")
+    build_database(path, ROWS, seed=1)
+    rng = random.Random(5)
+    conn = sqlite3.connect(path)
+    try:
+        writer = html_parser.BatchWriter(conn, batch_size=100, flush_interval=3600)
+        for number in range(200):
+            questions_answers = [{"question": " ".join(rng.sample(SIMILAR_WORDS, 2) + [rng.choice(WORDS)]),
+                                  "answer": rng.choice(SIMILAR_WORDS)} for _ in range(5)]
+            writer.add(900000 + number, questions_answers, f"html_files/test_{900000 + number}.html")
+        writer.flush()
+    finally:
+        conn.close()
+    return path
+
+
+@pytest.fixture(scope="module")
+def databases(db_path):
+    sqlite_db = ZinDatabase(db_path, cache=False)
+    snapshot_db = SnapshotDatabase(db_path, watch=False)
+    yield sqlite_db, snapshot_db
+    snapshot_db.close()
+    sqlite_db.close()
+
+
+@pytest.fixture(scope="module")
+def queries(db_path):
+    """Обрывки вопросов (с опечатками и обрезанными словами) и похожие слова"""
+    conn = sqlite3.connect(db_path)
+    try:
+        questions = [row[0] for row in conn.execute("SELECT question FROM tests WHERE question != '' "
+                                                    "ORDER BY rowid LIMIT 300 OFFSET 1000")]
+    finally:
+        conn.close()
+    rng = random.Random(3)
+    result = []
+    for question in questions:
+        words = question.split()
+        start = rng.randrange(len(words))
+        fragment = " ".join(words[start:start + 3])
+        if rng.random() < 0.3 and len(fragment) > 4:
+            position = rng.randrange(len(fragment))
+            fragment = fragment[:position] + rng.choice("абвгдй") + fragment[position + 1:]
+        if rng.random() < 0.3:
+            fragment = fragment[:max(3, len(fragment) - rng.randrange(4))]
+        result.append(fragment)
+    return result + SIMILAR_WORDS + [word for words in SIMILAR_WORDS for word in words.split()]
+
+
+def test_index_tokens_match_fts(db_path):
+    """index_tokens разбивает question_norm и answer_norm так же, как tests_fts"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts_terms USING fts5vocab(main, tests_fts, 'instance')")
+        fts_tokens = {}
+        for term, rowid, column, offset in conn.execute("SELECT term, doc, col, offset FROM fts_terms"):
+            fts_tokens.setdefault((rowid, column), []).append((offset, term))
+        rows = conn.execute("SELECT rowid, question_norm, answer_norm FROM tests").fetchall()
+    finally:
+        conn.close()
+    
+    for rowid, q_norm, a_norm in rows:
+        for column, text in (("question_norm", q_norm), ("answer_norm", a_norm)):
+            expected = [term for _, term in sorted(fts_tokens.get((rowid, column), []))]
+            assert index_tokens(text) == expected, text
+
+
+@pytest.mark.parametrize("method", ["search_questions", "search_fuzzy", "search_unique_questions"])
+def test_search_matches_sqlite(databases, queries, method):
+    sqlite_db, snapshot_db = databases
+    for query in queries:
+        assert getattr(snapshot_db, method)(query) == getattr(sqlite_db, method)(query), query
+
+
+@pytest.mark.parametrize("method", ["search_by_keywords", "search_by_any_keywords"])
+def test_keywords_match_sqlite(databases, queries, method):
+    sqlite_db, snapshot_db = databases
+    for query in queries:
+        keywords = query.split()
+        assert getattr(snapshot_db, method)(keywords) == getattr(sqlite_db, method)(keywords), query
+
+
+@pytest.mark.parametrize("method", ["search_questions", "search_fuzzy"])
+def test_snapshot_search_speed(benchmark, databases, queries, method):
+    _, snapshot_db = databases
+    search = getattr(snapshot_db, method)
+    benchmark(lambda: [search(query) for query in queries[:50]])
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""Общие настройки бенчмарков: путь к модулям проекта и базы данных по размерам"""
+
+import os
+import sys
+import logging
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import build_database
+
+logger = logging.getLogger(__name__)
+
+BENCH_ROWS = [int(value) for value in os.environ.get("ZIN_BENCH_ROWS", "10000,100000,1000000").split(",") if value]
+BENCH_CACHE = os.environ.get("ZIN_BENCH_CACHE", os.path.join(ROOT, ".bench_cache"))
+BENCH_SEED = 0
+
+
+def cached_database(rows: int) -> str:
+    """Путь к БД с rows строками; база строится один раз и хранится в BENCH_CACHE"""
+    os.makedirs(BENCH_CACHE, exist_ok=True)
+    path = os.path.join(BENCH_CACHE, f"search_{rows}_{BENCH_SEED}.db")
+    if not os.path.exists(path):
+        logger.info(f"Построение БД для бенчмарков: {rows} строк")
+        tmp_path = f"{path}.tmp"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(tmp_path + suffix):
+                os.remove(tmp_path + suffix)
+        build_database(tmp_path, rows, BENCH_SEED)
+        os.replace(tmp_path, path)
+    return path
+
+
+@pytest.fixture(scope="session", params=BENCH_ROWS, ids=lambda rows: f"{rows}rows")
+def search_db_path(request):
+    return cached_database(request.param)
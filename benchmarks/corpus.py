@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Генератор синтетических страниц тестов и баз данных для бенчмарков.
+
+Страница повторяет разметку Next.js страниц ЦДЗ и содержит задания всех
+видов, которые разбирает html_parser.parse_test_html:
+
+- input     - ответ в <input type="text" value="...">
+- checked   - отмеченные radio/checkbox внутри <label>
+- selected  - элементы с data-selected="true"
+- accordion - задание на соотнесение (секции data-slot="base")
+- rsc       - задание на соотнесение с ответом в RSC данных
+              (self.__next_f.push, объект answer с right_answer.groups)
+
+generate_page возвращает HTML и ожидаемый результат парсинга, поэтому
+бенчмарк заодно проверяет, что генератор и парсер согласованы.
+
+Запуск:
+    python -m benchmarks.corpus pages html_files --count 1000 --questions 12
+    python -m benchmarks.corpus db bench.db --rows 100000
+"""
+
+import os
+import json
+import random
+import sqlite3
+import logging
+import argparse
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANSWER_SHAPES = ("input", "checked", "selected", "accordion", "rsc")
+
+# Словарь для текста вопросов: частоты слов убывают по закону Ципфа,
+# как в настоящих вопросах (несколько очень частых слов и длинный хвост)
+WORDS = (
+    "что такое как какой какая какие определите укажите выберите найдите вычислите "
+    "закон сила масса скорость ускорение энергия работа мощность давление плотность "
+    "температура теплота объем площадь периметр треугольник угол окружность радиус "
+    "диаметр число дробь уравнение функция график корень степень множество "
+    "клетка организм растение животное ткань орган белок фермент ген хромосома "
+    "государство война реформа революция империя князь царь договор столица век "
+    "предложение слово приставка суффикс окончание корень глагол существительное "
+    "прилагательное наречие причастие деепричастие подлежащее сказуемое "
+    "материк океан река озеро климат рельеф население страна город горы "
+    "атом молекула вещество реакция кислота основание соль металл кислород водород "
+    "ток напряжение сопротивление проводник цепь магнит заряд поле волна свет"
+).split()
+WORD_WEIGHTS = [1.0 / (rank + 1) for rank in range(len(WORDS))]
+
+CATEGORIES = ("Фрукты", "Овощи", "Животные", "Птицы", "Металлы", "Газы", "Столицы", "Реки", "Глаголы", "Числа")
+
+
+def synthetic_text(rng: random.Random, min_words: int = 4, max_words: int = 12) -> str:
+    """Случайное предложение из WORDS с заглавной буквой и вопросительным знаком"""
+    words = rng.choices(WORDS, weights=WORD_WEIGHTS, k=rng.randint(min_words, max_words))
+    text = " ".join(words)
+    return text[0].upper() + text[1:] + "?"
+
+
+def _task(test_id: int, number: int, question: str, body: str) -> str:
+    return (f'<div class="rounded-lg border p-6" id="task-{test_id}-{number}">'
+            f'<h1 class="text-xl leading-7 text-primary">Задание {number}</h1>'
+            f'<p class="leading-7 whitespace-pre-wrap my-4">{question}</p>{body}</div>')
+
+
+def _options(rng: random.Random, number: int, count: int) -> List[str]:
+    return [f"Вариант {number}.{i + 1} {rng.choice(WORDS)}" for i in range(count)]
+
+
+def _input_task(rng, number):
+    answer = f"{rng.randint(1, 999)} {rng.choice(WORDS)}"
+    body = f'<div class="mt-4"><input type="text" class="input" value=" {answer} " readonly></div>'
+    return body, answer, None
+
+
+def _checked_task(rng, number):
+    options = _options(rng, number, 4)
+    multiple = rng.random() < 0.3
+    checked = sorted(rng.sample(range(len(options)), 2 if multiple else 1))
+    kind = "checkbox" if multiple else "radio"
+    labels = "".join(
+        f'<label class="flex gap-2"><input type="{kind}" name="q{number}"'
+        f'{" checked" if i in checked else ""}> <span>{option}</span></label>'
+        for i, option in enumerate(options)
+    )
+    return f'<div class="space-y-2">{labels}</div>', " | ".join(options[i] for i in checked), None
+
+
+def _selected_task(rng, number):
+    options = _options(rng, number, 4)
+    selected = sorted(rng.sample(range(len(options)), rng.randint(1, 2)))
+    items = "".join(
+        f'<div class="option" data-selected="{"true" if i in selected else "false"}"><span>{option}</span></div>'
+        for i, option in enumerate(options)
+    )
+    return f'<div class="grid gap-2">{items}</div>', " | ".join(options[i] for i in selected), None
+
+
+def _accordion_task(rng, number):
+    sections = []
+    pairs = []
+    for category in rng.sample(CATEGORIES, rng.randint(2, 4)):
+        category = f"{category} {number}"
+        images = [f"img_{number}_{rng.randint(1000, 9999)}.jpg" for _ in range(rng.randint(1, 3))]
+        audio = f"audio_{number}_{rng.randint(1000, 9999)}.mp3" if rng.random() < 0.3 else None
+        content = "".join(f"<div>{image}</div>" for image in images)
+        if audio:
+            content += f'<audio controls src="/media/audio/{audio}"></audio>'
+        sections.append(
+            f'<div data-slot="base"><button><span data-slot="title">Группа</span>'
+            f'<span data-slot="subtitle">{category}</span></button>'
+            f'<div data-slot="content">{content}</div></div>'
+        )
+        pairs.extend(f"{category}: {image}" for image in images)
+        if audio:
+            pairs.append(f"{category}: {audio}")
+    return f'<div class="accordion">{"".join(sections)}</div>', " | ".join(pairs), None
+
+
+def _rsc_task(rng, number):
+    groups = []
+    options = []
+    pairs = []
+    for g, category in enumerate(rng.sample(CATEGORIES, rng.randint(2, 3))):
+        group_id = f"g{number}x{g}"
+        options.append({"id": group_id, "text": f"{category} {number}"})
+        option_ids = []
+        for i in range(rng.randint(1, 3)):
+            option_id = f"o{number}x{g}x{i}"
+            option_text = f"Элемент {number}.{g}.{i} {rng.choice(WORDS)}"
+            options.append({"id": option_id, "text": option_text})
+            option_ids.append(option_id)
+            pairs.append(f"{category} {number}: {option_text}")
+        groups.append({"group_id": group_id, "options_ids": option_ids})
+    # В разметке задания только перетаскиваемые элементы без правильного ответа
+    items = "".join(f'<div class="draggable">{option["text"]}</div>' for option in options[1:])
+    answer = {"options": options, "right_answer": {"groups": groups}}
+    return f'<div class="dnd">{items}</div>', " | ".join(pairs), answer
+
+
+TASK_BUILDERS = {
+    "input": _input_task,
+    "checked": _checked_task,
+    "selected": _selected_task,
+    "accordion": _accordion_task,
+    "rsc": _rsc_task,
+}
+
+
+def _rsc_scripts(lines: List[str], chunk_size: int = 2048) -> str:
+    """Поток RSC, разрезанный на чанки self.__next_f.push, как в Next.js"""
+    stream = "".join(lines)
+    return "".join(
+        f'<script>self.__next_f.push([1,{json.dumps(stream[i:i + chunk_size], ensure_ascii=False)}])</script>'
+        for i in range(0, len(stream), chunk_size)
+    )
+
+
+def generate_page(test_id: int, questions: int = 12, shapes: Optional[Sequence[str]] = None,
+                  seed: Optional[int] = None, filler: int = 20) -> Tuple[str, List[dict]]:
+    """
+    Синтетическая страница теста.
+    
+    Args:
+        test_id: ID теста (попадает в id контейнеров заданий)
+        questions: Количество заданий
+        shapes: Виды заданий по кругу (по умолчанию все ANSWER_SHAPES в случайном порядке)
+        seed: Зерно генератора (по умолчанию test_id)
+        filler: Количество блоков разметки и RSC данных без заданий (размер страницы)
+    
+    Returns:
+        tuple: (html, ожидаемый результат parse_test_html)
+    """
+    rng = random.Random(test_id if seed is None else seed)
+    if shapes is None:
+        shapes = [rng.choice(ANSWER_SHAPES) for _ in range(questions)]
+    
+    tasks = []
+    expected = []
+    rsc_tasks = []
+    seen = set()
+    for number in range(1, questions + 1):
+        question = synthetic_text(rng)
+        while question in seen:
+            question = synthetic_text(rng)
+        seen.add(question)
+        
+        body, answer, rsc_answer = TASK_BUILDERS[shapes[(number - 1) % len(shapes)]](rng, number)
+        tasks.append(_task(test_id, number, question, body))
+        expected.append({"question": question, "answer": answer})
+        if rsc_answer is not None:
+            rsc_tasks.append({"id": f"rsc-{test_id}-{number}", "text": question, "answer": rsc_answer})
+    
+    layout = "".join(
+        f'<div class="flex items-center gap-4"><a href="/tests/{test_id}/{i}" class="link">'
+        f'{synthetic_text(rng, 2, 5)}</a><span class="text-muted">{rng.randint(1, 100)}</span></div>'
+        for i in range(filler)
+    )
+    props = [{"className": "layout", "children": synthetic_text(rng, 8, 20)} for _ in range(filler)]
+    if rsc_tasks:
+        props.append({"tasks": rsc_tasks})
+    lines = [f'{i + 1:x}:["$","div",null,{json.dumps(value, ensure_ascii=False)}]\n' for i, value in enumerate(props)]
+    
+    html = (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        f'<title>Тест {test_id}</title></head><body>'
+        f'<header class="border-b"><nav>{layout}</nav></header>'
+        f'<main class="container mx-auto">{"".join(tasks)}</main>'
+        f'<footer class="border-t">{layout}</footer>'
+        f'{_rsc_scripts(lines)}</body></html>'
+    )
+    return html, expected
+
+
+def write_pages(directory: str, count: int, questions: int = 12, start_id: int = 1,
+                filler: int = 20) -> List[int]:
+    """Записывает count страниц в формате FileHtmlStore (test_{id}.html)"""
+    os.makedirs(directory, exist_ok=True)
+    test_ids = list(range(start_id, start_id + count))
+    for test_id in test_ids:
+        html, _ = generate_page(test_id, questions, filler=filler)
+        with open(os.path.join(directory, f"test_{test_id}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+    return test_ids
+
+
+def generate_tests(rows: int, questions_per_test: int = 12, seed: int = 0,
+                   distinct_ratio: float = 0.3) -> Iterator[Tuple[int, List[dict]]]:
+    """
+    Тесты для заполнения БД без HTML: (test_id, [{"question", "answer"}]).
+    
+    Вопросы выбираются из пула размером distinct_ratio * rows, поэтому
+    часть вопросов повторяется в разных тестах, как в настоящей базе.
+    """
+    rng = random.Random(seed)
+    pool = [synthetic_text(rng) for _ in range(max(1, int(rows * distinct_ratio)))]
+    answers = [f"{rng.choice(WORDS)} {rng.randint(1, 99)}" for _ in range(max(1, len(pool) // 3))]
+    test_id = 0
+    produced = 0
+    while produced < rows:
+        test_id += 1
+        count = min(questions_per_test, rows - produced)
+        yield test_id, [{"question": rng.choice(pool), "answer": rng.choice(answers)} for _ in range(count)]
+        produced += count
+
+
+def build_database(path: str, rows: int, seed: int = 0, questions_per_test: int = 12) -> dict:
+    """
+    Создает БД с rows строками tests через BatchWriter парсера (с индексами
+    поиска, статистикой и таблицей questions, как после html_parser.py).
+    
+    Returns:
+        dict: rows, tests
+    """
+    import html_parser
+    
+    conn = sqlite3.connect(path)
+    try:
+        html_parser.init_db(conn, bulk_load=True)
+        writer = html_parser.BatchWriter(conn, batch_size=2000, flush_interval=3600)
+        tests = 0
+        for test_id, questions_answers in generate_tests(rows, questions_per_test, seed):
+            writer.add(test_id, questions_answers, f"html_files/test_{test_id}.html")
+            tests += 1
+        writer.flush()
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return {'rows': rows, 'tests': tests}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description="Синтетические страницы и базы данных для бенчмарков")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pages = commands.add_parser("pages", help="записать страницы тестов в каталог")
+    pages.add_argument("directory")
+    pages.add_argument("--count", type=int, default=1000)
+    pages.add_argument("--questions", type=int, default=12)
+    pages.add_argument("--filler", type=int, default=20, help="блоков разметки без заданий на странице")
+    database = commands.add_parser("db", help="создать БД с синтетическими тестами")
+    database.add_argument("path")
+    database.add_argument("--rows", type=int, default=100000)
+    database.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    if args.command == "pages":
+        written = write_pages(args.directory, args.count, args.questions, filler=args.filler)
+        logger.info(f"Записано страниц: {len(written)} в {args.directory}")
+    else:
+        logger.info(f"БД создана: {build_database(args.path, args.rows, args.seed)}")
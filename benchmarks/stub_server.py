@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+Сервер-заглушка страниц тестов для проверки скачивания без обращения к сайту.
+
+Отдает синтетические страницы corpus.generate_page по адресу
+/cdz/test/<id>. Для выбранных ID можно вернуть ошибку (429, 503) и
+добавить задержку ответа. Запуск отдельно:
+
+    python -m benchmarks.stub_server --port 8765 --count 500
+    # config.TEST_URL_TEMPLATE = "http://127.0.0.1:8765/cdz/test/{test_id}"
+"""
+
+import re
+import time
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from benchmarks.corpus import generate_page
+
+logger = logging.getLogger(__name__)
+
+_PATH_RE = re.compile(r"^/cdz/test/(\d+)$")
+
+
+class StubServer:
+    """
+    HTTP сервер со страницами тестов 1..count в фоновом потоке.
+    
+    Args:
+        count: Сколько тестов существует (для остальных ID - 404)
+        questions: Вопросов на странице
+        errors: test_id -> код ответа, который вернется вместо страницы
+        delay: Задержка каждого ответа (секунды)
+    """
+    
+    def __init__(self, count: int = 200, questions: int = 12, errors: Optional[Dict[int, int]] = None,
+                 delay: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.count = count
+        self.questions = questions
+        self.errors = errors or {}
+        self.delay = delay
+        self.requests = 0
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+    
+    def page(self, test_id: int) -> str:
+        """HTML страницы теста (тот же, что отдает сервер)"""
+        with self._lock:
+            if test_id not in self._pages:
+                self._pages[test_id] = generate_page(test_id, self.questions)[0]
+            return self._pages[test_id]
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                match = _PATH_RE.match(self.path)
+                test_id = int(match.group(1)) if match else None
+                if test_id is None or not 1 <= test_id <= stub.count:
+                    self.send_error(404)
+                    return
+                if test_id in stub.errors:
+                    self.send_error(stub.errors[test_id])
+                    return
+                body = stub.page(test_id).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    @property
+    def url_template(self) -> str:
+        """Шаблон адреса для config.TEST_URL_TEMPLATE"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/cdz/test/{{test_id}}"
+    
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="zin-stub", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description="Сервер-заглушка страниц тестов")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--count", type=int, default=200, help="сколько тестов отдавать (ID 1..count)")
+    parser.add_argument("--questions", type=int, default=12, help="вопросов на странице")
+    parser.add_argument("--delay", type=float, default=0.0, help="задержка ответа (секунды)")
+    args = parser.parse_args()
+    
+    server = StubServer(args.count, args.questions, delay=args.delay, port=args.port).start()
+    logger.info(f"Сервер-заглушка запущен: TEST_URL_TEMPLATE = \"{server.url_template}\"")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
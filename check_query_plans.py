@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Проверка планов запросов к таблице tests.
+
+Скрипт создает временную БД со схемой из html_parser.init_db (включая
+миграции) и небольшим набором тестов, вызывает все методы ZinDatabase и
+запросы парсера, перехватывает выполненные SELECT через
+set_trace_callback и для каждого выполняет EXPLAIN QUERY PLAN.
+
+Если какой-либо запрос читает tests полным проходом (SCAN по самой таблице
+или по любому индексу), скрипт завершается с кодом 1. Частичный индекс
+может покрывать почти всю таблицу (idx_tests_with_question), поэтому проход
+по нему допустим только для пар (метод, индекс) из ALLOWED_PARTIAL_SCANS -
+методов, которым по смыслу нужны все строки подмножества. Поиск через
+LIKE '%...%' (запасной вариант без индекса FTS) индексом ускорить нельзя,
+поэтому такие методы перечислены в ALLOWED_FULL_SCANS.
+
+Запуск: python check_query_plans.py [-v] [--db PATH]
+"""
+
+import os
+import re
+import sqlite3
+import logging
+import argparse
+import tempfile
+import contextlib
+from typing import List, Tuple
+import config
+import database
+import html_parser
+import semantic_index
+from clustering import init_clusters
+
+logger = logging.getLogger(__name__)
+
+# Методы, которым разрешен полный проход по tests
+ALLOWED_FULL_SCANS = {
+    '_search_questions_like',
+    '_search_by_keywords_like',
+    '_search_by_any_keywords_like',
+}
+
+# Методы, которым разрешен проход по частичному индексу tests: (метод, индекс)
+ALLOWED_PARTIAL_SCANS = {
+    # Запасной путь случайной выборки: список всех строк с вопросами
+    ('get_random_questions', 'idx_tests_with_question'),
+    # Число разобранных тестов и состояние всех тестов для перепарсинга
+    ('get_parsing_progress', 'idx_tests_parse_state'),
+    ('load_parse_state', 'idx_tests_parse_state'),
+}
+
+SCAN_RE = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+TABLE_ALIAS_RE = re.compile(r'\btests\s+(?:AS\s+)?([A-Za-z_]\w*)', re.IGNORECASE)
+SQL_KEYWORDS = {'where', 'join', 'on', 'group', 'order', 'limit', 'left', 'inner', 'cross', 'using', 'set', 'values'}
+
+
+@contextlib.contextmanager
+def trace_statements(statements: List[Tuple[str, str]], label: list):
+    """Перехватывает SQL всех соединений, открытых внутри блока"""
+    original_connect = sqlite3.connect
+    
+    def connect(*args, **kwargs):
+        conn = original_connect(*args, **kwargs)
+        conn.set_trace_callback(lambda sql: statements.append((label[0], sql)))
+        return conn
+    
+    sqlite3.connect = connect
+    try:
+        yield
+    finally:
+        sqlite3.connect = original_connect
+
+
+def build_sample_db(db_path: str, tests: int = 50):
+    """Создает БД с актуальной схемой и синтетическими тестами"""
+    conn = sqlite3.connect(db_path)
+    html_parser.init_db(conn)
+    for test_id in range(config.START_ID, config.START_ID + tests):
+        questions = [
+            {'question': f"Вопрос {test_id}.{idx} о законе Ома и сопротивлении", 'answer': f"Ответ {idx}"}
+            for idx in range(3)
+        ]
+        if test_id % 7 == 0:
+            questions.append({'question': '', 'answer': ''})
+        html_parser.save_test_to_db(conn, test_id, questions, f"<html>{test_id}</html>",
+                                    f"test_{test_id}.html", commit=False)
+    init_clusters(conn)
+    conn.execute("""
+        INSERT INTO question_clusters (question_id, cluster_id)
+        SELECT question_id, question_id % 5 FROM questions
+    """)
+    conn.execute("UPDATE tests SET fetched_at = DATE('2024-01-01', '+' || (test_id % 5) || ' days')")
+    conn.commit()
+    conn.close()
+
+
+def run_queries(db_path: str) -> List[Tuple[str, str]]:
+    """Вызывает методы ZinDatabase и запросы парсера, возвращает (метод, SQL)"""
+    statements = []
+    label = ['']
+    test_id = config.START_ID + 1
+    
+    calls = [
+        ('search_questions', ('закон ома',)),
+        ('search_by_keywords', (['закон', 'сопротивление'],)),
+        ('search_by_any_keywords', (['закон', 'ток'],)),
+        ('search_fuzzy', ('закон Ом',)),
+        ('search_unique_questions', ('закон ома',)),
+        ('search_semantic', (f"вопрос {test_id}.1",)),
+        ('_search_questions_like', ('закон', 20)),
+        ('_search_by_keywords_like', (['закон', 'ома'], 20)),
+        ('_search_by_any_keywords_like', (['закон', 'ток'], 20)),
+        ('get_test_by_id', (test_id,)),
+        ('get_similar_questions', (test_id, 0)),
+        ('get_random_questions', (5, 0)),
+        ('get_statistics', ()),
+        ('get_tests_count_by_date', ()),
+        ('get_test_html_file_path', (test_id,)),
+        ('get_test_html_content', (test_id,)),
+    ]
+    
+    with trace_statements(statements, label):
+        db = database.ZinDatabase(db_path, cache=True)
+        for method_name, args in calls:
+            label[0] = method_name
+            getattr(db, method_name)(*args)
+        
+        # Запасной путь случайной выборки: по списку всех подходящих rowid
+        label[0] = 'get_random_questions'
+        max_rounds = database.RANDOM_SAMPLE_MAX_ROUNDS
+        database.RANDOM_SAMPLE_MAX_ROUNDS = 0
+        try:
+            db.get_random_questions(5, 0)
+        finally:
+            database.RANDOM_SAMPLE_MAX_ROUNDS = max_rounds
+        db.close()
+        
+        # Запросы парсера
+        db_path_saved = config.DB_PATH
+        config.DB_PATH = db_path
+        try:
+            label[0] = 'get_parsing_progress'
+            html_parser.get_parsing_progress()
+            conn = sqlite3.connect(db_path)
+            label[0] = 'is_test_already_parsed'
+            html_parser.is_test_already_parsed(conn, test_id)
+            label[0] = 'load_parse_state'
+            html_parser.load_parse_state(conn)
+            conn.close()
+        finally:
+            config.DB_PATH = db_path_saved
+    
+    return [(method, sql) for method, sql in statements
+            if sql.lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+
+def table_names(sql: str) -> set:
+    """Имена, под которыми tests встречается в запросе (сама таблица и псевдонимы)"""
+    names = {'tests'}
+    for alias in TABLE_ALIAS_RE.findall(sql):
+        if alias.lower() not in SQL_KEYWORDS:
+            names.add(alias)
+    return names
+
+
+def partial_indexes(conn) -> set:
+    """Имена частичных индексов таблицы tests"""
+    cur = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tests'")
+    return {name for name, sql in cur if sql and re.search(r'\bWHERE\b', sql, re.IGNORECASE)}
+
+
+def check_plans(db_path: str, statements: List[Tuple[str, str]], verbose: bool = False) -> int:
+    """
+    Выполняет EXPLAIN QUERY PLAN для каждого запроса.
+    
+    Returns:
+        int: Количество запросов с полным проходом по tests
+    """
+    conn = sqlite3.connect(db_path)
+    partial = partial_indexes(conn)
+    failures = 0
+    seen = set()
+    
+    for method, sql in statements:
+        if (method, sql) in seen:
+            continue
+        seen.add((method, sql))
+        
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        names = table_names(sql)
+        full_scans = []
+        for detail in plan:
+            match = SCAN_RE.match(detail)
+            if not match or match.group(1) not in names:
+                continue
+            index = match.group(2)
+            if index not in partial or (method, index) not in ALLOWED_PARTIAL_SCANS:
+                full_scans.append(detail)
+        
+        allowed = method in ALLOWED_FULL_SCANS
+        if full_scans and not allowed:
+            failures += 1
+            logger.error(f"{method}: полный проход по tests ({'; '.join(full_scans)})\n{' '.join(sql.split())}")
+        elif verbose:
+            status = "разрешенный полный проход" if full_scans else "ok"
+            logger.info(f"{method}: {status}\n  {' '.join(sql.split())}\n  " + "\n  ".join(plan))
+    
+    conn.close()
+    return failures
+
+
+def main(db_path: str = None, verbose: bool = False) -> int:
+    with tempfile.TemporaryDirectory(prefix="zin_plans_") as directory:
+        if db_path is None:
+            db_path = os.path.join(directory, "plans.db")
+            build_sample_db(db_path)
+            # Семантический индекс нужен, чтобы search_semantic выполнил свой запрос
+            if semantic_index.np is not None:
+                config.SEMANTIC_INDEX_DIR = os.path.join(directory, "semantic_index")
+                conn = sqlite3.connect(db_path)
+                semantic_index.build_index(conn)
+                conn.close()
+        
+        statements = run_queries(db_path)
+        failures = check_plans(db_path, statements, verbose)
+    
+    checked = len(set(statements))
+    if failures:
+        logger.error(f"Проверено запросов: {checked}, с полным проходом по tests: {failures}")
+    else:
+        logger.info(f"Проверено запросов: {checked}, полных проходов по tests нет")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description="Проверка планов запросов ZinDatabase на полный проход по tests")
+    parser.add_argument("--db", help="проверить существующую БД вместо временной (только чтение)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="показать планы всех запросов")
+    args = parser.parse_args()
+    
+    raise SystemExit(main(args.db, args.verbose))
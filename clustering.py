@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Кластеризация почти одинаковых вопросов (MinHash + LSH).
+
+Один и тот же вопрос встречается в разных тестах с небольшими отличиями в
+формулировке. Задание строит для каждого канонического вопроса (таблица
+questions) сигнатуру MinHash по символьным n-граммам нормализованного
+текста, а затем находит кандидатов в похожие через LSH: сигнатура режется
+на полосы, и вопросы, совпавшие хотя бы в одной полосе, сравниваются по
+оценке сходства Жаккара. Сравниваются только кандидаты, поэтому время
+растет почти линейно с числом вопросов, а не квадратично.
+
+Результат - таблица question_clusters (question_id -> cluster_id), где
+cluster_id - question_id самого частого вопроса кластера. По ней
+ZinDatabase.get_similar_questions находит похожие вопросы и их ответы.
+Таблица перезаписывается вместе с увеличением поколения БД, поэтому кэш
+ZinDatabase и снимок SnapshotDatabase подхватывают новые кластеры.
+
+Запуск: python clustering.py
+"""
+
+import sqlite3
+import logging
+import time
+import zlib
+import argparse
+from typing import List, Tuple
+import config
+from text_normalize import normalize_text
+from html_parser import bump_db_generation
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Параметры хеш-функций MinHash фиксированы, чтобы сигнатуры были
+# воспроизводимы между запусками
+HASH_SEED = 20240901
+
+
+def init_clusters(conn):
+    """Создает таблицу question_clusters"""
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS question_clusters (
+        question_id INTEGER PRIMARY KEY,
+        cluster_id INTEGER NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_question_clusters_cluster ON question_clusters (cluster_id)")
+
+
+def shingles(text: str, size: int = None) -> List[int]:
+    """32-битные хеши символьных n-грамм нормализованного текста"""
+    size = size or config.CLUSTER_SHINGLE_SIZE
+    text = normalize_text(text)
+    if len(text) <= size:
+        return [zlib.crc32(text.encode('utf-8'))] if text else []
+    return list({zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)})
+
+
+class MinHasher:
+    """
+    Векторизованный расчет сигнатур MinHash.
+    
+    i-я хеш-функция - h_i(x) = (a_i * x + b_i) mod 2^64, старшие 32 бита
+    (multiply-shift), a_i нечетные. Сигнатуры пачки вопросов считаются
+    одной матричной операцией, минимум по n-граммам каждого вопроса -
+    через np.minimum.reduceat.
+    """
+    
+    def __init__(self, num_perm: int = None, seed: int = HASH_SEED):
+        if np is None:
+            raise RuntimeError("Для кластеризации вопросов установите пакет numpy")
+        self.num_perm = num_perm or config.CLUSTER_NUM_PERM
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, size=self.num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=self.num_perm, dtype=np.uint64)
+    
+    def signatures(self, shingle_sets: List[List[int]]):
+        """
+        Сигнатуры для списка множеств n-грамм.
+        
+        Returns:
+            np.ndarray: матрица (len(shingle_sets), num_perm) типа uint32
+        """
+        result = np.full((len(shingle_sets), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        non_empty = [i for i, items in enumerate(shingle_sets) if items]
+        if not non_empty:
+            return result
+        
+        lengths = np.array([len(shingle_sets[i]) for i in non_empty])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        values = np.fromiter((x for i in non_empty for x in shingle_sets[i]), dtype=np.uint64, count=lengths.sum())
+        
+        with np.errstate(over='ignore'):
+            hashes = (self._a[:, None] * values[None, :] + self._b[:, None]) >> np.uint64(32)
+        result[non_empty] = np.minimum.reduceat(hashes, offsets, axis=1).T.astype(np.uint32)
+        return result
+
+
+class UnionFind:
+    """Система непересекающихся множеств по индексам вопросов"""
+    
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+    
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+    
+    def union(self, first: int, second: int):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+def load_questions(conn) -> Tuple[List[int], List[str], List[int]]:
+    """Канонические вопросы: (question_id, текст, число вхождений)"""
+    cur = conn.cursor()
+    cur.execute("SELECT question_id, question, occurrences FROM questions ORDER BY question_id")
+    rows = cur.fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+
+def cluster_signatures(signatures, bands: int = None, threshold: float = None) -> Tuple[UnionFind, dict]:
+    """
+    Объединяет вопросы с похожими сигнатурами.
+    
+    В каждой полосе LSH вопросы группируются по значению полосы, и внутри
+    группы сравниваются все пары, еще не попавшие в один кластер:
+    объединяются пары, у которых доля совпавших позиций сигнатуры (оценка
+    сходства Жаккара) не меньше threshold. Так находятся и похожие друг на
+    друга вопросы, далекие от остальных вопросов группы.
+    """
+    bands = bands or config.CLUSTER_BANDS
+    threshold = config.CLUSTER_THRESHOLD if threshold is None else threshold
+    count, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    clusters = UnionFind(count)
+    stats = {'candidate_pairs': 0, 'merged_pairs': 0}
+    
+    for band in range(bands):
+        band_values = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        keys = band_values.view(np.dtype((np.void, band_values.dtype.itemsize * rows_per_band))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        
+        # Группы вопросов с одинаковым значением полосы (только из 2 и более)
+        shared = np.flatnonzero(counts[inverse] > 1)
+        if not len(shared):
+            continue
+        shared = shared[np.argsort(inverse[shared], kind='stable')]
+        bounds = np.flatnonzero(np.diff(inverse[shared])) + 1
+        
+        for members in np.split(shared, bounds):
+            members = members.tolist()
+            for position, head in enumerate(members[:-1]):
+                rest = [m for m in members[position + 1:] if clusters.find(m) != clusters.find(head)]
+                if not rest:
+                    continue
+                stats['candidate_pairs'] += len(rest)
+                similarity = (signatures[rest] == signatures[head]).mean(axis=1)
+                for member, value in zip(rest, similarity):
+                    if value >= threshold:
+                        clusters.union(head, member)
+                        stats['merged_pairs'] += 1
+    
+    return clusters, stats
+
+
+def build_clusters(conn) -> dict:
+    """
+    Пересчитывает question_clusters по таблице questions.
+    
+    Returns:
+        dict: questions - вопросов, clusters - кластеров из 2 и более
+        вопросов, clustered - вопросов в таких кластерах, candidate_pairs и
+        merged_pairs - сравненные и объединенные пары, seconds - время
+    """
+    started = time.monotonic()
+    question_ids, texts, occurrences = load_questions(conn)
+    logger.info(f"Вопросов для кластеризации: {len(question_ids)}")
+    
+    hasher = MinHasher()
+    batch_size = config.CLUSTER_BATCH_SIZE
+    signatures = np.empty((len(texts), hasher.num_perm), dtype=np.uint32)
+    for start in range(0, len(texts), batch_size):
+        batch = [shingles(text) for text in texts[start:start + batch_size]]
+        signatures[start:start + len(batch)] = hasher.signatures(batch)
+    logger.info(f"Сигнатуры MinHash посчитаны за {time.monotonic() - started:.1f} с")
+    
+    clusters, stats = cluster_signatures(signatures)
+    
+    # Идентификатор кластера - самый частый вопрос кластера
+    representative = {}
+    for index in range(len(question_ids)):
+        root = clusters.find(index)
+        best = representative.get(root)
+        if best is None or (occurrences[index], -question_ids[index]) > (occurrences[best], -question_ids[best]):
+            representative[root] = index
+    
+    rows = [(question_ids[index], question_ids[representative[clusters.find(index)]])
+            for index in range(len(question_ids))]
+    sizes = {}
+    for _, cluster_id in rows:
+        sizes[cluster_id] = sizes.get(cluster_id, 0) + 1
+    
+    init_clusters(conn)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM question_clusters")
+    cur.executemany("INSERT INTO question_clusters (question_id, cluster_id) VALUES (?, ?)", rows)
+    bump_db_generation(cur)
+    conn.commit()
+    
+    stats.update({
+        'questions': len(question_ids),
+        'clusters': sum(1 for size in sizes.values() if size > 1),
+        'clustered': sum(size for size in sizes.values() if size > 1),
+        'seconds': round(time.monotonic() - started, 2),
+    })
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description="Кластеризация похожих вопросов (MinHash + LSH)")
+    parser.add_argument("--db", default=config.DB_PATH, help="путь к БД (по умолчанию config.DB_PATH)")
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    try:
+        result = build_clusters(conn)
+    finally:
+        conn.close()
+    logger.info(f"Кластеризация завершена: {result}")
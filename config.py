@@ -13,11 +13,103 @@ HTML_STORAGE_DIR = "html_files"
 START_ID = 0
 END_ID = 89999   # полный диапазон для скачивания всех тестов
 
+# Адрес страницы теста (для проверки можно направить на сервер-заглушку:
+# python -m benchmarks.stub_server, шаблон адреса он выводит в лог)
+TEST_URL_TEMPLATE = "https://zin.pw/cdz/test/{test_id}"
+
 # Задержка между запросами (секунды)
 SLEEP_BETWEEN = 0.5
 
+# Асинхронный режим скачивания (downloader.py --async):
+# максимум одновременных запросов и общий предел запросов в секунду
+DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_RATE_LIMIT = 2.0
+
 # User-Agent (можно заменить на свой, чтобы меньше палиться как бот)
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36"
 
 # Токен Telegram бота (получите у @BotFather)
 TELEGRAM_BOT_TOKEN = "xxxxxx"
+
+# Триграммный индекс для поиска по фрагментам вопросов с опечатками (ZinDatabase.search_fuzzy)
+ENABLE_TRIGRAM_INDEX = True
+
+# Параллельный парсинг (html_parser.py --workers N): сколько файлов отдавать процессу за раз
+PARSE_CHUNK_SIZE = 16
+
+# Пакетная запись результатов парсинга: транзакция фиксируется каждые
+# PARSE_BATCH_SIZE тестов или каждые PARSE_FLUSH_INTERVAL секунд
+PARSE_BATCH_SIZE = 500
+PARSE_FLUSH_INTERVAL = 5.0
+
+# WAL и synchronous=NORMAL при запуске парсера (ускоряет массовую загрузку)
+PARSE_BULK_PRAGMAS = True
+
+# Бэкенд парсинга HTML: "bs4" (эталонный, BeautifulSoup) или "lxml" (быстрее, требует пакет lxml).
+# Совпадение результатов проверяется командой: python html_parser.py --diff-backends
+PARSER_BACKEND = "bs4"
+
+# Хранилище HTML страниц: "files" (файл test_{id}.html в HTML_STORAGE_DIR)
+# или "pack" (один сжатый SQLite файл HTML_PACK_PATH, см. html_store.py --migrate)
+HTML_STORAGE_BACKEND = "files"
+HTML_PACK_PATH = "html_pages.db"
+HTML_PACK_LEVEL = 6            # уровень сжатия zstd/zlib
+HTML_PACK_DICT_SIZE = 112640   # размер обучаемого словаря zstd (байт)
+
+# Статистика парсинга (parse_stats.py): сводка в лог раз в PARSE_STATS_INTERVAL секунд,
+# повторный разбор под cProfile PARSE_PROFILE_SLOWEST самых медленных страниц (0 - не профилировать)
+PARSE_STATS_INTERVAL = 60.0
+PARSE_PROFILE_SLOWEST = 0
+PARSE_PROFILE_DIR = "parse_profiles"
+PARSE_PROFILE_TOP_FUNCTIONS = 15
+
+# Инкрементальный перепарсинг: перечитывать HTML уже разобранных тестов и
+# перепарсивать их при изменении содержимого (False - проверять только версию парсера).
+# Страницы с прежней сигнатурой хранилища (размер и mtime файла или хеш в
+# упакованном хранилище) не читаются и не хешируются
+PARSE_CHECK_CONTENT_HASH = True
+
+# Соединения ZinDatabase (по одному постоянному соединению только для чтения на поток)
+DB_STATEMENT_CACHE_SIZE = 256     # кэш подготовленных запросов на соединение
+DB_MMAP_SIZE = 256 * 1024 * 1024  # отображение файла БД в память (байт)
+DB_CACHE_SIZE_KB = 64 * 1024      # кэш страниц SQLite на соединение (КБ)
+
+# Асинхронный доступ к БД для бота (async_database.AsyncZinDatabase)
+ASYNC_DB_WORKERS = 4     # потоков (и соединений) для запросов
+ASYNC_DB_TIMEOUT = 5.0   # таймаут одного запроса (секунды)
+
+# Кэш результатов поиска в ZinDatabase (LRU с TTL, сбрасывается при записи парсером)
+QUERY_CACHE_ENABLED = True
+QUERY_CACHE_SIZE = 2048              # максимум запросов в кэше
+QUERY_CACHE_TTL = 600.0              # время жизни записи (секунды)
+QUERY_CACHE_GENERATION_CHECK = 1.0   # как часто проверять поколение БД (секунды)
+
+# Кластеризация похожих вопросов (clustering.py, MinHash + LSH, требует numpy)
+CLUSTER_SHINGLE_SIZE = 4      # длина символьных n-грамм нормализованного вопроса
+CLUSTER_NUM_PERM = 128        # длина сигнатуры MinHash
+CLUSTER_BANDS = 16            # полос LSH (строк в полосе: CLUSTER_NUM_PERM / CLUSTER_BANDS)
+CLUSTER_THRESHOLD = 0.7       # минимальная оценка сходства Жаккара для объединения
+CLUSTER_BATCH_SIZE = 512      # вопросов на один векторизованный расчет сигнатур
+
+# Семантический поиск (semantic_index.py, ZinDatabase.search_semantic, требует numpy)
+SEMANTIC_INDEX_DIR = "semantic_index"   # каталог с матрицей TF-IDF (.npy, читаются через mmap)
+SEMANTIC_NGRAM_RANGE = (3, 5)           # длины символьных n-грамм
+SEMANTIC_FEATURES = 2 ** 20             # размер пространства хешей n-грамм
+SEMANTIC_MAX_DF = 0.5                   # n-граммы, встречающиеся в большей доле вопросов, не учитываются
+SEMANTIC_MIN_SCORE = 0.1                # минимальное косинусное сходство результата
+SEMANTIC_RELOAD_CHECK = 5.0             # как часто проверять, не перестроен ли индекс (секунды)
+
+# Выгрузка базы ответов (export.py): строк в одном пакете записи
+EXPORT_CHUNK_SIZE = 50000
+
+# Режим снимка для бота (snapshot.SnapshotDatabase): tests и поисковые индексы в памяти
+SNAPSHOT_ENABLED = False               # AsyncZinDatabase читает из снимка вместо SQLite (нужен numpy)
+SNAPSHOT_POLL_INTERVAL = 5.0           # как часто проверять поколение БД (секунды)
+SNAPSHOT_MIN_RELOAD_INTERVAL = 60.0    # не перезагружать снимок чаще (пока парсер пишет пакеты)
+
+# Метрики запросов к базе ответов (metrics.py): время, строки, ошибки и медленные вызовы каждого метода
+METRICS_ENABLED = True
+METRICS_SLOW_QUERY_SECONDS = 0.25    # вызов дольше - образец с SQL и формой параметров, предупреждение в лог
+METRICS_SLOW_QUERY_SAMPLES = 100     # сколько последних медленных вызовов хранить
+METRICS_HTTP_PORT = 0                # порт /metrics в формате Prometheus для бота (0 - не запускать)
+METRICS_HTTP_HOST = "127.0.0.1"
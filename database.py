@@ -4,25 +4,323 @@
 import sqlite3
 import logging
 import os
-from typing import List, Tuple, Optional
+import re
+import copy
+import json
+import random
+import time
+import inspect
+import functools
+import threading
+import urllib.parse
+from collections import OrderedDict
+from typing import Callable, List, Tuple, Optional
 import config
+from html_store import get_html_store
+from text_normalize import normalize_text, question_hash
+import semantic_index
+import metrics
+from metrics import instrumented
 
 logger = logging.getLogger(__name__)
 
+# Веса колонок (question, answer) для ранжирования bm25:
+# совпадение в вопросе важнее совпадения в ответе
+BM25_WEIGHTS = (10.0, 1.0)
+
+# Нечеткий поиск: не больше стольких триграмм запроса уходит в индекс,
+# и во столько раз больше кандидатов, чем limit, переранжируется по пересечению
+FUZZY_MAX_TRIGRAMS = 64
+FUZZY_CANDIDATE_FACTOR = 10
+
+# Случайная выборка: сколько раундов проб по диапазону rowid делать,
+# прежде чем перейти к выборке из полного списка подходящих строк
+RANDOM_SAMPLE_MAX_ROUNDS = 6
+
+
+def build_fts_query(text: str) -> str:
+    """
+    Преобразует произвольный текст в запрос FTS5.
+    
+    Текст нормализуется так же, как колонки question_norm/answer_norm,
+    каждое слово становится префиксным термом ("слово"*), термы
+    объединяются через AND. Спецсимволы синтаксиса FTS5 отбрасываются.
+    Возвращает пустую строку, если в тексте нет ни одного слова.
+    """
+    tokens = normalize_text(text).split()
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def text_trigrams(text: str) -> set:
+    """Множество триграмм нормализованного текста (см. text_normalize.normalize_text)"""
+    text = normalize_text(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _cache_key_part(value):
+    """Нормализует аргумент запроса для ключа кэша: как в поиске, плюс порядок слов"""
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(_cache_key_part(item) for item in value))
+    return value
+
+
+def cached_query(method):
+    """
+    Декоратор метода ZinDatabase: результат берется из QueryCache.
+    
+    Ключ - имя метода и нормализованные аргументы (запрос без учета
+    регистра и лишних пробелов, ключевые слова без учета порядка, limit).
+    Пустые результаты не кэшируются: ими же методы отвечают на ошибки БД.
+    В кэше хранится глубокая копия результата, и каждое попадание отдает
+    свою копию: строки (например, списки ответов search_unique_questions)
+    можно менять, не портя кэш и ответы другим вызывающим.
+    """
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (method.__name__,) + tuple(
+            _cache_key_part(value) for name, value in bound.arguments.items() if name != 'self'
+        )
+        
+        generation = self._get_generation()
+        hit, result = self.cache.get(key, generation)
+        if hit:
+            return copy.deepcopy(result)
+        
+        result = method(self, *args, **kwargs)
+        if result:
+            self.cache.put(key, generation, copy.deepcopy(result))
+        return result
+    
+    return wrapper
+
+
+class QueryCache:
+    """
+    LRU кэш результатов поиска с ограничением времени жизни (TTL)
+    
+    Записи привязаны к поколению БД: когда парсер записывает новые строки,
+    он увеличивает generation в db_meta, и при следующем обращении кэш
+    целиком сбрасывается.
+    """
+    
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.max_size = max_size or config.QUERY_CACHE_SIZE
+        self.ttl = ttl or config.QUERY_CACHE_TTL
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+    
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._generation = generation
+    
+    def get(self, key, generation):
+        """Возвращает (True, значение) при попадании, иначе (False, None)"""
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return False, None
+            
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, value
+    
+    def put(self, key, generation, value):
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
 class ZinDatabase:
     """Класс для работы с базой данных ЦДЗ"""
     
-    def __init__(self, db_path: str = None):
+    # Метка бэкенда в метриках запросов (metrics.py)
+    metrics_backend = "sqlite"
+    
+    def __init__(self, db_path: str = None, cache: bool = None):
         self.db_path = db_path or config.DB_PATH
+        use_cache = config.QUERY_CACHE_ENABLED if cache is None else cache
+        self.cache = QueryCache() if use_cache else None
+        self._generation = 0
+        self._generation_checked_at = None
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._connections = []
+        self._pool_stats = {'opened': 0, 'reused': 0, 'closed': 0}
+        self._semantic_index = None
+        self._semantic_version = False   # (mtime, размер) meta.json загруженного индекса; None - файла нет
+        self._semantic_checked_at = None
+        self._semantic_lock = threading.Lock()
+        self.metrics = metrics.REGISTRY if config.METRICS_ENABLED else None
     
     def get_connection(self) -> sqlite3.Connection:
-        """Получить соединение с базой данных"""
-        return sqlite3.connect(self.db_path)
+        """
+        Получить соединение с базой данных
+        
+        Каждый поток получает свое постоянное соединение только для чтения,
+        которое открывается при первом обращении и затем переиспользуется,
+        поэтому запрос не платит за открытие файла и разбор схемы.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            with self._pool_lock:
+                self._pool_stats['reused'] += 1
+            return conn
+        
+        conn = self._open_connection()
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        with self._pool_lock:
+            self._connections.append(conn)
+            self._pool_stats['opened'] += 1
+        return conn
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        """Открывает соединение только для чтения с настройками для быстрых запросов"""
+        uri = f"file:{urllib.parse.quote(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=config.DB_STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {int(config.DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size = {-int(config.DB_CACHE_SIZE_KB)}")
+        return conn
+    
+    def get_pool_stats(self) -> dict:
+        """
+        Статистика пула соединений
+        
+        Returns:
+            dict: opened - открыто соединений, reused - запросов на готовом
+            соединении, closed - закрыто, active - открыто сейчас
+        """
+        with self._pool_lock:
+            stats = dict(self._pool_stats)
+            stats['active'] = len(self._connections)
+        return stats
+    
+    def _execute(self, cur: sqlite3.Cursor, sql: str, params=()) -> List[Tuple]:
+        """
+        Выполняет запрос и возвращает все строки результата
+        
+        Внутри вызова метода с метриками (metrics.instrumented) время
+        выполнения, SQL, параметры и ошибка запроса запоминаются для
+        метрик этого вызова.
+        """
+        call = metrics.current_call()
+        if call is None:
+            cur.execute(sql, params)
+            return cur.fetchall()
+        
+        started = time.perf_counter()
+        try:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        except Exception as e:
+            call.add_statement(sql, params, time.perf_counter() - started, e)
+            raise
+        call.add_statement(sql, params, time.perf_counter() - started)
+        return rows
+    
+    def get_query_metrics(self) -> dict:
+        """
+        Сводка метрик запросов по методам (см. metrics.MetricsRegistry.summary)
+        
+        Returns:
+            dict: "бэкенд.метод" -> calls, errors, empty, p50, p99 и т.д.
+            (пустой словарь, если метрики отключены)
+        """
+        return self.metrics.summary() if self.metrics is not None else {}
     
+    def _get_generation(self) -> int:
+        """
+        Текущее поколение БД (db_meta.generation, увеличивается парсером
+        при каждой записи). Читается не чаще раза в
+        config.QUERY_CACHE_GENERATION_CHECK секунд.
+        """
+        now = time.monotonic()
+        if (self._generation_checked_at is not None
+                and now - self._generation_checked_at < config.QUERY_CACHE_GENERATION_CHECK):
+            return self._generation
+        
+        try:
+            cur = self.get_connection().cursor()
+            rows = self._execute(cur, "SELECT value FROM db_meta WHERE key = 'generation'")
+            self._generation = int(rows[0][0]) if rows else 0
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать поколение БД: {e}")
+        self._generation_checked_at = now
+        return self._generation
+    
+    def get_cache_stats(self) -> dict:
+        """
+        Статистика кэша результатов поиска
+        
+        Returns:
+            dict: hits, misses, evictions, expired, invalidations, size, hit_rate
+            (пустой словарь, если кэш отключен)
+        """
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def close(self):
+        """Закрыть все соединения пула (например, при остановке бота)"""
+        with self._pool_lock:
+            connections, self._connections = self._connections, []
+            self._pool_stats['closed'] += len(connections)
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка закрытия соединения: {e}")
+        # Соединения других потоков закрыты, поэтому пусть все потоки откроют новые
+        self._local = threading.local()
+    
+    @instrumented
+    @cached_query
     def search_questions(self, query: str, limit: int = 20) -> List[Tuple]:
         """
         Поиск вопросов и ответов по тексту
         
+        Использует полнотекстовый индекс tests_fts с ранжированием bm25.
+        Если индекс еще не создан (старая БД), выполняется поиск через LIKE.
+        
         Args:
             query: Поисковый запрос
             limit: Максимальное количество результатов
@@ -30,32 +328,83 @@ class ZinDatabase:
         Returns:
             List[Tuple]: Список кортежей (test_id, question, answer, question_idx, html_file_path)
         """
+        fts_query = build_fts_query(query)
+        if not fts_query:
+            return []
+        
         try:
             with self.get_connection() as conn:
                 cur = conn.cursor()
+                return self._execute(cur, f"""
+                    SELECT t.test_id, t.question, t.answer, t.question_idx, t.html_file_path
+                    FROM tests_fts
+                    JOIN tests t ON t.rowid = tests_fts.rowid
+                    WHERE tests_fts MATCH ?
+                    AND t.question != ''
+                    ORDER BY bm25(tests_fts, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}), t.test_id
+                    LIMIT ?
+                """, (fts_query, limit))
                 
-                search_query = f"%{query.lower()}%"
-                cur.execute("""
+        except sqlite3.OperationalError as e:
+            if not self._is_missing_search_index(e):
+                logger.error(f"Ошибка поиска в БД: {e}")
+                return []
+            return self._search_questions_like(query, limit)
+        except Exception as e:
+            logger.error(f"Ошибка поиска в БД: {e}")
+            return []
+    
+    @staticmethod
+    def _is_missing_search_index(error: Exception) -> bool:
+        """Проверяет, что ошибка вызвана отсутствием таблицы tests_fts"""
+        if "no such table: tests_fts" in str(error):
+            logger.warning("Индекс tests_fts не найден, используется поиск через LIKE. "
+                           "Запустите html_parser.py для его создания")
+            return True
+        return False
+    
+    def _like_columns(self, conn: sqlite3.Connection) -> Tuple[str, str, Callable[[str], str]]:
+        """
+        Выражения колонок вопроса и ответа для поиска через LIKE и функция
+        приведения запроса к тому же виду.
+        
+        В БД, обработанной текущим парсером, это question_norm/answer_norm
+        (без вызова функций на каждую строку), в старых БД - LOWER(),
+        который в SQLite сворачивает регистр только латиницы.
+        """
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(tests)")}
+        if "question_norm" in columns:
+            return "question_norm", "answer_norm", normalize_text
+        return "LOWER(question)", "LOWER(answer)", str.lower
+    
+    def _search_questions_like(self, query: str, limit: int = 20) -> List[Tuple]:
+        """Поиск по тексту через LIKE (для БД без индекса tests_fts)"""
+        try:
+            with self.get_connection() as conn:
+                cur = conn.cursor()
+                question_col, answer_col, normalize = self._like_columns(conn)
+                
+                search_query = f"%{normalize(query)}%"
+                return self._execute(cur, f"""
                     SELECT test_id, question, answer, question_idx, html_file_path
                     FROM tests 
-                    WHERE (LOWER(question) LIKE ? OR LOWER(answer) LIKE ?)
+                    WHERE ({question_col} LIKE ? OR {answer_col} LIKE ?)
                     AND question != ''
                     ORDER BY 
                         CASE 
-                            WHEN LOWER(question) LIKE ? THEN 1
-                            WHEN LOWER(answer) LIKE ? THEN 2
+                            WHEN {question_col} LIKE ? THEN 1
+                            WHEN {answer_col} LIKE ? THEN 2
                             ELSE 3
                         END,
                         test_id
                     LIMIT ?
                 """, (search_query, search_query, search_query, search_query, limit))
                 
-                return cur.fetchall()
-                
         except Exception as e:
             logger.error(f"Ошибка поиска в БД: {e}")
             return []
     
+    @instrumented
     def get_test_by_id(self, test_id: int) -> List[Tuple]:
         """
         Получить все вопросы конкретного теста
@@ -69,46 +418,96 @@ class ZinDatabase:
         try:
             with self.get_connection() as conn:
                 cur = conn.cursor()
-                cur.execute("""
+                return self._execute(cur, """
                     SELECT test_id, question, answer, question_idx, html_file_path
                     FROM tests 
                     WHERE test_id = ? AND question != ''
                     ORDER BY question_idx
                 """, (test_id,))
                 
-                return cur.fetchall()
-                
         except Exception as e:
             logger.error(f"Ошибка получения теста {test_id}: {e}")
             return []
     
-    def get_random_questions(self, count: int = 5) -> List[Tuple]:
+    @instrumented
+    def get_random_questions(self, count: int = 5, seed: Optional[int] = None) -> List[Tuple]:
         """
         Получить случайные вопросы
         
+        Вместо ORDER BY RANDOM() (сортировка всей таблицы) случайные rowid
+        выбираются из диапазона [MIN(rowid), MAX(rowid)] и проверяются
+        точечными запросами по первичному ключу; промахи (дыры в rowid и
+        пустые вопросы) отбрасываются. Так каждая строка с вопросом
+        выбирается равновероятно. Если дыр слишком много, выборка делается
+        из списка подходящих rowid.
+        
         Args:
             count: Количество вопросов
+            seed: Зерно генератора для воспроизводимой выборки (None - случайно)
             
         Returns:
             List[Tuple]: Список случайных вопросов (test_id, question, answer, question_idx, html_file_path)
         """
+        if count <= 0:
+            return []
+        
+        rng = random.Random(seed)
         try:
             with self.get_connection() as conn:
                 cur = conn.cursor()
-                cur.execute("""
-                    SELECT test_id, question, answer, question_idx, html_file_path
-                    FROM tests 
-                    WHERE question != ''
-                    ORDER BY RANDOM()
-                    LIMIT ?
-                """, (count,))
+                low, high = self._execute(cur, "SELECT (SELECT MIN(rowid) FROM tests), (SELECT MAX(rowid) FROM tests)")[0]
+                if low is None:
+                    return []
                 
-                return cur.fetchall()
+                span = high - low + 1
+                tried = set()
+                found = {}
+                order = []
+                density = 1.0
+                for _ in range(RANDOM_SAMPLE_MAX_ROUNDS):
+                    needed = count - len(found)
+                    if needed <= 0 or len(tried) >= span:
+                        break
+                    
+                    # Берем с запасом с учетом доли попаданий в прошлом раунде
+                    draw = min(span - len(tried), int(needed / max(density, 0.01) * 1.25) + 8)
+                    candidates = []
+                    while len(candidates) < draw:
+                        rowid = rng.randint(low, high)
+                        if rowid not in tried:
+                            tried.add(rowid)
+                            candidates.append(rowid)
+                    order.extend(candidates)
+                    
+                    rows = self._execute(cur, """
+                        SELECT rowid, test_id, question, answer, question_idx, html_file_path
+                        FROM tests
+                        WHERE rowid IN (SELECT value FROM json_each(?))
+                        AND question != ''
+                    """, (json.dumps(candidates),))
+                    hits = {row[0]: row[1:] for row in rows}
+                    found.update(hits)
+                    density = len(hits) / len(candidates) if candidates else density
+                
+                if len(found) >= count or len(tried) >= span:
+                    return [found[rowid] for rowid in order if rowid in found][:count]
+                
+                # Слишком разреженный диапазон rowid - выбираем из списка подходящих строк
+                rowids = [row[0] for row in self._execute(cur, "SELECT rowid FROM tests WHERE question != ''")]
+                sample = rng.sample(rowids, min(count, len(rowids)))
+                rows = self._execute(cur, """
+                    SELECT rowid, test_id, question, answer, question_idx, html_file_path
+                    FROM tests
+                    WHERE rowid IN (SELECT value FROM json_each(?))
+                """, (json.dumps(sample),))
+                rows = {row[0]: row[1:] for row in rows}
+                return [rows[rowid] for rowid in sample if rowid in rows]
                 
         except Exception as e:
             logger.error(f"Ошибка получения случайных вопросов: {e}")
             return []
     
+    @instrumented
     def get_statistics(self) -> dict:
         """
         Получить статистику базы данных
@@ -120,21 +519,29 @@ class ZinDatabase:
             with self.get_connection() as conn:
                 cur = conn.cursor()
                 
-                # Общее количество записей
-                cur.execute("SELECT COUNT(*) FROM tests")
-                total_count = cur.fetchone()[0]
+                # Счетчики поддерживаются триггерами (см. html_parser.init_statistics)
+                try:
+                    rows = self._execute(cur, """
+                        SELECT total_records, unique_tests, records_with_questions
+                        FROM tests_stats WHERE id = 1
+                    """)
+                    row = rows[0] if rows else None
+                except sqlite3.OperationalError as e:
+                    if "no such table" not in str(e):
+                        raise
+                    row = None
                 
-                # Количество уникальных тестов
-                cur.execute("SELECT COUNT(DISTINCT test_id) FROM tests")
-                unique_tests = cur.fetchone()[0]
+                if row is not None:
+                    total_count, unique_tests, with_questions = row
+                else:
+                    logger.warning("Таблица tests_stats не найдена, статистика считается по tests")
+                    total_count, unique_tests, with_questions = self._execute(cur, """
+                        SELECT COUNT(*), COUNT(DISTINCT test_id), COALESCE(SUM(question != ''), 0)
+                        FROM tests
+                    """)[0]
                 
-                # Количество записей с вопросами
-                cur.execute("SELECT COUNT(*) FROM tests WHERE question != ''")
-                with_questions = cur.fetchone()[0]
-                
-                # Последний добавленный тест
-                cur.execute("SELECT MAX(test_id) FROM tests")
-                last_test_id = cur.fetchone()[0] or 0
+                # Последний добавленный тест (по первичному ключу)
+                last_test_id = self._execute(cur, "SELECT MAX(test_id) FROM tests")[0][0] or 0
                 
                 return {
                     'total_records': total_count,
@@ -148,10 +555,15 @@ class ZinDatabase:
             logger.error(f"Ошибка получения статистики: {e}")
             return {}
     
+    @instrumented
+    @cached_query
     def search_by_keywords(self, keywords: List[str], limit: int = 20) -> List[Tuple]:
         """
         Поиск по нескольким ключевым словам
         
+        Каждое ключевое слово должно встретиться в вопросе или ответе (AND),
+        результаты ранжируются по bm25.
+        
         Args:
             keywords: Список ключевых слов
             limit: Максимальное количество результатов
@@ -162,17 +574,46 @@ class ZinDatabase:
         if not keywords:
             return []
         
+        fts_query = " AND ".join(f"({q})" for q in map(build_fts_query, keywords) if q)
+        if not fts_query:
+            return []
+        
+        try:
+            with self.get_connection() as conn:
+                cur = conn.cursor()
+                return self._execute(cur, f"""
+                    SELECT t.test_id, t.question, t.answer, t.question_idx, t.html_file_path
+                    FROM tests_fts
+                    JOIN tests t ON t.rowid = tests_fts.rowid
+                    WHERE tests_fts MATCH ?
+                    AND t.question != ''
+                    ORDER BY bm25(tests_fts, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}), t.test_id
+                    LIMIT ?
+                """, (fts_query, limit))
+                
+        except sqlite3.OperationalError as e:
+            if not self._is_missing_search_index(e):
+                logger.error(f"Ошибка поиска по ключевым словам: {e}")
+                return []
+            return self._search_by_keywords_like(keywords, limit)
+        except Exception as e:
+            logger.error(f"Ошибка поиска по ключевым словам: {e}")
+            return []
+    
+    def _search_by_keywords_like(self, keywords: List[str], limit: int = 20) -> List[Tuple]:
+        """Поиск по ключевым словам (AND) через LIKE (для БД без индекса tests_fts)"""
         try:
             with self.get_connection() as conn:
                 cur = conn.cursor()
+                question_col, answer_col, normalize = self._like_columns(conn)
                 
                 # Создаем условия для каждого ключевого слова
                 conditions = []
                 params = []
                 
                 for keyword in keywords:
-                    keyword_pattern = f"%{keyword.lower()}%"
-                    conditions.append("(LOWER(question) LIKE ? OR LOWER(answer) LIKE ?)")
+                    keyword_pattern = f"%{normalize(keyword)}%"
+                    conditions.append(f"({question_col} LIKE ? OR {answer_col} LIKE ?)")
                     params.extend([keyword_pattern, keyword_pattern])
                 
                 where_clause = " AND ".join(conditions)
@@ -187,16 +628,20 @@ class ZinDatabase:
                     LIMIT ?
                 """
                 
-                cur.execute(query, params)
-                return cur.fetchall()
+                return self._execute(cur, query, params)
                 
         except Exception as e:
             logger.error(f"Ошибка поиска по ключевым словам: {e}")
             return []
     
+    @instrumented
+    @cached_query
     def search_by_any_keywords(self, keywords: List[str], limit: int = 20) -> List[Tuple]:
         """
-        Поиск по любому из ключевых слов (OR) с простым ранжированием по количеству совпадений
+        Поиск по любому из ключевых слов (OR) с ранжированием bm25
+        
+        bm25 учитывает и количество совпавших слов, и их редкость,
+        поэтому строки с большим числом совпадений оказываются выше.
         
         Args:
             keywords: Список ключевых слов
@@ -208,22 +653,52 @@ class ZinDatabase:
         if not keywords:
             return []
         
+        fts_query = " OR ".join(f"({q})" for q in map(build_fts_query, keywords) if q)
+        if not fts_query:
+            return []
+        
+        try:
+            with self.get_connection() as conn:
+                cur = conn.cursor()
+                return self._execute(cur, f"""
+                    SELECT t.test_id, t.question, t.answer, t.question_idx, t.html_file_path
+                    FROM tests_fts
+                    JOIN tests t ON t.rowid = tests_fts.rowid
+                    WHERE tests_fts MATCH ?
+                      AND t.question != ''
+                    ORDER BY bm25(tests_fts, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}), t.test_id
+                    LIMIT ?
+                """, (fts_query, limit))
+        except sqlite3.OperationalError as e:
+            if not self._is_missing_search_index(e):
+                logger.error(f"Ошибка OR-поиска по ключевым словам: {e}")
+                return []
+            return self._search_by_any_keywords_like(keywords, limit)
+        except Exception as e:
+            logger.error(f"Ошибка OR-поиска по ключевым словам: {e}")
+            return []
+    
+    def _search_by_any_keywords_like(self, keywords: List[str], limit: int = 20) -> List[Tuple]:
+        """Поиск по любому из ключевых слов (OR) через LIKE (для БД без индекса tests_fts)"""
         try:
             with self.get_connection() as conn:
                 cur = conn.cursor()
+                question_col, answer_col, normalize = self._like_columns(conn)
                 
                 # Формируем выражение подсчета совпадений и условия OR
                 score_parts = []
                 where_parts = []
                 params = []
                 for kw in keywords:
-                    pattern = f"%{kw.lower()}%"
-                    score_parts.append("(CASE WHEN LOWER(question) LIKE ? OR LOWER(answer) LIKE ? THEN 1 ELSE 0 END)")
+                    pattern = f"%{normalize(kw)}%"
+                    score_parts.append(
+                        f"(CASE WHEN {question_col} LIKE ? OR {answer_col} LIKE ? THEN 1 ELSE 0 END)"
+                    )
                     params.extend([pattern, pattern])
-                    where_parts.append("LOWER(question) LIKE ? OR LOWER(answer) LIKE ?")
+                    where_parts.append(f"{question_col} LIKE ? OR {answer_col} LIKE ?")
                 # Параметры для WHERE (OR)
                 for kw in keywords:
-                    pattern = f"%{kw.lower()}%"
+                    pattern = f"%{normalize(kw)}%"
                     params.extend([pattern, pattern])
                 
                 score_expr = " + ".join(score_parts) if score_parts else "0"
@@ -241,17 +716,302 @@ class ZinDatabase:
                     LIMIT ?
                 """
                 
-                cur.execute(query, params)
-                rows = cur.fetchall()
+                rows = self._execute(cur, query, params)
                 # Возвращаем без поля score
                 return [row[:5] for row in rows]
         except Exception as e:
             logger.error(f"Ошибка OR-поиска по ключевым словам: {e}")
             return []
     
+    @instrumented
+    @cached_query
+    def search_fuzzy(self, query: str, limit: int = 20) -> List[Tuple]:
+        """
+        Нечеткий поиск по фрагменту вопроса через триграммный индекс
+        
+        Находит вопросы по произвольной подстроке (в том числе обрезанной
+        посреди слова) и по тексту с небольшими опечатками. Кандидаты
+        отбираются из tests_trigram по любой из триграмм запроса, затем
+        ранжируются по доле триграмм запроса, найденных в вопросе.
+        
+        Args:
+            query: Фрагмент вопроса
+            limit: Максимальное количество результатов
+            
+        Returns:
+            List[Tuple]: Список кортежей (test_id, question, answer, question_idx, html_file_path)
+        """
+        query_trigrams = sorted(text_trigrams(query))
+        if not query_trigrams:
+            # Слишком короткий запрос для триграмм - обычный поиск по словам
+            return self.search_questions(query, limit)
+        
+        # Для длинных запросов берем равномерную выборку триграмм
+        if len(query_trigrams) > FUZZY_MAX_TRIGRAMS:
+            step = len(query_trigrams) / FUZZY_MAX_TRIGRAMS
+            match_trigrams = [query_trigrams[int(i * step)] for i in range(FUZZY_MAX_TRIGRAMS)]
+        else:
+            match_trigrams = query_trigrams
+        fts_query = " OR ".join('"' + trigram.replace('"', '""') + '"' for trigram in match_trigrams)
+        
+        try:
+            with self.get_connection() as conn:
+                cur = conn.cursor()
+                candidates = self._execute(cur, """
+                    SELECT t.test_id, t.question, t.answer, t.question_idx, t.html_file_path
+                    FROM tests_trigram
+                    JOIN tests t ON t.rowid = tests_trigram.rowid
+                    WHERE tests_trigram MATCH ?
+                    AND t.question != ''
+                    ORDER BY bm25(tests_trigram)
+                    LIMIT ?
+                """, (fts_query, limit * FUZZY_CANDIDATE_FACTOR))
+        except Exception as e:
+            logger.error(f"Ошибка нечеткого поиска: {e}")
+            return []
+        
+        query_set = set(query_trigrams)
+        scored = []
+        for row in candidates:
+            question_set = text_trigrams(row[1])
+            common = len(query_set & question_set)
+            # Основной критерий - какая доля запроса нашлась в вопросе,
+            # при равенстве выше вопрос, в котором меньше лишнего текста
+            scored.append((-common / len(query_set), -common / len(query_set | question_set), row[0], row))
+        scored.sort(key=lambda item: item[:3])
+        return [item[3] for item in scored[:limit]]
+    
+    @instrumented
+    @cached_query
+    def search_unique_questions(self, query: str, limit: int = 20) -> List[Tuple]:
+        """
+        Поиск по тексту с объединением одинаковых вопросов
+        
+        Строки tests с одним и тем же нормализованным вопросом (одинаковым
+        question_id) дают одну запись. Вопросы ранжируются по лучшему bm25
+        среди своих строк.
+        
+        Args:
+            query: Поисковый запрос
+            limit: Максимальное количество вопросов
+            
+        Returns:
+            List[Tuple]: Список кортежей (question_id, question, occurrences, answers),
+            где occurrences - во скольких местах встречается вопрос, answers -
+            различные ответы на него, начиная с самого частого
+        """
+        fts_query = build_fts_query(query)
+        if not fts_query:
+            return []
+        
+        try:
+            with self.get_connection() as conn:
+                cur = conn.cursor()
+                # bm25 нельзя вызывать внутри агрегата, поэтому совпадения
+                # сначала материализуются, а затем группируются по вопросу
+                found = self._execute(cur, f"""
+                    WITH hits AS MATERIALIZED (
+                        SELECT t.question_id,
+                               bm25(tests_fts, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]}) AS rank
+                        FROM tests_fts
+                        JOIN tests t ON t.rowid = tests_fts.rowid
+                        WHERE tests_fts MATCH ?
+                        AND t.question_id IS NOT NULL
+                    )
+                    SELECT q.question_id, q.question, q.occurrences
+                    FROM hits
+                    JOIN questions q ON q.question_id = hits.question_id
+                    GROUP BY q.question_id
+                    ORDER BY MIN(hits.rank), q.question_id
+                    LIMIT ?
+                """, (fts_query, limit))
+                if not found:
+                    return []
+                
+                # Ответы одинаковых вопросов, одинаковые после нормализации - вместе
+                rows = self._execute(cur, """
+                    SELECT question_id, MIN(answer), COUNT(*) AS seen
+                    FROM tests
+                    WHERE question_id IN (SELECT value FROM json_each(?))
+                    GROUP BY question_id, answer_norm
+                    ORDER BY seen DESC, MIN(answer)
+                """, (json.dumps([row[0] for row in found]),))
+                answers = {}
+                for question_id, answer, _ in rows:
+                    answers.setdefault(question_id, []).append(answer)
+                
+                return [(question_id, question, occurrences, answers.get(question_id, []))
+                        for question_id, question, occurrences in found]
+                
+        except sqlite3.OperationalError as e:
+            if "no such table: questions" not in str(e) and "no such column" not in str(e) \
+                    and not self._is_missing_search_index(e):
+                logger.error(f"Ошибка поиска уникальных вопросов: {e}")
+                return []
+            logger.warning("Таблица questions не найдена, вопросы объединяются по результатам обычного поиска")
+            return self._group_questions(self.search_questions(query, limit * FUZZY_CANDIDATE_FACTOR), limit)
+        except Exception as e:
+            logger.error(f"Ошибка поиска уникальных вопросов: {e}")
+            return []
+    
+    @staticmethod
+    def _group_questions(rows: List[Tuple], limit: int) -> List[Tuple]:
+        """Объединяет строки поиска по нормализованному вопросу (для БД без таблицы questions)"""
+        grouped = {}
+        for test_id, question, answer, question_idx, html_file_path in rows:
+            key = normalize_text(question)
+            if key not in grouped:
+                grouped[key] = [question_hash(key), question, 0, {}]
+            entry = grouped[key]
+            entry[2] += 1
+            answer_key = normalize_text(answer)
+            if answer_key not in entry[3]:
+                entry[3][answer_key] = [answer, 0]
+            entry[3][answer_key][1] += 1
+        
+        result = []
+        for question_id, question, occurrences, answers in list(grouped.values())[:limit]:
+            ordered = sorted(answers.values(), key=lambda item: (-item[1], item[0]))
+            result.append((question_id, question, occurrences, [answer for answer, _ in ordered]))
+        return result
+    
+    def _get_semantic_index(self):
+        """
+        Семантический индекс, открытый через mmap.
+        Возвращает None, если индекс не построен или нет numpy.
+        
+        Не чаще раза в config.SEMANTIC_RELOAD_CHECK секунд проверяется
+        meta.json (его semantic_index.py заменяет последним): если индекс
+        перестроен или появился после неудачной загрузки, он открывается
+        заново, а кэш результатов сбрасывается.
+        """
+        with self._semantic_lock:
+            now = time.monotonic()
+            if (self._semantic_checked_at is not None
+                    and now - self._semantic_checked_at < config.SEMANTIC_RELOAD_CHECK):
+                return self._semantic_index
+            self._semantic_checked_at = now
+            
+            try:
+                stat = os.stat(os.path.join(config.SEMANTIC_INDEX_DIR, "meta.json"))
+                version = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                version = None
+            if version == self._semantic_version:
+                return self._semantic_index
+            
+            try:
+                index = semantic_index.SemanticIndex()
+                logger.info(f"Семантический индекс загружен: {len(index)} вопросов, "
+                            f"построен {index.meta.get('built_at')}")
+            except (OSError, RuntimeError, ValueError) as e:
+                # Прежний индекс (если был) работает, пока meta.json не сменится снова
+                self._semantic_version = version
+                logger.warning(f"Семантический индекс недоступен ({e}), используется "
+                               f"{'прежний индекс' if self._semantic_index else 'обычный поиск'}. "
+                               f"Постройте его: python semantic_index.py")
+                return self._semantic_index
+            
+            self._semantic_index = index
+            self._semantic_version = version
+            if self.cache is not None:
+                self.cache.clear()
+            return index
+    
+    @instrumented
+    @cached_query
+    def search_semantic(self, query: str, limit: int = 20) -> List[Tuple]:
+        """
+        Семантический поиск: вопросы, близкие к запросу по TF-IDF символьных n-грамм
+        
+        Находит перефразированные вопросы и вопросы с другими формами слов.
+        На каждый найденный вопрос возвращается одна строка tests. Если
+        индекс не построен (semantic_index.py), выполняется search_questions.
+        
+        Args:
+            query: Поисковый запрос
+            limit: Максимальное количество результатов
+            
+        Returns:
+            List[Tuple]: Список кортежей (test_id, question, answer, question_idx, html_file_path)
+        """
+        index = self._get_semantic_index()
+        if index is None:
+            return self.search_questions(query, limit)
+        
+        try:
+            hits = index.search(query, limit)
+            if not hits:
+                return []
+            
+            with self.get_connection() as conn:
+                cur = conn.cursor()
+                rows = self._execute(cur, """
+                    SELECT question_id, test_id, question, answer, question_idx, html_file_path
+                    FROM tests
+                    WHERE rowid IN (
+                        SELECT MIN(rowid) FROM tests
+                        WHERE question_id IN (SELECT value FROM json_each(?))
+                        GROUP BY question_id
+                    )
+                """, (json.dumps([question_id for question_id, _ in hits]),))
+                rows = {row[0]: row[1:] for row in rows}
+            
+            # Порядок - по сходству; вопросы, удаленные после построения индекса, пропускаются
+            return [rows[question_id] for question_id, _ in hits if question_id in rows]
+            
+        except Exception as e:
+            logger.error(f"Ошибка семантического поиска: {e}")
+            return []
+    
+    @instrumented
+    def get_similar_questions(self, test_id: int, question_idx: int, limit: int = 20) -> List[Tuple]:
+        """
+        Похожие вопросы из других тестов (кластеры clustering.py)
+        
+        Возвращает строки tests, вопросы которых попали в один кластер с
+        заданным вопросом: сначала точные повторы (тот же question_id),
+        затем остальные вопросы кластера. По их ответам можно выбрать
+        общепринятый ответ.
+        
+        Args:
+            test_id: ID теста
+            question_idx: Номер вопроса в тесте
+            limit: Максимальное количество результатов
+            
+        Returns:
+            List[Tuple]: Список кортежей (test_id, question, answer, question_idx, html_file_path)
+        """
+        try:
+            with self.get_connection() as conn:
+                cur = conn.cursor()
+                return self._execute(cur, """
+                    SELECT t.test_id, t.question, t.answer, t.question_idx, t.html_file_path
+                    FROM tests src
+                    JOIN question_clusters c ON c.question_id = src.question_id
+                    JOIN question_clusters m ON m.cluster_id = c.cluster_id
+                    JOIN tests t ON t.question_id = m.question_id
+                    WHERE src.test_id = ? AND src.question_idx = ?
+                    AND t.question_id IS NOT NULL
+                    AND NOT (t.test_id = src.test_id AND t.question_idx = src.question_idx)
+                    ORDER BY t.question_id != src.question_id, t.test_id, t.question_idx
+                    LIMIT ?
+                """, (test_id, question_idx, limit))
+                
+        except sqlite3.OperationalError as e:
+            if "no such table: question_clusters" in str(e) or "no such column" in str(e):
+                logger.warning("Таблица question_clusters не найдена. Запустите clustering.py")
+                return []
+            logger.error(f"Ошибка поиска похожих вопросов: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"Ошибка поиска похожих вопросов: {e}")
+            return []
+    
+    @instrumented
     def get_tests_count_by_date(self) -> List[Tuple]:
         """
-        Получить количество тестов по датам добавления
+        Получить количество тестов по датам добавления (из tests_daily)
         
         Returns:
             List[Tuple]: Список (дата, количество)
@@ -259,24 +1019,33 @@ class ZinDatabase:
         try:
             with self.get_connection() as conn:
                 cur = conn.cursor()
-                cur.execute("""
-                    SELECT DATE(fetched_at) as date, COUNT(DISTINCT test_id) as count
-                    FROM tests 
-                    WHERE fetched_at IS NOT NULL
-                    GROUP BY DATE(fetched_at)
-                    ORDER BY date DESC
-                    LIMIT 30
-                """)
-                
-                return cur.fetchall()
+                try:
+                    return self._execute(cur, """
+                        SELECT date, tests FROM tests_daily
+                        ORDER BY date DESC
+                        LIMIT 30
+                    """)
+                except sqlite3.OperationalError as e:
+                    if "no such table" not in str(e):
+                        raise
+                    logger.warning("Таблица tests_daily не найдена, статистика считается по tests")
+                    return self._execute(cur, """
+                        SELECT DATE(fetched_at) as date, COUNT(DISTINCT test_id) as count
+                        FROM tests 
+                        WHERE fetched_at IS NOT NULL
+                        GROUP BY DATE(fetched_at)
+                        ORDER BY date DESC
+                        LIMIT 30
+                    """)
                 
         except Exception as e:
             logger.error(f"Ошибка получения статистики по датам: {e}")
             return []
     
+    @instrumented
     def get_test_html_content(self, test_id: int) -> Optional[str]:
         """
-        Получить HTML содержимое теста из файла
+        Получить HTML содержимое теста из файла или упакованного хранилища
         
         Args:
             test_id: ID теста
@@ -285,18 +1054,23 @@ class ZinDatabase:
             Optional[str]: HTML содержимое теста или None
         """
         try:
+            if config.HTML_STORAGE_BACKEND != "files":
+                html = get_html_store(readonly=True).load(test_id)
+                if html is None:
+                    logger.warning(f"HTML теста {test_id} не найден в хранилище")
+                return html
+            
             # Сначала пробуем получить путь к файлу из БД
             with self.get_connection() as conn:
                 cur = conn.cursor()
-                cur.execute("""
+                rows = self._execute(cur, """
                     SELECT html_file_path
                     FROM tests 
                     WHERE test_id = ? AND html_file_path IS NOT NULL
                     LIMIT 1
                 """, (test_id,))
                 
-                result = cur.fetchone()
-                html_file_path = result[0] if result else None
+                html_file_path = rows[0][0] if rows else None
             
             # Если путь не найден в БД, формируем стандартный путь
             if not html_file_path:
@@ -314,14 +1088,21 @@ class ZinDatabase:
             logger.error(f"Ошибка получения HTML для теста {test_id}: {e}")
             return None
 
+    @instrumented
     def get_test_html_file_path(self, test_id: int) -> Optional[str]:
         """
         Получить путь к HTML файлу теста, если существует.
+        
+        Для упакованного хранилища страница выгружается во временный файл.
         """
         try:
+            if config.HTML_STORAGE_BACKEND != "files":
+                return get_html_store(readonly=True).file_path(test_id)
+            
             with self.get_connection() as conn:
                 cur = conn.cursor()
-                cur.execute(
+                rows = self._execute(
+                    cur,
                     """
                     SELECT html_file_path
                     FROM tests
@@ -330,8 +1111,7 @@ class ZinDatabase:
                     """,
                     (test_id,),
                 )
-                result = cur.fetchone()
-                html_file_path = result[0] if result else None
+                html_file_path = rows[0][0] if rows else None
             if not html_file_path:
                 html_file_path = os.path.join(config.HTML_STORAGE_DIR, f"test_{test_id}.html")
             if os.path.exists(html_file_path):
@@ -1,21 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os
 from bs4 import BeautifulSoup
-import config
+from html_store import get_html_store
 
 def debug_test_html(test_id):
     """Отладка парсинга конкретного теста"""
-    file_path = os.path.join(config.HTML_STORAGE_DIR, f"test_{test_id}.html")
+    store = get_html_store()
+    html = store.load(test_id)
     
-    if not os.path.exists(file_path):
-        print(f"Файл не найден: {file_path}")
+    if html is None:
+        print(f"Файл не найден: {store.location(test_id)}")
         return
     
-    with open(file_path, 'r', encoding='utf-8') as f:
-        html = f.read()
-    
     soup = BeautifulSoup(html, "html.parser")
     
     print(f"=== ОТЛАДКА ТЕСТА {test_id} ===")
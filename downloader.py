@@ -5,9 +5,19 @@ import time
 import requests
 import os
 import logging
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import config
 import json
+from html_store import get_html_store
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,6 +31,9 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Ответы сервера, при которых нужно снизить частоту запросов
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
 
 def create_html_storage_dir():
     """Создает директорию для хранения HTML файлов"""
@@ -30,48 +43,174 @@ def create_html_storage_dir():
 
 
 def get_html_file_path(test_id):
-    """Возвращает путь к HTML файлу для указанного test_id"""
-    return os.path.join(config.HTML_STORAGE_DIR, f"test_{test_id}.html")
+    """Возвращает путь к HTML файлу (адрес в хранилище) для указанного test_id"""
+    return get_html_store().location(test_id)
 
 
 def get_metadata_file_path():
-    """Возвращает путь к файлу метаданных"""
+    """Возвращает путь к старому файлу метаданных (до перехода на журнал)"""
     return os.path.join(config.HTML_STORAGE_DIR, "download_metadata.json")
 
 
-def load_download_metadata():
-    """Загружает метаданные о скачанных файлах"""
-    metadata_path = get_metadata_file_path()
-    if os.path.exists(metadata_path):
+def get_journal_file_path():
+    """Возвращает путь к журналу скачивания"""
+    return os.path.join(config.HTML_STORAGE_DIR, "download_journal.jsonl")
+
+
+class DownloadJournal:
+    """
+    Журнал скачивания в формате JSONL (только дозапись).
+    
+    Каждый обработанный ID - одна строка, поэтому запись результата
+    стоит O(1) независимо от числа уже скачанных тестов. При открытии
+    журнал проигрывается и восстанавливает множества downloaded/failed
+    и last_processed; более поздняя запись об ID перекрывает раннюю.
+    compact() переписывает журнал, оставляя по строке на ID.
+    
+    Если журнала еще нет, но есть старый download_metadata.json,
+    его содержимое переносится в журнал.
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or get_journal_file_path()
+        self.downloaded = set()
+        self.failed = set()
+        self.last_processed = config.START_ID - 1
+        self._file = None
+        
+        if os.path.exists(self.path):
+            self._replay()
+        elif os.path.exists(get_metadata_file_path()):
+            self._import_legacy_metadata()
+        
+        self._file = open(self.path, 'a', encoding='utf-8')
+    
+    def _replay(self):
+        """Восстанавливает состояние из журнала"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    self._apply(json.loads(line))
+                except ValueError:
+                    # Недописанная строка после аварийного завершения
+                    logger.warning(f"Пропущена поврежденная строка журнала {line_no}")
+    
+    def _apply(self, entry):
+        """Применяет одну запись журнала к состоянию"""
+        if 'last_processed' in entry:
+            self.last_processed = max(self.last_processed, entry['last_processed'])
+            return
+        
+        test_id = entry['id']
+        if entry['ok']:
+            self.downloaded.add(test_id)
+            self.failed.discard(test_id)
+        else:
+            self.failed.add(test_id)
+            self.downloaded.discard(test_id)
+    
+    def _import_legacy_metadata(self):
+        """Переносит данные из download_metadata.json в журнал"""
         try:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(get_metadata_file_path(), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
         except Exception as e:
             logger.error(f"Ошибка загрузки метаданных: {e}")
+            return
+        
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for test_id, info in metadata.get('downloaded', {}).items():
+                f.write(self._format({'id': int(test_id), 'ok': True, **info}))
+            for test_id, info in metadata.get('failed', {}).items():
+                f.write(self._format({'id': int(test_id), 'ok': False, **info}))
+            f.write(self._format({'last_processed': metadata.get('last_processed', config.START_ID - 1)}))
+        self._replay()
+        logger.info(f"Метаданные {get_metadata_file_path()} перенесены в журнал {self.path}")
     
-    return {
-        'downloaded': {},
-        'failed': {},
-        'last_processed': config.START_ID - 1,
-        'total_downloaded': 0,
-        'total_failed': 0
-    }
-
-
-def save_download_metadata(metadata):
-    """Сохраняет метаданные о скачанных файлах"""
-    metadata_path = get_metadata_file_path()
-    try:
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"Ошибка сохранения метаданных: {e}")
+    @staticmethod
+    def _format(entry):
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n"
+    
+    def _append(self, entry):
+        self._apply(entry)
+        self._file.write(self._format(entry))
+    
+    def record_success(self, test_id, status_code, content_length):
+        """Записывает успешное скачивание теста"""
+        self._append({
+            'id': test_id,
+            'ok': True,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'status_code': status_code,
+            'content_length': content_length
+        })
+    
+    def record_failure(self, test_id, error, status_code):
+        """Записывает ошибку скачивания теста"""
+        self._append({
+            'id': test_id,
+            'ok': False,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'error': error,
+            'status_code': status_code
+        })
+    
+    def set_last_processed(self, test_id):
+        """Запоминает последний обработанный ID (пишется при checkpoint)"""
+        self.last_processed = max(self.last_processed, test_id)
+    
+    def checkpoint(self):
+        """Дописывает last_processed и сбрасывает буфер журнала на диск"""
+        try:
+            self._file.write(self._format({'last_processed': self.last_processed}))
+            self._file.flush()
+        except Exception as e:
+            logger.error(f"Ошибка записи журнала: {e}")
+    
+    @property
+    def total_downloaded(self):
+        return len(self.downloaded)
+    
+    @property
+    def total_failed(self):
+        return len(self.failed)
+    
+    def compact(self):
+        """
+        Сжимает журнал: оставляет последнюю запись по каждому ID
+        и одну запись last_processed. Файл заменяется атомарно.
+        """
+        self._file.close()
+        latest = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'id' in entry:
+                    latest[entry['id']] = entry
+        
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for test_id in sorted(latest):
+                f.write(self._format(latest[test_id]))
+            f.write(self._format({'last_processed': self.last_processed}))
+        os.replace(tmp_path, self.path)
+        
+        self._file = open(self.path, 'a', encoding='utf-8')
+        logger.info(f"Журнал сжат: {len(latest)} записей")
+    
+    def close(self):
+        """Записывает финальный checkpoint и закрывает журнал"""
+        if self._file and not self._file.closed:
+            self.checkpoint()
+            self._file.close()
 
 
-def fetch_test_page(session, test_id):
-    """Скачивает HTML страницу теста"""
-    url = f"https://zin.pw/cdz/test/{test_id}"
-    headers = {
+def get_request_headers():
+    """Заголовки запроса страницы теста"""
+    return {
         "User-Agent": config.USER_AGENT,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
         "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
@@ -79,15 +218,18 @@ def fetch_test_page(session, test_id):
         "Connection": "keep-alive",
         "Cookie": config.COOKIE
     }
-    return session.get(url, headers=headers, timeout=30, allow_redirects=True)
+
+
+def fetch_test_page(session, test_id):
+    """Скачивает HTML страницу теста"""
+    url = config.TEST_URL_TEMPLATE.format(test_id=test_id)
+    return session.get(url, headers=get_request_headers(), timeout=30, allow_redirects=True)
 
 
 def save_html_file(test_id, html_content, status_code):
-    """Сохраняет HTML файл на диск"""
-    file_path = get_html_file_path(test_id)
+    """Сохраняет HTML страницу в хранилище (config.HTML_STORAGE_BACKEND)"""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        get_html_store().save(test_id, html_content)
         return True
     except Exception as e:
         logger.error(f"Ошибка сохранения HTML файла для теста {test_id}: {e}")
@@ -96,8 +238,7 @@ def save_html_file(test_id, html_content, status_code):
 
 def is_file_already_downloaded(test_id):
     """Проверяет, был ли файл уже скачан"""
-    file_path = get_html_file_path(test_id)
-    return os.path.exists(file_path) and os.path.getsize(file_path) > 0
+    return get_html_store().exists(test_id)
 
 
 def main():
@@ -107,8 +248,8 @@ def main():
     # Создаем директорию для HTML файлов
     create_html_storage_dir()
     
-    # Загружаем метаданные
-    metadata = load_download_metadata()
+    # Загружаем журнал скачивания
+    journal = DownloadJournal()
     
     # Создаем сессию
     session = requests.Session()
@@ -119,9 +260,9 @@ def main():
     error_count = 0
     skipped_count = 0
     
-    start_id = max(metadata['last_processed'] + 1, config.START_ID)
+    start_id = max(journal.last_processed + 1, config.START_ID)
     logger.info(f"Начинаем скачивание с ID {start_id} до {config.END_ID}")
-    logger.info(f"Ранее скачано: {metadata['total_downloaded']}, ошибок: {metadata['total_failed']}")
+    logger.info(f"Ранее скачано: {journal.total_downloaded}, ошибок: {journal.total_failed}")
     
     try:
         for test_id in range(start_id, config.END_ID + 1):
@@ -140,52 +281,34 @@ def main():
                     # Сохраняем HTML файл
                     if save_html_file(test_id, resp.text, resp.status_code):
                         downloaded_count += 1
-                        metadata['downloaded'][str(test_id)] = {
-                            'timestamp': datetime.now(timezone.utc).isoformat(),
-                            'status_code': resp.status_code,
-                            'content_length': len(resp.text)
-                        }
+                        journal.record_success(test_id, resp.status_code, len(resp.text))
                         
                         if test_id % 100 == 0:
                             logger.info(f"Скачан тест {test_id}, размер: {len(resp.text)} символов")
                     else:
                         error_count += 1
-                        metadata['failed'][str(test_id)] = {
-                            'timestamp': datetime.now(timezone.utc).isoformat(),
-                            'error': 'Failed to save file',
-                            'status_code': resp.status_code
-                        }
+                        journal.record_failure(test_id, 'Failed to save file', resp.status_code)
                 else:
                     error_count += 1
                     logger.warning(f"HTTP {resp.status_code} для теста {test_id}")
-                    metadata['failed'][str(test_id)] = {
-                        'timestamp': datetime.now(timezone.utc).isoformat(),
-                        'error': f'HTTP {resp.status_code}',
-                        'status_code': resp.status_code
-                    }
+                    journal.record_failure(test_id, f'HTTP {resp.status_code}', resp.status_code)
                     
                     # Увеличиваем задержку при ошибках сервера
-                    if resp.status_code in (429, 503, 502, 500):
+                    if resp.status_code in RETRYABLE_STATUS_CODES:
                         time.sleep(5)
             
             except Exception as e:
                 error_count += 1
                 logger.error(f"Ошибка скачивания теста {test_id}: {e}")
-                metadata['failed'][str(test_id)] = {
-                    'timestamp': datetime.now(timezone.utc).isoformat(),
-                    'error': str(e),
-                    'status_code': None
-                }
+                journal.record_failure(test_id, str(e), None)
                 time.sleep(2)
             
-            # Обновляем метаданные
-            metadata['last_processed'] = test_id
-            metadata['total_downloaded'] = len(metadata['downloaded'])
-            metadata['total_failed'] = len(metadata['failed'])
+            # Обновляем журнал
+            journal.set_last_processed(test_id)
             
-            # Сохраняем метаданные каждые 100 файлов
+            # Сбрасываем журнал на диск каждые 100 файлов
             if test_id % 100 == 0:
-                save_download_metadata(metadata)
+                journal.checkpoint()
                 logger.info(f"Прогресс: {test_id}/{config.END_ID}, "
                           f"скачано: {downloaded_count}, ошибок: {error_count}, пропущено: {skipped_count}")
             
@@ -196,20 +319,262 @@ def main():
         logger.info("Скачивание прервано пользователем")
     
     finally:
-        # Сохраняем финальные метаданные
-        save_download_metadata(metadata)
-        
-        total_downloaded = metadata['total_downloaded']
-        total_failed = metadata['total_failed']
+        # Сохраняем финальное состояние журнала
+        journal.close()
         
         logger.info(f"Скачивание завершено:")
-        logger.info(f"  - Всего скачано: {total_downloaded}")
-        logger.info(f"  - Всего ошибок: {total_failed}")
+        logger.info(f"  - Всего скачано: {journal.total_downloaded}")
+        logger.info(f"  - Всего ошибок: {journal.total_failed}")
         logger.info(f"  - В этой сессии скачано: {downloaded_count}")
         logger.info(f"  - В этой сессии ошибок: {error_count}")
         logger.info(f"  - Пропущено (уже скачано): {skipped_count}")
-        logger.info(f"  - Последний обработанный ID: {metadata['last_processed']}")
+        logger.info(f"  - Последний обработанный ID: {journal.last_processed}")
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов (token bucket) для asyncio.
+    
+    Один экземпляр разделяют все воркеры, поэтому суммарная частота
+    не превышает rate запросов в секунду. pause() приостанавливает
+    выдачу токенов для всего пула.
+    """
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Ждет и забирает один токен"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    @property
+    def paused(self):
+        """Идет ли сейчас пауза"""
+        return time.monotonic() < self.paused_until
+    
+    def pause(self, seconds):
+        """Приостанавливает выдачу токенов на seconds секунд"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class AdaptiveBackoff:
+    """
+    Адаптивное замедление пула при ответах 429/5xx.
+    
+    При ошибке сервера частота ограничителя уменьшается вдвое, а весь пул
+    ставится на паузу, которая растет с каждой ошибкой подряд. Ответы на
+    запросы, отправленные до паузы, приходят во время нее и относятся к
+    той же перегрузке, поэтому ошибки во время паузы не замедляют пул
+    повторно. После серии успешных ответов частота постепенно
+    возвращается к исходной.
+    """
+    
+    def __init__(self, bucket, min_rate=None, max_pause=60.0, recovery_after=20):
+        self.bucket = bucket
+        self.max_rate = bucket.rate
+        self.min_rate = min_rate or bucket.rate / 16
+        self.max_pause = max_pause
+        self.recovery_after = recovery_after
+        self.consecutive_errors = 0
+        self.successes = 0
+    
+    def on_success(self):
+        """Учитывает успешный ответ"""
+        self.consecutive_errors = 0
+        self.successes += 1
+        if self.successes >= self.recovery_after and self.bucket.rate < self.max_rate:
+            self.successes = 0
+            self.bucket.rate = min(self.max_rate, self.bucket.rate * 1.25)
+            logger.info(f"Частота запросов увеличена до {self.bucket.rate:.2f}/с")
+    
+    def on_server_error(self, status_code):
+        """Учитывает ответ 429/5xx: снижает частоту и ставит пул на паузу"""
+        self.successes = 0
+        if self.bucket.paused:
+            return
+        self.consecutive_errors += 1
+        self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+        pause = min(self.max_pause, 5.0 * 2 ** (self.consecutive_errors - 1))
+        self.bucket.pause(pause)
+        logger.warning(f"HTTP {status_code}: пауза {pause:.0f} с, "
+                       f"частота снижена до {self.bucket.rate:.2f}/с")
+    
+    def on_network_error(self):
+        """Учитывает сетевую ошибку: короткая пауза без снижения частоты"""
+        self.successes = 0
+        self.bucket.pause(2.0)
+
+
+async def download_async(test_ids, journal, concurrency=None, rate=None):
+    """
+    Асинхронно скачивает страницы тестов.
+    
+    Не больше concurrency запросов одновременно идут через одну сессию
+    aiohttp (общий пул соединений), а суммарная частота ограничена
+    TokenBucket с адаптивным замедлением при 429/5xx. Страницы сохраняются
+    в отдельном потоке (запись на диск или в упакованное хранилище со
+    сжатием не блокирует цикл событий); поток один, поэтому запись в
+    хранилище идет последовательно через одно соединение.
+    
+    Args:
+        test_ids: ID тестов для скачивания (уже без скачанных ранее)
+        journal: Журнал скачивания (DownloadJournal), дописывается по мере работы
+        concurrency: Максимум запросов одновременно (config.DOWNLOAD_CONCURRENCY)
+        rate: Максимум запросов в секунду (config.DOWNLOAD_RATE_LIMIT)
+    
+    Returns:
+        tuple: (downloaded_count, error_count)
+    """
+    concurrency = concurrency or config.DOWNLOAD_CONCURRENCY
+    loop = asyncio.get_running_loop()
+    saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zin-save")
+    bucket = TokenBucket(rate or config.DOWNLOAD_RATE_LIMIT)
+    backoff = AdaptiveBackoff(bucket)
+    queue = asyncio.Queue()
+    for test_id in test_ids:
+        queue.put_nowait(test_id)
+    
+    # last_processed двигается только по непрерывному префиксу завершенных ID,
+    # чтобы при перезапуске не пропустить тесты, которые еще были в работе
+    pending = deque(sorted(test_ids))
+    completed = set()
+    counters = {'downloaded': 0, 'errors': 0, 'done': 0}
+    
+    def mark_done(test_id):
+        completed.add(test_id)
+        while pending and pending[0] in completed:
+            journal.set_last_processed(pending.popleft())
+        counters['done'] += 1
+        if counters['done'] % 100 == 0:
+            journal.checkpoint()
+            logger.info(f"Прогресс: {counters['done']}/{len(test_ids)}, "
+                        f"скачано: {counters['downloaded']}, ошибок: {counters['errors']}, "
+                        f"частота: {bucket.rate:.2f}/с")
+    
+    async def worker(session):
+        while True:
+            try:
+                test_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            
+            await bucket.acquire()
+            url = config.TEST_URL_TEMPLATE.format(test_id=test_id)
+            try:
+                async with session.get(url, allow_redirects=True, max_redirects=30) as resp:
+                    text = await resp.text()
+                    status_code = resp.status
+                
+                if status_code == 200:
+                    backoff.on_success()
+                    if await loop.run_in_executor(saver, save_html_file, test_id, text, status_code):
+                        counters['downloaded'] += 1
+                        journal.record_success(test_id, status_code, len(text))
+                    else:
+                        counters['errors'] += 1
+                        journal.record_failure(test_id, 'Failed to save file', status_code)
+                else:
+                    counters['errors'] += 1
+                    logger.warning(f"HTTP {status_code} для теста {test_id}")
+                    journal.record_failure(test_id, f'HTTP {status_code}', status_code)
+                    if status_code in RETRYABLE_STATUS_CODES:
+                        backoff.on_server_error(status_code)
+            
+            except Exception as e:
+                counters['errors'] += 1
+                logger.error(f"Ошибка скачивания теста {test_id}: {e}")
+                journal.record_failure(test_id, str(e), None)
+                backoff.on_network_error()
+            
+            mark_done(test_id)
+    
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=get_request_headers()) as session:
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    finally:
+        saver.shutdown(wait=True)
+    
+    return counters['downloaded'], counters['errors']
+
+
+def main_async(concurrency=None, rate=None):
+    """Асинхронный режим скачивания (python downloader.py --async)"""
+    if aiohttp is None:
+        logger.error("Для асинхронного режима установите пакет aiohttp")
+        return
+    
+    logger.info("Запуск асинхронного скачивания HTML файлов...")
+    create_html_storage_dir()
+    journal = DownloadJournal()
+    
+    start_id = max(journal.last_processed + 1, config.START_ID)
+    test_ids = []
+    skipped_count = 0
+    for test_id in range(start_id, config.END_ID + 1):
+        if is_file_already_downloaded(test_id):
+            skipped_count += 1
+        else:
+            test_ids.append(test_id)
+    
+    logger.info(f"Начинаем скачивание с ID {start_id} до {config.END_ID}: "
+                f"{len(test_ids)} тестов, пропущено (уже скачано): {skipped_count}")
+    
+    downloaded_count = error_count = 0
+    try:
+        downloaded_count, error_count = asyncio.run(download_async(test_ids, journal, concurrency, rate))
+        journal.set_last_processed(config.END_ID)
+    except KeyboardInterrupt:
+        logger.info("Скачивание прервано пользователем")
+    finally:
+        journal.close()
+        
+        logger.info(f"Скачивание завершено:")
+        logger.info(f"  - Всего скачано: {journal.total_downloaded}")
+        logger.info(f"  - Всего ошибок: {journal.total_failed}")
+        logger.info(f"  - В этой сессии скачано: {downloaded_count}")
+        logger.info(f"  - В этой сессии ошибок: {error_count}")
+        logger.info(f"  - Последний обработанный ID: {journal.last_processed}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Скачивание HTML страниц тестов")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="асинхронный режим с несколькими запросами одновременно")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="максимум одновременных запросов (по умолчанию config.DOWNLOAD_CONCURRENCY)")
+    parser.add_argument("--rps", type=float, default=None,
+                        help="максимум запросов в секунду (по умолчанию config.DOWNLOAD_RATE_LIMIT)")
+    parser.add_argument("--compact-journal", action="store_true",
+                        help="сжать журнал скачивания (по строке на ID) и выйти")
+    args = parser.parse_args()
+    
+    if args.compact_journal:
+        create_html_storage_dir()
+        journal = DownloadJournal()
+        journal.compact()
+        journal.close()
+    elif args.use_async:
+        main_async(concurrency=args.concurrency, rate=args.rps)
+    else:
+        main()
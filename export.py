@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Потоковая выгрузка таблицы tests в Parquet, Arrow IPC или JSONL.
+
+Таблица читается пакетами по EXPORT_CHUNK_SIZE строк и каждый пакет сразу
+записывается в файл, поэтому память не зависит от размера базы. raw_html
+и производные колонки (question_norm, answer_norm) не выгружаются.
+
+Для Parquet и Arrow (нужен пакет pyarrow) используются компактные типы:
+test_id - int32, question_idx и parser_version - int16, parsed_at и
+fetched_at - timestamp, content_hash - 16 байт вместо hex строки,
+html_file_path в Parquet - словарное кодирование (в Arrow IPC - строка:
+формат файла IPC не допускает замену словаря между пакетами).
+
+Инкрементальная выгрузка: --since <parsed_at> выгружает только тесты,
+разобранные позже указанного момента. Максимальный parsed_at выгрузки
+пишется в лог и в метаданные Parquet (max_parsed_at) - его можно передать
+в --since при следующем запуске.
+
+Запуск: python export.py tests.parquet [--since 2024-09-01T00:00:00+00:00]
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import argparse
+import urllib.parse
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+import config
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = [
+    "test_id", "question_idx", "question", "answer", "question_id",
+    "html_file_path", "fetched_at", "parsed_at", "content_hash", "parser_version",
+]
+
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".jsonl": "jsonl"}
+
+
+def arrow_schema(fmt: str = "parquet"):
+    """
+    Схема Arrow для выгрузки.
+    
+    Словарь html_file_path у каждого пакета свой; Parquet это допускает,
+    а файл Arrow IPC - нет, поэтому для "arrow" колонка остается строкой.
+    """
+    timestamp = pa.timestamp("us", tz="UTC")
+    path_type = pa.dictionary(pa.int32(), pa.string()) if fmt == "parquet" else pa.string()
+    return pa.schema([
+        ("test_id", pa.int32()),
+        ("question_idx", pa.int16()),
+        ("question", pa.string()),
+        ("answer", pa.string()),
+        ("question_id", pa.int64()),
+        ("html_file_path", path_type),
+        ("fetched_at", timestamp),
+        ("parsed_at", timestamp),
+        ("content_hash", pa.binary(16)),
+        ("parser_version", pa.int16()),
+    ])
+
+
+def open_readonly(db_path: str = None) -> sqlite3.Connection:
+    """Соединение только для чтения, чтобы выгрузка не мешала парсеру"""
+    db_path = db_path or config.DB_PATH
+    uri = f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
+def iter_chunks(conn, since: Optional[str] = None, chunk_size: int = None) -> Iterator[List[tuple]]:
+    """Строки tests пакетами в порядке первичного ключа"""
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tests)")}
+    # В старых БД question_id еще нет
+    select = [name if name in columns else f"NULL AS {name}" for name in EXPORT_COLUMNS]
+    
+    query = f"SELECT {', '.join(select)} FROM tests"
+    params = []
+    if since:
+        query += " WHERE parsed_at > ?"
+        params.append(since)
+    query += " ORDER BY test_id, question_idx"
+    
+    cur = conn.execute(query, params)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # Время без пояса (fetched_at старых версий) считаем UTC
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def to_record_batch(rows: List[tuple], schema):
+    """Пакет строк tests -> RecordBatch с компактными типами"""
+    columns = list(zip(*rows))
+    index = {name: i for i, name in enumerate(EXPORT_COLUMNS)}
+    arrays = []
+    for field in schema:
+        values = columns[index[field.name]]
+        if field.name in ("fetched_at", "parsed_at"):
+            values = [_parse_timestamp(value) for value in values]
+        elif field.name == "content_hash":
+            values = [bytes.fromhex(value) if value else None for value in values]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export(output: str, fmt: str = None, since: Optional[str] = None, db_path: str = None,
+           chunk_size: int = None) -> dict:
+    """
+    Выгружает tests в файл output.
+    
+    Args:
+        output: Путь к файлу
+        fmt: "parquet", "arrow" или "jsonl" (по умолчанию - по расширению файла)
+        since: Выгружать только строки с parsed_at позже этого значения
+        db_path: Путь к БД (по умолчанию config.DB_PATH)
+        chunk_size: Строк в пакете
+    
+    Returns:
+        dict: rows - выгружено строк, max_parsed_at - для следующего --since
+    """
+    fmt = fmt or FORMATS.get(os.path.splitext(output)[1].lower())
+    if fmt not in ("parquet", "arrow", "jsonl"):
+        raise ValueError(f"Неизвестный формат выгрузки для {output}: укажите --format")
+    if fmt != "jsonl" and pa is None:
+        raise RuntimeError("Для выгрузки в Parquet/Arrow установите пакет pyarrow")
+    
+    conn = open_readonly(db_path)
+    tmp_path = f"{output}.tmp"
+    total = 0
+    max_parsed_at = since
+    parsed_at_idx = EXPORT_COLUMNS.index("parsed_at")
+    writer = None
+    try:
+        if fmt == "jsonl":
+            writer = open(tmp_path, "w", encoding="utf-8")
+        else:
+            schema = arrow_schema(fmt)
+            if fmt == "parquet":
+                writer = pa.parquet.ParquetWriter(tmp_path, schema, compression="zstd")
+            else:
+                writer = pa.ipc.new_file(tmp_path, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        
+        for rows in iter_chunks(conn, since, chunk_size):
+            if fmt == "jsonl":
+                for row in rows:
+                    writer.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+                    writer.write("\n")
+            else:
+                writer.write_batch(to_record_batch(rows, schema))
+            
+            chunk_max = max((row[parsed_at_idx] for row in rows if row[parsed_at_idx]), default=None)
+            if chunk_max and (max_parsed_at is None or chunk_max > max_parsed_at):
+                max_parsed_at = chunk_max
+            total += len(rows)
+            logger.info(f"Выгружено строк: {total}")
+        
+        if fmt == "parquet":
+            writer.add_key_value_metadata({"max_parsed_at": max_parsed_at or "", "since": since or ""})
+        writer.close()
+        writer = None
+        os.replace(tmp_path, output)
+    except BaseException:
+        # Недописанный файл не оставляется рядом с выгрузкой
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+    
+    return {"rows": total, "max_parsed_at": max_parsed_at}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description="Выгрузка базы ответов в Parquet, Arrow IPC или JSONL")
+    parser.add_argument("output", help="файл выгрузки (.parquet, .arrow, .jsonl)")
+    parser.add_argument("--format", choices=["parquet", "arrow", "jsonl"], help="формат (по умолчанию - по расширению)")
+    parser.add_argument("--since", help="выгрузить только тесты с parsed_at позже этого значения (ISO 8601)")
+    parser.add_argument("--db", default=config.DB_PATH, help="путь к БД (по умолчанию config.DB_PATH)")
+    parser.add_argument("--chunk-size", type=int, default=config.EXPORT_CHUNK_SIZE, help="строк в пакете")
+    args = parser.parse_args()
+    
+    result = export(args.output, args.format, args.since, args.db, args.chunk_size)
+    logger.info(f"Выгрузка завершена: {result['rows']} строк в {args.output}. "
+                f"Для следующей инкрементальной выгрузки: --since {result['max_parsed_at']}")
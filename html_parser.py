@@ -5,10 +5,24 @@ import os
 import sqlite3
 import logging
 import re
+import argparse
+import multiprocessing
+import time
+import random
+import hashlib
 from bs4 import BeautifulSoup
 from datetime import datetime, timezone
 import config
 import json
+from html_store import get_html_store
+from text_normalize import normalize_text, question_hash
+from parse_stats import ParseStats, PageStats, NULL_STATS
+
+try:
+    from lxml import html as lxml_html
+    LXML_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+except ImportError:
+    lxml_html = None
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,10 +36,26 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Версия правил извлечения вопросов и ответов. Увеличивайте при любом
+# изменении parse_test_html: тесты, разобранные старой версией, будут
+# перепарсены при следующем запуске без очистки базы.
+PARSER_VERSION = 2
+
 
-def init_db(conn):
-    """Инициализация базы данных с обновленной схемой"""
+def init_db(conn, bulk_load=False):
+    """
+    Инициализация базы данных с обновленной схемой
+    
+    Args:
+        conn: Соединение с БД
+        bulk_load: Включить WAL и synchronous=NORMAL для массовой загрузки.
+            Режим WAL сохраняется в файле БД и не мешает читателям (боту).
+    """
     cur = conn.cursor()
+    if bulk_load:
+        cur.execute("PRAGMA journal_mode = WAL")
+        cur.execute("PRAGMA synchronous = NORMAL")
+    
     cur.execute("""
     CREATE TABLE IF NOT EXISTS tests (
         test_id INTEGER,
@@ -51,14 +81,641 @@ def init_db(conn):
     except sqlite3.OperationalError:
         pass  # Колонка уже существует
     
+    # Хеш содержимого HTML и версия парсера для инкрементального перепарсинга
+    try:
+        cur.execute("ALTER TABLE tests ADD COLUMN content_hash TEXT")
+    except sqlite3.OperationalError:
+        pass  # Колонка уже существует
+    
+    try:
+        cur.execute("ALTER TABLE tests ADD COLUMN parser_version INTEGER")
+    except sqlite3.OperationalError:
+        pass  # Колонка уже существует
+    
+    # Нормализованный текст (text_normalize.normalize_text) для поиска
+    try:
+        cur.execute("ALTER TABLE tests ADD COLUMN question_norm TEXT")
+    except sqlite3.OperationalError:
+        pass  # Колонка уже существует
+    
+    try:
+        cur.execute("ALTER TABLE tests ADD COLUMN answer_norm TEXT")
+    except sqlite3.OperationalError:
+        pass  # Колонка уже существует
+    
+    # Ссылка на канонический вопрос в таблице questions
+    try:
+        cur.execute("ALTER TABLE tests ADD COLUMN question_id INTEGER")
+    except sqlite3.OperationalError:
+        pass  # Колонка уже существует
+    
+    # Сигнатуры страниц хранилища (html_store signatures()) на момент
+    # последней проверки: страницы с той же сигнатурой не перечитываются
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS page_signatures (
+        test_id INTEGER PRIMARY KEY,
+        signature TEXT NOT NULL
+    )
+    """)
+    
+    # Служебные значения (поколение БД generation и т.п.)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS db_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    
+    init_search_index(conn)
+    if config.ENABLE_TRIGRAM_INDEX:
+        init_trigram_index(conn)
+    init_statistics(conn)
+    init_questions(conn)
+    
     conn.commit()
+    apply_migrations(conn)
 
 
-def parse_test_html(html):
-    """Парсинг HTML содержимого теста"""
+def _migration_secondary_indexes(cur):
+    """Частичные и покрывающие индексы для запросов парсера и бота"""
+    # Разобранные тесты: прогресс парсинга, is_test_already_parsed и состояние
+    # инкрементального перепарсинга (load_parse_state) без чтения строк таблицы
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_tests_parse_state
+    ON tests (test_id, content_hash, parser_version)
+    WHERE question_idx = 0 AND parsed_at IS NOT NULL
+    """)
+    # Записи с вопросами (случайная выборка, get_test_by_id)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_tests_with_question
+    ON tests (test_id) WHERE question != ''
+    """)
+    # Путь к HTML теста (get_test_html_file_path, get_test_html_content)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_tests_html_file_path
+    ON tests (test_id, html_file_path) WHERE html_file_path IS NOT NULL
+    """)
+    # Группировка по датам скачивания (пересчет tests_daily)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_tests_fetched_at
+    ON tests (fetched_at, test_id) WHERE fetched_at IS NOT NULL
+    """)
+
+
+def _migration_normalized_text(cur):
+    """
+    Заполняет question_norm/answer_norm и переводит полнотекстовые
+    индексы на нормализованные колонки
+    """
+    conn = cur.connection
+    conn.create_function("normalize_text", 1, normalize_text, deterministic=True)
+    
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tests_trigram'")
+    has_trigram = cur.fetchone() is not None
+    
+    # Старые индексы построены по question/answer - удаляем их вместе с
+    # триггерами до заполнения колонок, чтобы UPDATE не трогал индексы
+    for trigger in ("tests_fts_ai", "tests_fts_ad", "tests_fts_au",
+                    "tests_trigram_ai", "tests_trigram_ad", "tests_trigram_au"):
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cur.execute("DROP TABLE IF EXISTS tests_fts")
+    cur.execute("DROP TABLE IF EXISTS tests_trigram")
+    
+    cur.execute("UPDATE tests SET question_norm = normalize_text(question), answer_norm = normalize_text(answer)")
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_tests_question_norm
+    ON tests (question_norm) WHERE question_norm != ''
+    """)
+    
+    init_search_index(conn)
+    if has_trigram or config.ENABLE_TRIGRAM_INDEX:
+        init_trigram_index(conn)
+
+
+def _migration_question_ids(cur):
+    """Заполняет tests.question_id и строит таблицу questions по существующим данным"""
+    conn = cur.connection
+    conn.create_function("question_hash", 1, question_hash, deterministic=True)
+    cur.execute("UPDATE tests SET question_id = question_hash(question_norm)")
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_tests_question_id
+    ON tests (question_id) WHERE question_id IS NOT NULL
+    """)
+    rebuild_questions(conn, commit=False)
+
+
+# Версионированные миграции схемы: (версия, описание, функция(cur)).
+# Номер последней примененной миграции хранится в PRAGMA user_version,
+# новые миграции добавляются только в конец списка.
+SCHEMA_MIGRATIONS = [
+    (1, "вторичные индексы таблицы tests", _migration_secondary_indexes),
+    (2, "нормализованный текст вопросов и ответов", _migration_normalized_text),
+    (3, "канонические вопросы (таблица questions)", _migration_question_ids),
+]
+
+
+def apply_migrations(conn):
+    """
+    Применяет миграции из SCHEMA_MIGRATIONS, которых еще нет в БД.
+    
+    Каждая миграция выполняется в отдельной транзакции вместе с
+    обновлением user_version, поэтому прерванная миграция будет
+    применена заново при следующем запуске.
+    
+    Returns:
+        int: Версия схемы после миграций
+    """
+    cur = conn.cursor()
+    cur.execute("PRAGMA user_version")
+    version = cur.fetchone()[0]
+    
+    for target, description, migrate in SCHEMA_MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info(f"Миграция схемы до версии {target}: {description}")
+        cur.execute("BEGIN")
+        try:
+            migrate(cur)
+            cur.execute(f"PRAGMA user_version = {int(target)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+    
+    return version
+
+
+def init_search_index(conn):
+    """
+    Создает полнотекстовый индекс FTS5 по нормализованным вопросам и ответам
+    (колонки question_norm и answer_norm).
+    
+    Индекс связан с таблицей tests (external content) и поддерживается
+    триггерами, поэтому любая запись в tests сразу попадает в поиск.
+    При первом создании индекс заполняется из уже существующих данных.
+    
+    Важно: tests не имеет INTEGER PRIMARY KEY, поэтому VACUUM может
+    перенумеровать rowid - после VACUUM вызовите rebuild_search_index().
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tests_fts'")
+    index_exists = cur.fetchone() is not None
+    
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS tests_fts USING fts5(
+        question_norm,
+        answer_norm,
+        content='tests',
+        content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """)
+    
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_fts_ai AFTER INSERT ON tests BEGIN
+        INSERT INTO tests_fts(rowid, question_norm, answer_norm)
+        VALUES (new.rowid, new.question_norm, new.answer_norm);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_fts_ad AFTER DELETE ON tests BEGIN
+        INSERT INTO tests_fts(tests_fts, rowid, question_norm, answer_norm)
+        VALUES ('delete', old.rowid, old.question_norm, old.answer_norm);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_fts_au AFTER UPDATE OF question_norm, answer_norm ON tests BEGIN
+        INSERT INTO tests_fts(tests_fts, rowid, question_norm, answer_norm)
+        VALUES ('delete', old.rowid, old.question_norm, old.answer_norm);
+        INSERT INTO tests_fts(rowid, question_norm, answer_norm)
+        VALUES (new.rowid, new.question_norm, new.answer_norm);
+    END
+    """)
+    
+    if not index_exists:
+        logger.info("Построение полнотекстового индекса tests_fts...")
+        cur.execute("INSERT INTO tests_fts(tests_fts) VALUES ('rebuild')")
+
+
+def init_trigram_index(conn):
+    """
+    Создает триграммный индекс FTS5 по нормализованному тексту вопросов.
+    
+    Используется ZinDatabase.search_fuzzy для поиска по обрывкам
+    вопросов (в том числе обрезанным посреди слова) и с опечатками.
+    Как и tests_fts, связан с tests и поддерживается триггерами.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tests_trigram'")
+    index_exists = cur.fetchone() is not None
+    
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS tests_trigram USING fts5(
+        question_norm,
+        content='tests',
+        content_rowid='rowid',
+        tokenize='trigram'
+    )
+    """)
+    
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_trigram_ai AFTER INSERT ON tests BEGIN
+        INSERT INTO tests_trigram(rowid, question_norm) VALUES (new.rowid, new.question_norm);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_trigram_ad AFTER DELETE ON tests BEGIN
+        INSERT INTO tests_trigram(tests_trigram, rowid, question_norm)
+        VALUES ('delete', old.rowid, old.question_norm);
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_trigram_au AFTER UPDATE OF question_norm ON tests BEGIN
+        INSERT INTO tests_trigram(tests_trigram, rowid, question_norm)
+        VALUES ('delete', old.rowid, old.question_norm);
+        INSERT INTO tests_trigram(rowid, question_norm) VALUES (new.rowid, new.question_norm);
+    END
+    """)
+    
+    if not index_exists:
+        logger.info("Построение триграммного индекса tests_trigram...")
+        cur.execute("INSERT INTO tests_trigram(tests_trigram) VALUES ('rebuild')")
+
+
+def rebuild_search_index(conn):
+    """Полностью перестраивает полнотекстовые индексы по таблице tests"""
+    cur = conn.cursor()
+    cur.execute("INSERT INTO tests_fts(tests_fts) VALUES ('rebuild')")
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tests_trigram'")
+    if cur.fetchone():
+        cur.execute("INSERT INTO tests_trigram(tests_trigram) VALUES ('rebuild')")
+
+
+# Изменение счетчиков статистики при вставке (знак +) или удалении (знак -) строки tests
+_STATS_DELTA_SQL = """
+        UPDATE tests_stats SET
+            total_records = total_records {sign} 1,
+            unique_tests = unique_tests {sign} ({row}.question_idx = 0),
+            records_with_questions = records_with_questions {sign} (COALESCE({row}.question, '') != '')
+        WHERE id = 1;
+"""
+
+_DAILY_INSERT_SQL = """
+        INSERT INTO tests_daily (date, tests)
+        SELECT DATE(new.fetched_at), 1
+        WHERE new.question_idx = 0 AND DATE(new.fetched_at) IS NOT NULL
+        ON CONFLICT(date) DO UPDATE SET tests = tests + 1;
+"""
+
+_DAILY_DELETE_SQL = """
+        UPDATE tests_daily SET tests = tests - 1
+        WHERE old.question_idx = 0 AND date = DATE(old.fetched_at);
+        DELETE FROM tests_daily WHERE tests <= 0;
+"""
+
+
+def init_statistics(conn):
+    """
+    Создает материализованную статистику по таблице tests.
+    
+    tests_stats - одна строка со счетчиками записей, тестов и записей с
+    вопросами, tests_daily - количество тестов по датам fetched_at. Тест
+    считается по строке с question_idx = 0. Счетчики поддерживаются
+    триггерами, поэтому ZinDatabase.get_statistics не сканирует tests.
+    При первом создании статистика считается по существующим данным,
+    при расхождении ее можно пересчитать: python html_parser.py --rebuild-stats
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tests_stats'")
+    stats_exist = cur.fetchone() is not None
+    
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS tests_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_records INTEGER NOT NULL DEFAULT 0,
+        unique_tests INTEGER NOT NULL DEFAULT 0,
+        records_with_questions INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS tests_daily (
+        date TEXT PRIMARY KEY,
+        tests INTEGER NOT NULL
+    )
+    """)
+    
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tests_stats_ai AFTER INSERT ON tests BEGIN
+        {_STATS_DELTA_SQL.format(sign='+', row='new')}
+        {_DAILY_INSERT_SQL}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tests_stats_ad AFTER DELETE ON tests BEGIN
+        {_STATS_DELTA_SQL.format(sign='-', row='old')}
+        {_DAILY_DELETE_SQL}
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tests_stats_au AFTER UPDATE OF question, question_idx, fetched_at ON tests BEGIN
+        {_STATS_DELTA_SQL.format(sign='-', row='old')}
+        {_DAILY_DELETE_SQL}
+        {_STATS_DELTA_SQL.format(sign='+', row='new')}
+        {_DAILY_INSERT_SQL}
+    END
+    """)
+    
+    if not stats_exist:
+        logger.info("Подсчет статистики tests_stats...")
+        rebuild_statistics(conn, commit=False)
+
+
+def init_questions(conn):
+    """
+    Создает таблицу канонических вопросов questions.
+    
+    Ключ question_id - хеш нормализованного текста вопроса
+    (text_normalize.question_hash), его же парсер записывает в
+    tests.question_id. Для каждого вопроса хранится текст первого
+    встреченного варианта и число строк tests, которые на него ссылаются.
+    Таблица поддерживается триггерами на вставку и удаление: строки tests
+    не обновляются на месте, парсер удаляет и вставляет тест заново.
+    
+    Это индекс различных вопросов (группировка результатов поиска,
+    кластеризация, семантический индекс), а не хранилище текста: tests
+    по-прежнему хранит полный вопрос в каждой строке (его читают бот,
+    полнотекстовые индексы, статистика и выгрузка), поэтому таблица
+    увеличивает БД на одну копию текста каждого различного вопроса.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS questions (
+        question_id INTEGER PRIMARY KEY,
+        question TEXT NOT NULL,
+        occurrences INTEGER NOT NULL
+    )
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_questions_ai AFTER INSERT ON tests BEGIN
+        INSERT INTO questions (question_id, question, occurrences)
+        SELECT new.question_id, new.question, 1
+        WHERE new.question_id IS NOT NULL
+        ON CONFLICT(question_id) DO UPDATE SET occurrences = occurrences + 1;
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS tests_questions_ad AFTER DELETE ON tests BEGIN
+        UPDATE questions SET occurrences = occurrences - 1 WHERE question_id = old.question_id;
+        DELETE FROM questions WHERE question_id = old.question_id AND occurrences <= 0;
+    END
+    """)
+
+
+def rebuild_questions(conn, commit=True):
+    """Пересчитывает таблицу questions по tests.question_id"""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM questions")
+    cur.execute("""
+        INSERT INTO questions (question_id, question, occurrences)
+        SELECT question_id, question, COUNT(*)
+        FROM tests
+        WHERE question_id IS NOT NULL
+        GROUP BY question_id
+    """)
+    if commit:
+        conn.commit()
+
+
+def rebuild_statistics(conn, commit=True):
+    """Пересчитывает tests_stats и tests_daily полным проходом по tests"""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM tests_stats")
+    cur.execute("""
+        INSERT INTO tests_stats (id, total_records, unique_tests, records_with_questions)
+        SELECT 1, COUNT(*),
+               COALESCE(SUM(question_idx = 0), 0),
+               COALESCE(SUM(COALESCE(question, '') != ''), 0)
+        FROM tests
+    """)
+    cur.execute("DELETE FROM tests_daily")
+    cur.execute("""
+        INSERT INTO tests_daily (date, tests)
+        SELECT DATE(fetched_at), COUNT(*)
+        FROM tests
+        WHERE question_idx = 0 AND DATE(fetched_at) IS NOT NULL
+        GROUP BY DATE(fetched_at)
+    """)
+    if commit:
+        conn.commit()
+
+
+RSC_PUSH_RE = re.compile(r'self\.__next_f\.push\(\[1,"((?:[^"\\]|\\.)*)"\]\)')
+RSC_ANSWER_RE = re.compile(r'"answer":\s*\{')
+# Поля объекта задачи в RSC, в которых лежит текст вопроса (по ним ищет find_rsc_answer)
+RSC_QUESTION_FIELDS = ("text", "question", "title")
+
+
+def _normalize_key(text):
+    """Ключ для сопоставления текста из HTML и из RSC: без регистра и лишних пробелов"""
+    return " ".join(text.split()).casefold()
+
+
+def _match_json_object(text, start):
+    """Возвращает JSON объект, начинающийся с '{' в позиции start (с учетом строк)"""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _collect_rsc_answers(node, found):
+    """Рекурсивно собирает объекты задач, у которых answer содержит right_answer"""
+    if isinstance(node, dict):
+        answer = node.get("answer")
+        if isinstance(answer, dict) and "right_answer" in answer:
+            found.append((node, answer))
+        for value in node.values():
+            _collect_rsc_answers(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_rsc_answers(value, found)
+
+
+def extract_rsc_answers(script_texts):
+    """
+    Однократный разбор Next.js RSC данных страницы.
+    
+    Склеивает все self.__next_f.push чанки в единый поток, разбирает
+    его строки как JSON и находит все объекты ответов с right_answer.
+    Каждый ответ индексируется по id задачи и по тексту вопроса (поля
+    RSC_QUESTION_FIELDS), чтобы задания могли найти свой ответ. Ключ,
+    который встречается у задач с разными ответами, не индексируется:
+    такие задания сопоставляются по вариантам ответа.
+    
+    Args:
+        script_texts: Тексты всех <script> страницы (не зависит от бэкенда парсинга)
+    
+    Returns:
+        dict: {"by_key": {ключ: ответ}, "answers": [ответы в порядке документа]}
+    """
+    chunks = []
+    for script_text in script_texts:
+        if script_text and "self.__next_f.push" in script_text:
+            for raw in RSC_PUSH_RE.findall(script_text):
+                try:
+                    chunks.append(json.loads(f'"{raw}"'))
+                except ValueError:
+                    continue
+    
+    by_key = {}
+    ambiguous = set()
+    answers = []
+    for line in "".join(chunks).split("\n"):
+        if '"right_answer"' not in line:
+            continue
+        
+        found = []
+        _, _, payload = line.partition(":")
+        try:
+            _collect_rsc_answers(json.loads(payload), found)
+        except ValueError:
+            # Строка не является JSON целиком - вырезаем объекты ответов вручную
+            for match in RSC_ANSWER_RE.finditer(line):
+                json_str = _match_json_object(line, match.end() - 1)
+                try:
+                    answer = json.loads(json_str) if json_str else None
+                except ValueError:
+                    continue
+                if isinstance(answer, dict) and "right_answer" in answer:
+                    found.append(({}, answer))
+        
+        for task, answer in found:
+            answers.append(answer)
+            keys = [str(task["id"])] if task.get("id") is not None else []
+            for field in RSC_QUESTION_FIELDS:
+                value = task.get(field)
+                if isinstance(value, str) and value.strip():
+                    keys.append(_normalize_key(value))
+            for key in keys:
+                if key in ambiguous:
+                    continue
+                if key in by_key and by_key[key] != answer:
+                    del by_key[key]
+                    ambiguous.add(key)
+                else:
+                    by_key[key] = answer
+    
+    return {"by_key": by_key, "answers": answers}
+
+
+def find_rsc_answer(rsc_answers, question, container_id, container_text):
+    """
+    Находит ответ из RSC данных для конкретного задания.
+    
+    Сначала ищет по тексту вопроса, затем по id контейнера задания,
+    затем по вариантам ответа: выбирается ответ, все варианты которого
+    встречаются в тексте задания. Если ничего не подошло - None.
+    """
+    if not rsc_answers["answers"]:
+        return None
+    
+    by_key = rsc_answers["by_key"]
+    if question and _normalize_key(question) in by_key:
+        return by_key[_normalize_key(question)]
+    
+    if container_id and str(container_id) in by_key:
+        return by_key[str(container_id)]
+    
+    container_text = _normalize_key(container_text)
+    best_answer = None
+    best_matched = 0
+    for answer in rsc_answers["answers"]:
+        try:
+            texts = [_normalize_key(opt["text"]) for opt in answer["options"] if opt.get("text")]
+        except (KeyError, TypeError):
+            continue
+        if texts and all(text in container_text for text in texts) and len(texts) > best_matched:
+            best_answer = answer
+            best_matched = len(texts)
+    return best_answer
+
+
+def format_rsc_answer(json_answer):
+    """
+    Превращает RSC ответ задания на соотнесение в строку "Группа: Элемент | ..."
+    
+    Returns:
+        str: Ответ, пустая строка, если пар нет, или None, если JSON
+        не удалось разобрать (тогда используются остальные способы)
+    """
+    try:
+        groups = json_answer["right_answer"]["groups"]
+        options = {opt["id"]: opt["text"] for opt in json_answer["options"]}
+        
+        matching_pairs = []
+        for group in groups:
+            group_id = group["group_id"]
+            group_name = options.get(group_id, f"Группа {group_id[:8]}")
+            
+            for option_id in group["options_ids"]:
+                option_name = options.get(option_id, f"Элемент {option_id[:8]}")
+                matching_pairs.append(f"{group_name}: {option_name}")
+        
+        return " | ".join(matching_pairs)
+    except Exception:
+        return None
+
+
+def parse_test_html(html, backend=None, stats=None):
+    """
+    Парсинг HTML содержимого теста
+    
+    Args:
+        html: HTML страницы теста
+        backend: Бэкенд парсинга ("bs4" или "lxml"), по умолчанию config.PARSER_BACKEND.
+            Бэкенды реализуют одни и те же правила извлечения и должны давать
+            одинаковый результат (проверяется через --diff-backends).
+        stats: PageStats для времени стадий (дерево, RSC, способы извлечения
+            ответа) и счетчиков сработавших способов; None - не собирать
+    
+    Returns:
+        list: Список словарей {"question": ..., "answer": ...}
+    """
+    backend = backend or config.PARSER_BACKEND
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд парсинга: {backend}")
+    return PARSER_BACKENDS[backend](html, stats or NULL_STATS)
+
+
+def _parse_test_html_bs4(html, stats=NULL_STATS):
+    """Парсинг HTML через BeautifulSoup (эталонная реализация)"""
+    started = time.perf_counter()
     soup = BeautifulSoup(html, "html.parser")
+    started = stats.lap("tree", started)
     results = []
     
+    # Next.js RSC данные разбираем один раз на весь документ
+    rsc_answers = extract_rsc_answers(script.string for script in soup.find_all("script"))
+    started = stats.lap("rsc_scan", started)
+    
     # Ищем заголовки заданий с новой структурой
     for h1 in soup.find_all("h1", class_="text-xl leading-7 text-primary"):
         h1_text = h1.get_text(strip=True)
@@ -77,74 +734,23 @@ def parse_test_html(html):
         question_p = task_container.find("p", class_="leading-7 whitespace-pre-wrap my-4")
         if question_p:
             question = question_p.get_text(" ", strip=True)
+        started = stats.lap("question", started)
         
         # Проверяем тип задания
         is_matching_task = False
         
-        # 1. Ищем Next.js RSC данные с правильными ответами
-        scripts = soup.find_all("script")
-        json_answer = None
-        
-        for script in scripts:
-            if script.string and "self.__next_f.push" in script.string:
-                try:
-                    # Ищем все self.__next_f.push вызовы
-                    push_calls = re.findall(r'self\.__next_f\.push\(\[1,"([^"]+)"\]\)', script.string)
-                    
-                    for call_data in push_calls:
-                        # Декодируем экранированные символы
-                        decoded_data = call_data.replace('\\"', '"').replace('\\\\', '\\')
-                        
-                        if '"answer":' in decoded_data and '"right_answer":' in decoded_data:
-                            # Ищем JSON объект с ответами
-                            answer_match = re.search(r'"answer":\s*({[^}]*"right_answer"[^}]*})', decoded_data)
-                            if answer_match:
-                                json_str = answer_match.group(1)
-                                
-                                # Пытаемся найти полный JSON объект
-                                brace_count = 0
-                                end_pos = 0
-                                for i, char in enumerate(json_str):
-                                    if char == '{':
-                                        brace_count += 1
-                                    elif char == '}':
-                                        brace_count -= 1
-                                        if brace_count == 0:
-                                            end_pos = i + 1
-                                            break
-                                
-                                if end_pos > 0:
-                                    json_str = json_str[:end_pos]
-                                    answer_data = json.loads(json_str)
-                                    json_answer = answer_data
-                                    is_matching_task = True
-                                    break
-                except Exception as e:
-                    continue
-                
-                if json_answer:
-                    break
-        
-        # Если нашли JSON ответы, парсим их
-        if json_answer and "right_answer" in json_answer:
-            try:
-                groups = json_answer["right_answer"]["groups"]
-                options = {opt["id"]: opt["text"] for opt in json_answer["options"]}
-                
-                matching_pairs = []
-                for group in groups:
-                    group_id = group["group_id"]
-                    group_name = options.get(group_id, f"Группа {group_id[:8]}")
-                    
-                    for option_id in group["options_ids"]:
-                        option_name = options.get(option_id, f"Элемент {option_id[:8]}")
-                        matching_pairs.append(f"{group_name}: {option_name}")
-                
-                if matching_pairs:
-                    answer = " | ".join(matching_pairs)
-            except Exception as e:
-                # Если не удалось распарсить JSON, используем старый метод
-                is_matching_task = False
+        # 1. Ищем правильные ответы в заранее разобранных Next.js RSC данных
+        if rsc_answers["answers"]:
+            json_answer = find_rsc_answer(rsc_answers, question, task_container.get("id"),
+                                          task_container.get_text(" ", strip=True))
+            if json_answer:
+                rsc_answer = format_rsc_answer(json_answer)
+                # Если не удалось распарсить JSON, используем остальные способы
+                if rsc_answer is not None:
+                    is_matching_task = True
+                    answer = rsc_answer
+                    stats.count("answer_rsc")
+            started = stats.lap("rsc_match", started)
         
         # 2. Если не нашли JSON, ищем задания на соотнесение (accordion)
         if not is_matching_task:
@@ -178,6 +784,8 @@ def parse_test_html(html):
                 
                 if matching_pairs:
                     answer = " | ".join(matching_pairs)
+                stats.count("answer_accordion")
+            started = stats.lap("accordion", started)
         
         # 2. Если не задание на соотнесение, ищем обычные ответы
         if not is_matching_task:
@@ -185,6 +793,8 @@ def parse_test_html(html):
             answer_input = task_container.find("input", {"type": "text"})
             if answer_input and answer_input.get("value"):
                 answer = answer_input.get("value").strip()
+                stats.count("answer_input")
+            started = stats.lap("input", started)
             
             # Если не нашли ответ в input, ищем в других местах
             if not answer:
@@ -209,6 +819,9 @@ def parse_test_html(html):
                                 if text:
                                     answers.append(text)
                         answer = " | ".join(answers) if answers else ""
+                if answer:
+                    stats.count("answer_selected_or_checked")
+                started = stats.lap("selected_or_checked", started)
         
         # Добавляем результат только если есть вопрос
         if question:
@@ -252,49 +865,382 @@ def parse_test_html(html):
             
             if question:
                 results.append({"question": question, "answer": answer})
+        stats.count("legacy_layout")
+        stats.lap("legacy", started)
+    
+    stats.count("questions", len(results))
+    return results
+
+
+def _lxml_text(element, separator=""):
+    """Аналог Tag.get_text(separator, strip=True) из BeautifulSoup"""
+    strings = element.xpath(".//text()[not(parent::script) and not(parent::style)]")
+    return separator.join(text.strip() for text in strings if text.strip())
+
+
+def _lxml_string(element):
+    """Аналог Tag.string из BeautifulSoup: текст единственного потомка или None"""
+    children = list(element)
+    if not children:
+        return element.text
+    if len(children) == 1 and not element.text and not children[0].tail:
+        child = children[0]
+        return child.text if not isinstance(child.tag, str) else _lxml_string(child)
+    return None
+
+
+def _lxml_first(element, path):
+    """Первый элемент по XPath или None"""
+    found = element.xpath(path)
+    return found[0] if found else None
+
+
+def _lxml_first_ancestor(element, tag=None):
+    """Аналог Tag.find_parent(tag) из BeautifulSoup"""
+    for ancestor in element.iterancestors(tag) if tag else element.iterancestors():
+        return ancestor
+    return None
+
+
+def _lxml_selected_or_checked(container):
+    """Ответ из элементов data-selected="true" или отмеченных input внутри label"""
+    selected_elements = container.xpath(".//*[@data-selected='true']")
+    if selected_elements:
+        answers = [text for text in (_lxml_text(elem, " ") for elem in selected_elements) if text]
+        return " | ".join(answers)
+    
+    answers = []
+    for checked_input in container.xpath(".//input[@checked]"):
+        label = _lxml_first_ancestor(checked_input, "label")
+        if label is not None:
+            text = _lxml_text(label, " ")
+            if text:
+                answers.append(text)
+    return " | ".join(answers)
+
+
+def _parse_test_html_lxml(html, stats=NULL_STATS):
+    """
+    Парсинг HTML через lxml (C-парсер, в разы быстрее BeautifulSoup).
+    
+    Повторяет правила _parse_test_html_bs4 один к одному: задания новой
+    структуры, RSC ответы, accordion, input/data-selected/checked и
+    старую структуру страниц.
+    """
+    if lxml_html is None:
+        raise RuntimeError("Бэкенд lxml недоступен: установите пакет lxml")
+    
+    started = time.perf_counter()
+    root = lxml_html.document_fromstring(html.encode("utf-8"), parser=LXML_PARSER)
+    started = stats.lap("tree", started)
+    results = []
+    
+    # Next.js RSC данные разбираем один раз на весь документ
+    rsc_answers = extract_rsc_answers(script.text for script in root.iter("script"))
+    started = stats.lap("rsc_scan", started)
+    
+    # Ищем заголовки заданий с новой структурой
+    for h1 in root.xpath("//h1[@class='text-xl leading-7 text-primary']"):
+        if not _lxml_text(h1).startswith("Задание"):
+            continue
+        
+        # Находим контейнер задания
+        task_container = _lxml_first_ancestor(h1, "div")
+        if task_container is None:
+            continue
+        
+        question = ""
+        answer = ""
+        
+        question_p = _lxml_first(task_container, ".//p[@class='leading-7 whitespace-pre-wrap my-4']")
+        if question_p is not None:
+            question = _lxml_text(question_p, " ")
+        started = stats.lap("question", started)
+        
+        is_matching_task = False
+        
+        # 1. RSC ответы
+        if rsc_answers["answers"]:
+            json_answer = find_rsc_answer(rsc_answers, question, task_container.get("id"),
+                                          _lxml_text(task_container, " "))
+            if json_answer:
+                rsc_answer = format_rsc_answer(json_answer)
+                if rsc_answer is not None:
+                    is_matching_task = True
+                    answer = rsc_answer
+                    stats.count("answer_rsc")
+            started = stats.lap("rsc_match", started)
+        
+        # 2. Задания на соотнесение (accordion)
+        if not is_matching_task:
+            accordion_sections = task_container.xpath(".//div[@data-slot='base']")
+            if len(accordion_sections) > 1:
+                is_matching_task = True
+                matching_pairs = []
+                
+                for section in accordion_sections:
+                    category_elem = _lxml_first(section, ".//span[@data-slot='subtitle']")
+                    if category_elem is None:
+                        continue
+                    category = _lxml_text(category_elem)
+                    
+                    content_div = _lxml_first(section, ".//div[@data-slot='content']")
+                    if content_div is None:
+                        continue
+                    
+                    for div in content_div.iter("div"):
+                        if div is content_div:
+                            continue
+                        text = _lxml_string(div)
+                        if text and text.endswith(".jpg"):
+                            matching_pairs.append(f"{category}: {_lxml_text(div)}")
+                    
+                    for audio in content_div.iter("audio"):
+                        src = audio.get("src", "")
+                        if src:
+                            audio_name = src.split("/")[-1] if "/" in src else src
+                            matching_pairs.append(f"{category}: {audio_name}")
+                
+                if matching_pairs:
+                    answer = " | ".join(matching_pairs)
+                stats.count("answer_accordion")
+            started = stats.lap("accordion", started)
+        
+        # 3. Обычные ответы
+        if not is_matching_task:
+            answer_input = _lxml_first(task_container, ".//input[@type='text']")
+            if answer_input is not None and answer_input.get("value"):
+                answer = answer_input.get("value").strip()
+                stats.count("answer_input")
+            started = stats.lap("input", started)
+            
+            if not answer:
+                answer = _lxml_selected_or_checked(task_container)
+                if answer:
+                    stats.count("answer_selected_or_checked")
+                started = stats.lap("selected_or_checked", started)
+        
+        if question:
+            results.append({"question": question, "answer": answer})
+    
+    # Если не нашли задания с новой структурой, пробуем старую
+    if not results:
+        for h1 in root.iter("h1"):
+            if not _lxml_text(h1).startswith("Задание"):
+                continue
+            
+            parent = h1.getparent()
+            question = ""
+            
+            p = _lxml_first(parent, ".//p")
+            if p is not None:
+                question = _lxml_text(p, " ")
+            
+            answer = _lxml_selected_or_checked(parent)
+            
+            if question:
+                results.append({"question": question, "answer": answer})
+        stats.count("legacy_layout")
+        stats.lap("legacy", started)
     
+    stats.count("questions", len(results))
     return results
 
 
-def save_test_to_db(conn, test_id, questions_answers, raw_html, html_file_path):
-    """Сохранение теста в базу данных (без raw_html)"""
+PARSER_BACKENDS = {
+    "bs4": _parse_test_html_bs4,
+    "lxml": _parse_test_html_lxml,
+}
+
+
+def compare_parser_backends(test_ids, backend="lxml"):
+    """
+    Дифференциальная проверка бэкенда парсинга против эталонного bs4.
+    
+    Парсит каждый тест обоими бэкендами и логирует расхождения
+    в списках {"question", "answer"}.
+    
+    Returns:
+        list: ID тестов, на которых результаты различаются
+    """
+    mismatched = []
+    for test_id in test_ids:
+        html_content, _ = load_html_file(test_id)
+        if html_content is None:
+            continue
+        expected = parse_test_html(html_content, backend="bs4")
+        actual = parse_test_html(html_content, backend=backend)
+        if expected != actual:
+            mismatched.append(test_id)
+            logger.warning(f"Тест {test_id}: бэкенды расходятся "
+                           f"(bs4: {len(expected)} вопросов, {backend}: {len(actual)})")
+            for idx, (exp, act) in enumerate(zip(expected, actual)):
+                if exp != act:
+                    logger.warning(f"  вопрос {idx}: bs4={exp!r} {backend}={act!r}")
+                    break
+    
+    logger.info(f"Проверено тестов: {len(test_ids)}, расхождений: {len(mismatched)}")
+    return mismatched
+
+
+TESTS_INSERT_SQL = """
+    INSERT INTO tests
+    (test_id, question, answer, html_file_path, parsed_at, question_idx, content_hash, parser_version,
+     question_norm, answer_norm, question_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def compute_content_hash(html):
+    """Хеш содержимого HTML страницы (для пропуска неизмененных тестов)"""
+    return hashlib.blake2b(html.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def build_test_rows(test_id, questions_answers, html_file_path, parsed_at, content_hash=None):
+    """Строки таблицы tests для одного теста (пустая запись, если вопросов нет)"""
+    if not questions_answers:
+        return [(test_id, "", "", html_file_path, parsed_at, 0, content_hash, PARSER_VERSION, "", "", None)]
+    
+    rows = []
+    for idx, qa in enumerate(questions_answers):
+        question_norm = normalize_text(qa["question"])
+        rows.append((test_id, qa["question"], qa["answer"], html_file_path, parsed_at, idx, content_hash,
+                     PARSER_VERSION, question_norm, normalize_text(qa["answer"]), question_hash(question_norm)))
+    return rows
+
+
+def bump_db_generation(cur):
+    """
+    Увеличивает поколение БД в db_meta. Вызывается в той же транзакции,
+    что и запись тестов: по нему ZinDatabase сбрасывает кэш результатов.
+    """
+    cur.execute("""
+        INSERT INTO db_meta (key, value) VALUES ('generation', 1)
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    """)
+
+
+def save_test_to_db(conn, test_id, questions_answers, raw_html, html_file_path, commit=True):
+    """
+    Сохранение теста в базу данных (без raw_html)
+    
+    При commit=False транзакцию фиксирует вызывающий код (пакетная запись).
+    """
     cur = conn.cursor()
     parsed_at = datetime.now(timezone.utc).isoformat()
+    content_hash = compute_content_hash(raw_html) if raw_html else None
     
-    if questions_answers:
-        for idx, qa in enumerate(questions_answers):
-            cur.execute("""
-                INSERT OR REPLACE INTO tests 
-                (test_id, question, answer, html_file_path, parsed_at, question_idx)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (test_id, qa["question"], qa["answer"], html_file_path, parsed_at, idx))
-    else:
-        # Сохраняем пустую запись, если вопросы не найдены
-        cur.execute("""
-            INSERT OR REPLACE INTO tests 
-            (test_id, question, answer, html_file_path, parsed_at, question_idx)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (test_id, "", "", html_file_path, parsed_at, 0))
+    # Удаляем старые записи теста явно, а не через INSERT OR REPLACE:
+    # при REPLACE триггеры удаления не срабатывают и индекс tests_fts
+    # остался бы с устаревшими строками
+    cur.execute("DELETE FROM tests WHERE test_id = ?", (test_id,))
+    cur.executemany(TESTS_INSERT_SQL, build_test_rows(test_id, questions_answers, html_file_path,
+                                                      parsed_at, content_hash))
+    bump_db_generation(cur)
     
-    conn.commit()
+    if commit:
+        conn.commit()
+
+
+class BatchWriter:
+    """
+    Пакетная запись распарсенных тестов в базу данных.
+    
+    Буферизует тесты и записывает их через executemany одной транзакцией,
+    когда набирается batch_size тестов или проходит flush_interval секунд.
+    После сбоя в БД оказываются только целые пачки, и повторный запуск
+    продолжает с того же места: записанные тесты пропускает main по
+    состоянию из tests (load_parse_state).
+    
+    Вместе с тестами в той же транзакции пишутся сигнатуры их страниц
+    (page_signatures), в том числе для неизмененных тестов (add_signature).
+    """
+    
+    def __init__(self, conn, batch_size=None, flush_interval=None, stats=None):
+        self.conn = conn
+        self.stats = stats
+        self.batch_size = batch_size or config.PARSE_BATCH_SIZE
+        self.flush_interval = flush_interval or config.PARSE_FLUSH_INTERVAL
+        self.pending = []
+        self.pending_signatures = {}
+        self.written_count = 0
+        self.failed_count = 0
+        self.last_flush = time.monotonic()
+    
+    def add(self, test_id, questions_answers, html_file_path, content_hash=None, signature=None):
+        """Добавляет тест в буфер и при необходимости сбрасывает буфер в БД"""
+        self.pending.append((test_id, questions_answers, html_file_path, content_hash))
+        self.pending_signatures[test_id] = signature
+        self._maybe_flush()
+    
+    def add_signature(self, test_id, signature):
+        """Запоминает сигнатуру страницы теста, который не нужно перезаписывать"""
+        self.pending_signatures[test_id] = signature
+        self._maybe_flush()
+    
+    def _maybe_flush(self):
+        if (len(self.pending_signatures) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+    
+    def flush(self):
+        """Записывает накопленные тесты и сигнатуры одной транзакцией"""
+        self.last_flush = time.monotonic()
+        if not self.pending and not self.pending_signatures:
+            return
+        
+        batch, self.pending = self.pending, []
+        signatures, self.pending_signatures = self.pending_signatures, {}
+        # Один тест мог попасть в буфер дважды (повторная постановка в очередь):
+        # записывается последняя версия, иначе вставка нарушит UNIQUE(test_id, question_idx)
+        latest = {item[0]: item for item in batch}
+        if len(latest) < len(batch):
+            batch = list(latest.values())
+        started = time.perf_counter()
+        parsed_at = datetime.now(timezone.utc).isoformat()
+        rows = []
+        for test_id, questions_answers, html_file_path, content_hash in batch:
+            rows.extend(build_test_rows(test_id, questions_answers, html_file_path, parsed_at, content_hash))
+        
+        try:
+            cur = self.conn.cursor()
+            # Удаляем старые записи явно, чтобы сработали триггеры индексов
+            cur.executemany("DELETE FROM tests WHERE test_id = ?", [(item[0],) for item in batch])
+            cur.executemany(TESTS_INSERT_SQL, rows)
+            # Тест без сигнатуры будет перечитан и сверен по хешу при следующем запуске
+            cur.executemany("DELETE FROM page_signatures WHERE test_id = ?",
+                            [(test_id,) for test_id, signature in signatures.items() if signature is None])
+            cur.executemany("INSERT OR REPLACE INTO page_signatures (test_id, signature) VALUES (?, ?)",
+                            [item for item in signatures.items() if item[1] is not None])
+            if batch:
+                bump_db_generation(cur)
+            self.conn.commit()
+            self.written_count += len(batch)
+            if self.stats is not None:
+                self.stats.add_time("db_write", time.perf_counter() - started)
+                self.stats.count("db_batches")
+        except Exception as e:
+            self.conn.rollback()
+            self.failed_count += len(batch)
+            if batch:
+                logger.error(f"Ошибка записи пачки из {len(batch)} тестов "
+                             f"(ID {batch[0][0]}..{batch[-1][0]}): {e}")
+            else:
+                logger.error(f"Ошибка записи сигнатур {len(signatures)} страниц: {e}")
 
 
 def get_html_file_path(test_id):
-    """Возвращает путь к HTML файлу для указанного test_id"""
-    return os.path.join(config.HTML_STORAGE_DIR, f"test_{test_id}.html")
+    """Возвращает путь к HTML файлу (адрес в хранилище) для указанного test_id"""
+    return get_html_store().location(test_id)
 
 
 def load_html_file(test_id):
-    """Загружает HTML файл с диска"""
-    file_path = get_html_file_path(test_id)
-    
-    if not os.path.exists(file_path):
-        return None, None
-    
+    """Загружает HTML страницу из хранилища (config.HTML_STORAGE_BACKEND)"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, file_path
+        content = get_html_store().load(test_id)
+        if content is None:
+            return None, None
+        return content, get_html_file_path(test_id)
     except Exception as e:
         logger.error(f"Ошибка чтения HTML файла для теста {test_id}: {e}")
         return None, None
@@ -307,12 +1253,12 @@ def get_parsing_progress():
         cur = conn.cursor()
         
         # Получаем максимальный обработанный test_id
-        cur.execute("SELECT MAX(test_id) FROM tests WHERE parsed_at IS NOT NULL")
+        cur.execute("SELECT MAX(test_id) FROM tests WHERE question_idx = 0 AND parsed_at IS NOT NULL")
         result = cur.fetchone()
         last_parsed = result[0] if result[0] is not None else config.START_ID - 1
         
-        # Получаем общее количество обработанных тестов
-        cur.execute("SELECT COUNT(DISTINCT test_id) FROM tests WHERE parsed_at IS NOT NULL")
+        # Получаем общее количество обработанных тестов (по строке первого вопроса)
+        cur.execute("SELECT COUNT(*) FROM tests WHERE question_idx = 0 AND parsed_at IS NOT NULL")
         total_parsed = cur.fetchone()[0]
         
         conn.close()
@@ -324,43 +1270,130 @@ def get_parsing_progress():
 
 
 def get_available_html_files():
-    """Получает список доступных HTML файлов"""
-    if not os.path.exists(config.HTML_STORAGE_DIR):
+    """Получает отсортированный список ID тестов, HTML которых есть в хранилище"""
+    if config.HTML_STORAGE_BACKEND == "files" and not os.path.exists(config.HTML_STORAGE_DIR):
         logger.error(f"Директория {config.HTML_STORAGE_DIR} не существует")
         return []
     
-    html_files = []
-    for filename in os.listdir(config.HTML_STORAGE_DIR):
-        if filename.startswith("test_") and filename.endswith(".html"):
-            try:
-                test_id = int(filename.replace("test_", "").replace(".html", ""))
-                html_files.append(test_id)
-            except ValueError:
-                continue
-    
-    return sorted(html_files)
+    return get_html_store().ids()
 
 
 def is_test_already_parsed(conn, test_id):
     """Проверяет, был ли тест уже обработан"""
     cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM tests WHERE test_id = ? AND parsed_at IS NOT NULL", (test_id,))
-    return cur.fetchone()[0] > 0
+    cur.execute("SELECT 1 FROM tests WHERE test_id = ? AND question_idx = 0 AND parsed_at IS NOT NULL",
+                (test_id,))
+    return cur.fetchone() is not None
+
+
+def load_parse_state(conn):
+    """
+    Загружает состояние парсинга всех тестов одним запросом.
+    
+    Returns:
+        dict: {test_id: (content_hash, parser_version, signature)} для
+            обработанных тестов; signature - сигнатура страницы в хранилище
+            при последней проверке (None, если не сохранена)
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT test_id, signature FROM page_signatures")
+    signatures = dict(cur.fetchall())
+    cur.execute("""
+        SELECT test_id, content_hash, parser_version
+        FROM tests
+        WHERE question_idx = 0 AND parsed_at IS NOT NULL
+    """)
+    return {test_id: (content_hash, parser_version, signatures.get(test_id))
+            for test_id, content_hash, parser_version in cur}
 
 
-def main():
-    """Основная функция парсинга HTML файлов в базу данных"""
+def parse_test_file(task):
+    """
+    Загружает и парсит HTML файл одного теста.
+    
+    Выполняется как в основном процессе, так и в процессах пула
+    (--workers), поэтому ничего не пишет в БД и не бросает исключений.
+    
+    Args:
+        task: (test_id, known_hash, html_content) - known_hash задан, если тест
+            уже разобран текущей версией парсера; при совпадении хеша парсинг
+            пропускается. html_content - уже прочитанная страница (None -
+            загрузить из хранилища)
+    
+    Returns:
+        tuple: (status, test_id, file_path, content_hash, questions_answers, error, page),
+        где status - "parsed", "unchanged" или "error" (тогда error содержит
+        текст для лога), page - время стадий и счетчики (PageStats.as_dict())
+    """
+    test_id, known_hash, html_content = task
+    page = PageStats()
+    try:
+        started = page.started
+        if html_content is None:
+            html_content, file_path = load_html_file(test_id)
+        else:
+            file_path = get_html_file_path(test_id)
+        started = page.lap("load", started)
+        if html_content is None:
+            return ("error", test_id, None, None, None, f"Не удалось загрузить HTML файл для теста {test_id}",
+                    page.as_dict())
+        
+        content_hash = compute_content_hash(html_content)
+        page.bytes = len(html_content.encode('utf-8'))
+        page.lap("hash", started)
+        if content_hash == known_hash:
+            return "unchanged", test_id, file_path, content_hash, None, None, page.as_dict()
+        questions_answers = parse_test_html(html_content, stats=page)
+        return "parsed", test_id, file_path, content_hash, questions_answers, None, page.as_dict()
+    except Exception as e:
+        return "error", test_id, None, None, None, f"Ошибка обработки теста {test_id}: {e}", page.as_dict()
+
+
+def iter_pack_tasks(store, tasks):
+    """
+    Задачи parse_test_file со страницами, прочитанными одним проходом
+    store.iter_pages. Тесты, которых в хранилище не оказалось, выдаются
+    в конце без страницы: parse_test_file попробует загрузить их сам и
+    вернет ошибку, как для отсутствующего файла.
+    """
+    known_hashes = {test_id: known_hash for test_id, known_hash, _ in tasks}
+    found = set()
+    for test_id, html in store.iter_pages(known_hashes):
+        found.add(test_id)
+        yield test_id, known_hashes[test_id], html
+    for test_id, known_hash in known_hashes.items():
+        if test_id not in found:
+            yield test_id, known_hash, None
+
+
+def main(workers=1, stats_report=None, profile_slowest=None):
+    """
+    Основная функция парсинга HTML файлов в базу данных
+    
+    Args:
+        workers: Количество процессов для парсинга. При workers > 1 файлы
+            парсятся в пуле процессов. В обоих режимах результаты пишет
+            в БД только основной процесс через BatchWriter.
+        stats_report: Путь для JSON отчета о времени стадий (parse_stats.ParseStats)
+        profile_slowest: Сколько самых медленных страниц повторно разобрать
+            под cProfile (по умолчанию config.PARSE_PROFILE_SLOWEST)
+    """
     logger.info("Запуск парсинга HTML файлов в базу данных...")
     
+    if config.PARSER_BACKEND == "lxml" and lxml_html is None:
+        logger.error("В config.PARSER_BACKEND выбран lxml, но пакет lxml не установлен")
+        return
+    logger.info(f"Бэкенд парсинга: {config.PARSER_BACKEND}")
+    
     # Проверяем существование директории с HTML файлами
-    if not os.path.exists(config.HTML_STORAGE_DIR):
+    if config.HTML_STORAGE_BACKEND == "files" and not os.path.exists(config.HTML_STORAGE_DIR):
         logger.error(f"Директория {config.HTML_STORAGE_DIR} не существует. Сначала запустите downloader.py")
         return
     
     # Подключаемся к базе данных
     try:
         conn = sqlite3.connect(config.DB_PATH)
-        init_db(conn)
+        init_db(conn, bulk_load=config.PARSE_BULK_PRAGMAS)
         logger.info(f"Подключение к БД: {config.DB_PATH}")
     except Exception as e:
         logger.error(f"Ошибка подключения к БД: {e}")
@@ -383,30 +1416,74 @@ def main():
     parsed_count = 0
     error_count = 0
     skipped_count = 0
+    pool = None
+    stats = ParseStats(slowest=profile_slowest)
+    writer = BatchWriter(conn, stats=stats)
     
     try:
+        # Состояние всех тестов загружаем одним запросом. Тесты, разобранные
+        # текущей версией парсера, перепарсиваются только при изменении HTML
+        # (или пропускаются сразу, если проверка хеша отключена). Страницы,
+        # сигнатура которых не изменилась с прошлой проверки, не читаются.
+        # Сигнатуры снимаются до чтения страниц, поэтому страница, измененная
+        # во время парсинга, будет проверена при следующем запуске
+        parse_state = load_parse_state(conn)
+        signatures = get_html_store().signatures() if config.PARSE_CHECK_CONTENT_HASH else {}
+        tasks = []
+        stale_count = 0
         for test_id in available_files:
-            # Пропускаем уже обработанные тесты
-            if is_test_already_parsed(conn, test_id):
+            content_hash, parser_version, signature = parse_state.get(test_id, (None, None, None))
+            if parser_version != PARSER_VERSION:
+                tasks.append((test_id, None, None))
+                stale_count += 1
+            elif (config.PARSE_CHECK_CONTENT_HASH and content_hash
+                  and (signature is None or signatures.get(test_id) != signature)):
+                tasks.append((test_id, content_hash, None))
+            else:
                 skipped_count += 1
+        logger.info(f"Новых или разобранных старой версией парсера: {stale_count}, "
+                    f"на проверку изменений: {len(tasks) - stale_count}, "
+                    f"пропущено без чтения: {skipped_count}")
+        
+        if workers > 1:
+            logger.info(f"Параллельный парсинг: {workers} процессов")
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap_unordered(parse_test_file, tasks, chunksize=config.PARSE_CHUNK_SIZE)
+        else:
+            store = get_html_store()
+            if hasattr(store, "iter_pages"):
+                # Упакованное хранилище читается одним проходом по возрастанию
+                # test_id вместо отдельного запроса на каждую страницу. В пуле
+                # процессов страницы по-прежнему читают сами процессы: пул
+                # забирает задачи без ограничения и держал бы все страницы в памяти
+                tasks = iter_pack_tasks(store, tasks)
+            results = map(parse_test_file, tasks)
+        
+        for status, test_id, file_path, content_hash, questions_answers, error, page in results:
+            stats.maybe_log_summary()
+            if status == "error":
+                error_count += 1
+                stats.merge(page)
+                stats.count("errors")
+                logger.error(error)
+                continue
+            
+            if status == "unchanged":
+                skipped_count += 1
+                stats.merge(page)
+                stats.count("unchanged")
+                writer.add_signature(test_id, signatures.get(test_id))
                 if test_id % 1000 == 0:
-                    logger.info(f"Пропущен уже обработанный тест: {test_id}")
+                    logger.info(f"Пропущен неизмененный тест: {test_id}")
                 continue
             
             try:
-                # Загружаем HTML файл
-                html_content, file_path = load_html_file(test_id)
+                stats.add_page(test_id, page)
+                if not questions_answers:
+                    stats.count("empty_pages")
                 
-                if html_content is None:
-                    error_count += 1
-                    logger.error(f"Не удалось загрузить HTML файл для теста {test_id}")
-                    continue
-                
-                # Парсим HTML
-                questions_answers = parse_test_html(html_content)
-                
-                # Сохраняем в базу данных
-                save_test_to_db(conn, test_id, questions_answers, html_content, file_path)
+                # Сохраняем в базу данных (пачками)
+                writer.add(test_id, questions_answers, file_path, content_hash, signatures.get(test_id))
                 parsed_count += 1
                 
                 if questions_answers:
@@ -416,7 +1493,8 @@ def main():
                 
                 # Прогресс каждые 100 тестов
                 if parsed_count % 100 == 0:
-                    logger.info(f"Прогресс: обработано {parsed_count} тестов, ошибок: {error_count}, пропущено: {skipped_count}")
+                    logger.info(f"Прогресс: обработано {parsed_count} тестов, "
+                                f"ошибок: {error_count + writer.failed_count}, пропущено: {skipped_count}")
             
             except Exception as e:
                 error_count += 1
@@ -426,13 +1504,57 @@ def main():
         logger.info("Парсинг прерван пользователем")
     
     finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        writer.flush()
         conn.close()
         
+        # Тесты из пачек, которые не удалось записать, считаются ошибками
+        parsed_count -= writer.failed_count
+        error_count += writer.failed_count
+        
         logger.info(f"Парсинг завершен:")
         logger.info(f"  - Обработано тестов: {parsed_count}")
         logger.info(f"  - Ошибок: {error_count}")
-        logger.info(f"  - Пропущено (уже обработано): {skipped_count}")
+        logger.info(f"  - Пропущено (без изменений): {skipped_count}")
+        
+        stats.maybe_log_summary(force=True)
+        stats.profile_slowest(lambda test_id: load_html_file(test_id)[0], parse_test_html)
+        if stats_report:
+            stats.write_report(stats_report)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Парсинг скачанных HTML файлов тестов в базу данных")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="количество процессов для парсинга (по умолчанию 1 - последовательно)")
+    parser.add_argument("--diff-backends", metavar="BACKEND", nargs="?", const="lxml",
+                        help="сравнить результат бэкенда (по умолчанию lxml) с bs4 вместо парсинга в БД")
+    parser.add_argument("--sample", type=int, default=200,
+                        help="размер случайной выборки файлов для --diff-backends")
+    parser.add_argument("--stats-report", metavar="PATH",
+                        help="сохранить JSON отчет о времени стадий парсинга и скорости обработки")
+    parser.add_argument("--profile-slowest", type=int, metavar="N",
+                        help="разобрать N самых медленных страниц под cProfile "
+                             "(по умолчанию config.PARSE_PROFILE_SLOWEST)")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="пересчитать материализованную статистику tests_stats/tests_daily и questions")
+    args = parser.parse_args()
+    
+    if args.rebuild_stats:
+        conn = sqlite3.connect(config.DB_PATH)
+        init_db(conn)
+        rebuild_statistics(conn)
+        rebuild_questions(conn)
+        conn.close()
+        logger.info("Статистика пересчитана")
+        raise SystemExit(0)
+    
+    if args.diff_backends:
+        available = get_available_html_files()
+        sample = random.Random(0).sample(available, min(args.sample, len(available)))
+        mismatched = compare_parser_backends(sorted(sample), backend=args.diff_backends)
+        raise SystemExit(1 if mismatched else 0)
+    
+    main(workers=args.workers, stats_report=args.stats_report, profile_slowest=args.profile_slowest)
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Хранилища HTML страниц тестов.
+
+FileHtmlStore - исходный формат: по файлу test_{id}.html на тест.
+PackHtmlStore - один SQLite файл, где каждая страница хранится сжатой
+(zstd со словарем, обученным на самих страницах, или zlib, если пакет
+zstandard не установлен) в BLOB с ключом test_id. Страницы Next.js почти
+одинаковы, поэтому словарь сжимает их на порядок сильнее, а полный
+перепарсинг читает один файл по возрастанию test_id вместо десятков
+тысяч мелких файлов.
+
+Хранилище выбирается через config.HTML_STORAGE_BACKEND, перенос
+существующих файлов: python html_store.py --migrate
+"""
+
+import os
+import sqlite3
+import logging
+import hashlib
+import tempfile
+import urllib.parse
+import threading
+import zlib
+import argparse
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+class FileHtmlStore:
+    """Хранилище страниц в виде отдельных файлов test_{id}.html"""
+    
+    def __init__(self, directory: str = None):
+        self.directory = directory or config.HTML_STORAGE_DIR
+    
+    def location(self, test_id: int) -> str:
+        """Путь к файлу страницы (сохраняется в tests.html_file_path)"""
+        return os.path.join(self.directory, f"test_{test_id}.html")
+    
+    def exists(self, test_id: int) -> bool:
+        file_path = self.location(test_id)
+        return os.path.exists(file_path) and os.path.getsize(file_path) > 0
+    
+    def load(self, test_id: int) -> Optional[str]:
+        file_path = self.location(test_id)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    def save(self, test_id: int, html: str) -> None:
+        with open(self.location(test_id), 'w', encoding='utf-8') as f:
+            f.write(html)
+    
+    def ids(self) -> List[int]:
+        """Отсортированный список ID сохраненных страниц"""
+        if not os.path.exists(self.directory):
+            return []
+        
+        test_ids = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith("test_") and filename.endswith(".html"):
+                try:
+                    test_ids.append(int(filename.replace("test_", "").replace(".html", "")))
+                except ValueError:
+                    continue
+        return sorted(test_ids)
+    
+    def signatures(self) -> Dict[int, str]:
+        """
+        Сигнатуры страниц без чтения содержимого: размер и время изменения
+        файла. Новая сигнатура означает, что страницу могли перезаписать.
+        """
+        if not os.path.exists(self.directory):
+            return {}
+        
+        result = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("test_") and entry.name.endswith(".html"):
+                    try:
+                        test_id = int(entry.name[len("test_"):-len(".html")])
+                        stat = entry.stat()
+                    except (ValueError, OSError):
+                        continue
+                    result[test_id] = f"{stat.st_size}:{stat.st_mtime_ns}"
+        return result
+    
+    def file_path(self, test_id: int) -> Optional[str]:
+        """Путь к файлу страницы на диске, если он существует"""
+        file_path = self.location(test_id)
+        return file_path if os.path.exists(file_path) else None
+
+
+class PackHtmlStore:
+    """
+    Хранилище страниц в одном SQLite файле со сжатием.
+    
+    Колонка codec у каждой страницы указывает, чем она сжата: "zlib",
+    "zstd" или "zstd-dict:<id>" (словарь из таблицы dictionaries), поэтому
+    после переобучения словаря старые страницы продолжают читаться.
+    Соединения и объекты zstd (они не потокобезопасны) создаются отдельно
+    для каждого потока и процесса.
+    
+    С readonly=True (бот) файл открывается только для чтения (mode=ro),
+    схема не создается: читатель не берет блокировку записи и не мешает
+    скачиванию.
+    """
+    
+    def __init__(self, path: str = None, readonly: bool = False):
+        self.path = path or config.HTML_PACK_PATH
+        self.readonly = readonly
+        self._local = threading.local()
+        if not readonly:
+            self._init_schema()
+    
+    def _conn(self) -> sqlite3.Connection:
+        # После fork (пул процессов парсера) соединение родителя использовать нельзя
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            if self.readonly:
+                uri = f"file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro"
+                conn = sqlite3.connect(uri, uri=True)
+            else:
+                conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.compressors = {}
+            self._local.decompressors = {}
+        return conn
+    
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS pages (
+            test_id INTEGER PRIMARY KEY,
+            codec TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS dictionaries (
+            dict_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        # Хеш содержимого страниц для signatures(). Отдельная таблица, а не
+        # колонка pages: колонка после BLOB заставила бы читать всю страницу
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS page_hashes (
+            test_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL
+        )
+        """)
+        conn.commit()
+    
+    def location(self, test_id: int) -> str:
+        """Условный адрес страницы в хранилище (сохраняется в tests.html_file_path)"""
+        return f"pack:{test_id}"
+    
+    def _current_codec(self) -> str:
+        """Кодек для новых страниц: zstd с последним словарем, zstd или zlib"""
+        if zstandard is None:
+            return "zlib"
+        row = self._conn().execute("SELECT MAX(dict_id) FROM dictionaries").fetchone()
+        return f"zstd-dict:{row[0]}" if row[0] is not None else "zstd"
+    
+    def _load_dictionary(self, dict_id: int):
+        row = self._conn().execute("SELECT data FROM dictionaries WHERE dict_id = ?", (dict_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Словарь сжатия {dict_id} не найден в {self.path}")
+        return zstandard.ZstdCompressionDict(row[0])
+    
+    def _compress(self, codec: str, data: bytes) -> bytes:
+        if codec == "zlib":
+            return zlib.compress(data, config.HTML_PACK_LEVEL)
+        self._conn()
+        compressors = self._local.compressors
+        if codec not in compressors:
+            if codec == "zstd":
+                compressors[codec] = zstandard.ZstdCompressor(level=config.HTML_PACK_LEVEL)
+            else:
+                dictionary = self._load_dictionary(int(codec.split(":")[1]))
+                compressors[codec] = zstandard.ZstdCompressor(level=config.HTML_PACK_LEVEL,
+                                                              dict_data=dictionary)
+        return compressors[codec].compress(data)
+    
+    def _decompress(self, codec: str, data: bytes) -> bytes:
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if zstandard is None:
+            raise RuntimeError("Страница сжата zstd: установите пакет zstandard")
+        self._conn()
+        decompressors = self._local.decompressors
+        if codec not in decompressors:
+            if codec == "zstd":
+                decompressors[codec] = zstandard.ZstdDecompressor()
+            else:
+                dictionary = self._load_dictionary(int(codec.split(":")[1]))
+                decompressors[codec] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressors[codec].decompress(data)
+    
+    def exists(self, test_id: int) -> bool:
+        row = self._conn().execute("SELECT size FROM pages WHERE test_id = ?", (test_id,)).fetchone()
+        return row is not None and row[0] > 0
+    
+    def load(self, test_id: int) -> Optional[str]:
+        row = self._conn().execute("SELECT codec, data FROM pages WHERE test_id = ?", (test_id,)).fetchone()
+        if row is None:
+            return None
+        return self._decompress(row[0], row[1]).decode('utf-8')
+    
+    def save(self, test_id: int, html: str, commit: bool = True) -> None:
+        data = html.encode('utf-8')
+        codec = self._current_codec()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO pages (test_id, codec, size, data) VALUES (?, ?, ?, ?)",
+            (test_id, codec, len(data), self._compress(codec, data)),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO page_hashes (test_id, content_hash) VALUES (?, ?)",
+            (test_id, hashlib.blake2b(data, digest_size=16).hexdigest()),
+        )
+        if commit:
+            conn.commit()
+    
+    def ids(self) -> List[int]:
+        return [row[0] for row in self._conn().execute("SELECT test_id FROM pages ORDER BY test_id")]
+    
+    def signatures(self) -> Dict[int, str]:
+        """
+        Сигнатуры страниц без чтения содержимого: хеш, записанный в save.
+        У страниц, сохраненных до появления page_hashes, хеша нет - для них
+        сигнатура по размеру не меняется, пока страницу не перезапишут
+        (save всегда добавляет хеш).
+        """
+        cur = self._conn().execute("""
+            SELECT pages.test_id, pages.size, page_hashes.content_hash
+            FROM pages LEFT JOIN page_hashes ON page_hashes.test_id = pages.test_id
+        """)
+        return {test_id: content_hash or f"size:{size}" for test_id, size, content_hash in cur}
+    
+    def iter_pages(self, test_ids: Iterable[int] = None) -> Iterator[Tuple[int, str]]:
+        """Последовательно читает страницы по возрастанию test_id"""
+        wanted = set(test_ids) if test_ids is not None else None
+        cur = self._conn().execute("SELECT test_id, codec, data FROM pages ORDER BY test_id")
+        for test_id, codec, data in cur:
+            if wanted is None or test_id in wanted:
+                yield test_id, self._decompress(codec, data).decode('utf-8')
+    
+    def file_path(self, test_id: int) -> Optional[str]:
+        """
+        Выгружает страницу во временный файл (например, чтобы бот мог
+        отправить ее документом) и возвращает путь к нему.
+        
+        Файл пишется под уникальным именем и подменяется через os.replace:
+        другие потоки бота, читающие тот же файл, видят его целиком.
+        """
+        html = self.load(test_id)
+        if html is None:
+            return None
+        directory = os.path.join(tempfile.gettempdir(), "zin_html")
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f"test_{test_id}.html")
+        fd, tmp_path = tempfile.mkstemp(prefix=f"test_{test_id}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return file_path
+    
+    def train_dictionary(self, samples: List[str]) -> int:
+        """
+        Обучает словарь zstd на примерах страниц и делает его текущим.
+        
+        Returns:
+            int: ID нового словаря
+        """
+        if zstandard is None:
+            raise RuntimeError("Для обучения словаря установите пакет zstandard")
+        dictionary = zstandard.train_dictionary(config.HTML_PACK_DICT_SIZE,
+                                                [html.encode('utf-8') for html in samples])
+        conn = self._conn()
+        cur = conn.execute("INSERT INTO dictionaries (data) VALUES (?)", (dictionary.as_bytes(),))
+        conn.commit()
+        logger.info(f"Обучен словарь сжатия {cur.lastrowid} на {len(samples)} страницах")
+        return cur.lastrowid
+    
+    def commit(self):
+        self._conn().commit()
+    
+    def stats(self) -> dict:
+        """Количество страниц, исходный и сжатый размер"""
+        row = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM pages"
+        ).fetchone()
+        return {'pages': row[0], 'raw_bytes': row[1], 'packed_bytes': row[2]}
+
+
+_stores = {}
+
+
+def get_html_store(readonly: bool = False):
+    """
+    Хранилище страниц, выбранное в config.HTML_STORAGE_BACKEND
+    
+    Args:
+        readonly: Только чтение (упакованное хранилище открывается с mode=ro)
+    """
+    backend = config.HTML_STORAGE_BACKEND
+    key = (backend, readonly and backend == "pack")
+    if key not in _stores:
+        if backend == "files":
+            _stores[key] = FileHtmlStore()
+        elif backend == "pack":
+            _stores[key] = PackHtmlStore(readonly=readonly)
+        else:
+            raise ValueError(f"Неизвестное хранилище HTML: {backend}")
+    return _stores[key]
+
+
+def migrate_files_to_pack(train_samples: int = 1000, batch_size: int = 500):
+    """Переносит страницы из файлов в упакованное хранилище"""
+    source = FileHtmlStore()
+    pack = PackHtmlStore()
+    test_ids = source.ids()
+    logger.info(f"Найдено файлов: {len(test_ids)}")
+    
+    if zstandard is not None and test_ids:
+        sample_ids = random.Random(0).sample(test_ids, min(train_samples, len(test_ids)))
+        pack.train_dictionary([source.load(test_id) for test_id in sample_ids])
+    
+    for count, test_id in enumerate(test_ids, 1):
+        pack.save(test_id, source.load(test_id), commit=False)
+        if count % batch_size == 0:
+            pack.commit()
+            logger.info(f"Перенесено {count}/{len(test_ids)}")
+    pack.commit()
+    
+    stats = pack.stats()
+    ratio = stats['raw_bytes'] / stats['packed_bytes'] if stats['packed_bytes'] else 0
+    logger.info(f"Перенос завершен: {stats['pages']} страниц, "
+                f"{stats['raw_bytes'] / 2**20:.1f} МБ -> {stats['packed_bytes'] / 2**20:.1f} МБ "
+                f"(сжатие в {ratio:.1f} раз)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description="Управление хранилищем HTML страниц")
+    parser.add_argument("--migrate", action="store_true",
+                        help="перенести файлы из HTML_STORAGE_DIR в HTML_PACK_PATH")
+    parser.add_argument("--train-dict", type=int, metavar="N",
+                        help="обучить новый словарь zstd на N случайных страницах из хранилища")
+    parser.add_argument("--stats", action="store_true", help="показать размер упакованного хранилища")
+    args = parser.parse_args()
+    
+    if args.migrate:
+        migrate_files_to_pack()
+    if args.train_dict:
+        store = PackHtmlStore()
+        ids = store.ids()
+        sample_ids = random.Random(0).sample(ids, min(args.train_dict, len(ids)))
+        store.train_dictionary([store.load(test_id) for test_id in sample_ids])
+    if args.stats:
+        print(PackHtmlStore().stats())
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Метрики запросов к базе ответов (ZinDatabase, SnapshotDatabase).
+
+Методы ZinDatabase при ошибке логируют ее и возвращают пустой результат,
+поэтому снаружи медленный или упавший запрос не отличить от запроса без
+результатов. Декоратор instrumented записывает для каждого вызова метода:
+
+- гистограмму времени выполнения (по ней считаются p50/p90/p99);
+- гистограмму числа возвращенных строк (корзина le="0" - пустые ответы);
+- время и число SQL запросов внутри вызова (ZinDatabase._execute);
+- ошибки SQL запросов, в том числе перехваченные самим методом;
+- образцы медленных вызовов: аргументы и выполненные SQL запросы с
+  формой параметров (тип и длина, без значений).
+
+Метрики копятся в общем реестре REGISTRY в памяти процесса. Выгрузка в
+текстовом формате Prometheus - MetricsRegistry.render_prometheus(), при
+config.METRICS_HTTP_PORT бот отдает ее по HTTP на /metrics.
+
+Пример:
+    from database import db
+    db.search_questions("закон ома")
+    print(db.metrics.render_prometheus())
+    db.get_query_metrics()['sqlite.search_questions']['p99']
+"""
+
+import re
+import time
+import bisect
+import logging
+import functools
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы времени вызова (секунды)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Границы корзин гистограммы числа строк результата
+ROW_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500)
+
+# Сколько SQL запросов одного вызова сохранять в образце медленного вызова
+SLOW_SAMPLE_MAX_STATEMENTS = 20
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def param_shape(value) -> str:
+    """Форма параметра запроса без значения: тип и длина ("str[12]", "int", "null")"""
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes, list, tuple, dict)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def compact_sql(sql: str) -> str:
+    """SQL в одну строку (для образцов медленных запросов)"""
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def error_label(error: Exception) -> str:
+    """Метка ошибки: класс исключения, прерванный по таймауту запрос - "interrupted" """
+    if "interrupted" in str(error):
+        return "interrupted"
+    return type(error).__name__
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными верхними границами корзин (как в
+    Prometheus): значение попадает в первую корзину с границей >= него.
+    Используется и для статистики парсинга (parse_stats.py).
+    """
+    
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(bounds) + 1)   # последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+    
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Пары (le, накопленное число наблюдений) для выгрузки"""
+        result = []
+        total = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            result.append((_format_value(bound), total))
+        return result
+    
+    def as_dict(self) -> dict:
+        """Число наблюдений по корзинам: {"<=граница": n, ..., ">последняя": n}"""
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return dict(zip(labels, self.counts))
+    
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля линейной интерполяцией внутри корзины, как
+        histogram_quantile в Prometheus. Для последней корзины (+Inf)
+        возвращается максимальное наблюдение; оценка не превышает его.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for i, count in enumerate(self.counts):
+            if total + count >= rank and count:
+                if i == len(self.bounds):
+                    return self.max
+                lower = self.bounds[i - 1] if i else 0.0
+                return min(lower + (self.bounds[i] - lower) * (rank - total) / count, self.max)
+            total += count
+        return self.max
+
+
+class CallContext:
+    """Выполняющийся вызов метода: SQL запросы и ошибки внутри него"""
+    
+    __slots__ = ('method', 'args', 'statements', 'statement_count', 'sql_seconds', 'errors')
+    
+    def __init__(self, method: str, args: tuple):
+        self.method = method
+        self.args = args
+        self.statements: List[tuple] = []   # (sql, params, секунды, ошибка)
+        self.statement_count = 0
+        self.sql_seconds = 0.0
+        self.errors: List[str] = []
+    
+    def add_statement(self, sql: str, params, seconds: float, error: Exception = None):
+        self.statement_count += 1
+        self.sql_seconds += seconds
+        if error is not None:
+            self.errors.append(error_label(error))
+        if len(self.statements) < SLOW_SAMPLE_MAX_STATEMENTS:
+            self.statements.append((sql, params, seconds, error))
+
+
+_local = threading.local()
+
+
+def current_call() -> Optional[CallContext]:
+    """Вызов метода, выполняющийся в текущем потоке (None вне instrumented)"""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+class MethodMetrics:
+    """Метрики одного метода одного бэкенда"""
+    
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.rows = Histogram(ROW_BUCKETS)
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.errors: Dict[str, int] = {}
+        self.slow = 0
+        self.timeouts = 0
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик запросов в памяти процесса
+    
+    Ключ метрик - (бэкенд, метод): "sqlite" для ZinDatabase и "snapshot"
+    для SnapshotDatabase, чтобы режимы можно было сравнить под нагрузкой.
+    """
+    
+    def __init__(self, slow_seconds: float = None, slow_samples: int = None):
+        self.slow_seconds = config.METRICS_SLOW_QUERY_SECONDS if slow_seconds is None else slow_seconds
+        self._samples = deque(maxlen=slow_samples or config.METRICS_SLOW_QUERY_SAMPLES)
+        self._methods: Dict[Tuple[str, str], MethodMetrics] = {}
+        self._lock = threading.Lock()
+    
+    def _get(self, backend: str, method: str) -> MethodMetrics:
+        entry = self._methods.get((backend, method))
+        if entry is None:
+            entry = self._methods[(backend, method)] = MethodMetrics()
+        return entry
+    
+    def observe(self, backend: str, call: CallContext, seconds: float, rows: int):
+        """Записывает завершенный вызов метода"""
+        slow = seconds >= self.slow_seconds
+        with self._lock:
+            entry = self._get(backend, call.method)
+            entry.latency.observe(seconds)
+            entry.rows.observe(rows)
+            entry.statements += call.statement_count
+            entry.sql_seconds += call.sql_seconds
+            for label in call.errors:
+                entry.errors[label] = entry.errors.get(label, 0) + 1
+            if slow:
+                entry.slow += 1
+        
+        if slow:
+            self._samples.append(self._slow_sample(backend, call, seconds, rows))
+            logger.warning(f"Медленный запрос {backend}.{call.method}: {seconds:.3f} с, "
+                           f"SQL запросов: {call.statement_count}, строк: {rows}")
+    
+    @staticmethod
+    def _slow_sample(backend: str, call: CallContext, seconds: float, rows: int) -> dict:
+        return {
+            'time': time.time(),
+            'backend': backend,
+            'method': call.method,
+            'seconds': round(seconds, 6),
+            'rows': rows,
+            'args': [param_shape(value) for value in call.args],
+            'errors': list(call.errors),
+            'statements': [
+                {'sql': compact_sql(sql),
+                 'params': [param_shape(value) for value in params],
+                 'seconds': round(statement_seconds, 6),
+                 'error': str(error) if error is not None else None}
+                for sql, params, statement_seconds, error in call.statements
+            ],
+        }
+    
+    def count_timeout(self, backend: str, method: str):
+        """Вызов прерван по таймауту (AsyncZinDatabase)"""
+        with self._lock:
+            self._get(backend, method).timeouts += 1
+    
+    def slow_queries(self) -> List[dict]:
+        """Образцы последних медленных вызовов, начиная с самого нового"""
+        return list(reversed(self._samples))
+    
+    def summary(self) -> Dict[str, dict]:
+        """
+        Сводка по методам
+        
+        Returns:
+            dict: "бэкенд.метод" -> calls, errors, timeouts, slow, empty (вызовов
+            без строк), rows, statements, sql_seconds, mean, p50, p90, p99, max
+        """
+        with self._lock:
+            result = {}
+            for (backend, method), entry in sorted(self._methods.items()):
+                latency = entry.latency
+                result[f"{backend}.{method}"] = {
+                    'calls': latency.count,
+                    'errors': sum(entry.errors.values()),
+                    'timeouts': entry.timeouts,
+                    'slow': entry.slow,
+                    'empty': entry.rows.counts[0],
+                    'rows': int(entry.rows.sum),
+                    'statements': entry.statements,
+                    'sql_seconds': round(entry.sql_seconds, 6),
+                    'mean': round(latency.sum / latency.count, 6) if latency.count else 0.0,
+                    'p50': round(latency.quantile(0.5), 6),
+                    'p90': round(latency.quantile(0.9), 6),
+                    'p99': round(latency.quantile(0.99), 6),
+                    'max': round(latency.max, 6),
+                }
+            return result
+    
+    def render_prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus (version 0.0.4)"""
+        families = {
+            'duration': [], 'rows': [], 'statements': [], 'sql': [],
+            'errors': [], 'slow': [], 'timeouts': [],
+        }
+        with self._lock:
+            for (backend, method), entry in sorted(self._methods.items()):
+                labels = f'backend="{_escape(backend)}",method="{_escape(method)}"'
+                _histogram_lines(families['duration'], "zin_db_call_duration_seconds", labels, entry.latency)
+                _histogram_lines(families['rows'], "zin_db_call_rows", labels, entry.rows)
+                families['statements'].append(f"zin_db_statements_total{{{labels}}} {entry.statements}")
+                families['sql'].append(f"zin_db_sql_seconds_total{{{labels}}} {_format_value(entry.sql_seconds)}")
+                for label, count in sorted(entry.errors.items()):
+                    families['errors'].append(f'zin_db_errors_total{{{labels},error="{_escape(label)}"}} {count}')
+                families['slow'].append(f"zin_db_slow_calls_total{{{labels}}} {entry.slow}")
+                families['timeouts'].append(f"zin_db_timeouts_total{{{labels}}} {entry.timeouts}")
+        
+        headers = {
+            'duration': ("zin_db_call_duration_seconds", "histogram", "Время вызова метода базы ответов"),
+            'rows': ("zin_db_call_rows", "histogram", "Число строк в результате вызова"),
+            'statements': ("zin_db_statements_total", "counter", "SQL запросов внутри вызовов"),
+            'sql': ("zin_db_sql_seconds_total", "counter", "Время выполнения SQL запросов внутри вызовов"),
+            'errors': ("zin_db_errors_total", "counter", "Ошибки SQL запросов, в том числе перехваченные методом"),
+            'slow': ("zin_db_slow_calls_total", "counter",
+                     f"Вызовы дольше METRICS_SLOW_QUERY_SECONDS ({self.slow_seconds} с)"),
+            'timeouts': ("zin_db_timeouts_total", "counter", "Вызовы, прерванные по таймауту AsyncZinDatabase"),
+        }
+        lines = []
+        for key, (name, kind, help_text) in headers.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(families[key])
+        return "\n".join(lines) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._samples.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(lines: List[str], name: str, labels: str, histogram: Histogram):
+    for le, count in histogram.cumulative():
+        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+    lines.append(f"{name}_sum{{{labels}}} {_format_value(float(histogram.sum))}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+REGISTRY = MetricsRegistry()
+
+
+def instrumented(method):
+    """
+    Декоратор метода базы ответов: время вызова, число строк результата,
+    SQL запросы и ошибки внутри вызова записываются в self.metrics
+    (MetricsRegistry или None, если метрики отключены) с меткой бэкенда
+    self.metrics_backend.
+    
+    Исключение, вышедшее из метода, тоже учитывается как ошибка.
+    """
+    name = method.__name__
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        registry = self.metrics
+        if registry is None:
+            return method(self, *args, **kwargs)
+        
+        call = CallContext(name, args + tuple(kwargs.values()))
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(call)
+        started = time.perf_counter()
+        result = None
+        try:
+            result = method(self, *args, **kwargs)
+            return result
+        except Exception as e:
+            call.errors.append(error_label(e))
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            stack.pop()
+            rows = len(result) if isinstance(result, list) else int(bool(result))
+            registry.observe(self.metrics_backend, call, seconds, rows)
+    
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logger.debug(f"metrics: {format % args}")
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int = None, host: str = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Запускает в фоновом потоке HTTP сервер с /metrics для Prometheus
+    (один на процесс; повторный вызов возвращает уже запущенный).
+    
+    Returns:
+        ThreadingHTTPServer или None, если порт не задан (config.METRICS_HTTP_PORT = 0)
+    """
+    global _server
+    port = config.METRICS_HTTP_PORT if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host or config.METRICS_HTTP_HOST, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="zin-metrics", daemon=True).start()
+            logger.info(f"Метрики запросов доступны на http://{_server.server_address[0]}:{port}/metrics")
+        return _server
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Статистика и профилирование парсинга (html_parser.py --stats-report).
+
+ParseStats собирает время по стадиям обработки страницы (чтение HTML,
+хеш, построение дерева, разбор RSC данных, каждый способ извлечения
+ответа в parse_test_html, запись в БД), счетчики (страницы, байты,
+вопросы, сработавшие способы извлечения) и гистограммы скорости
+обработки страниц (страниц/с и байт/с). Периодически в лог выводится
+сводка, по окончании - отчет в JSON.
+
+В пуле процессов (--workers) каждая страница считается в своем
+PageStats, результат возвращается вместе с разобранными вопросами и
+добавляется в общий ParseStats основного процесса.
+
+Самые медленные страницы запоминаются; по окончании их можно повторно
+разобрать под cProfile (--profile-slowest N): файлы .prof сохраняются в
+PARSE_PROFILE_DIR, а самые затратные функции попадают в отчет.
+"""
+
+import os
+import json
+import heapq
+import time
+import logging
+import cProfile
+import pstats
+from typing import Dict, List, Optional
+import config
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм скорости обработки одной страницы
+PAGES_PER_SECOND_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+BYTES_PER_SECOND_BUCKETS = [2**i for i in range(16, 31, 2)]  # 64 КБ/с .. 1 ГБ/с
+
+# Сколько самых медленных страниц показывать в отчете (без профилирования)
+REPORT_SLOWEST_PAGES = 10
+
+
+class PageStats:
+    """
+    Время по стадиям, счетчики и размер одной страницы.
+    
+    Стадии отмечаются через lap: каждый вызов добавляет время с прошлой
+    отметки к стадии stage и возвращает новую отметку:
+        
+        started = stats.lap("tree", started)
+    """
+    
+    __slots__ = ('stages', 'counters', 'bytes', 'started')
+    
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.bytes = 0
+        self.started = time.perf_counter()
+    
+    def lap(self, stage: str, started: float) -> float:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - started
+        return now
+    
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def as_dict(self) -> dict:
+        """Компактное представление для передачи из процесса пула (seconds - время с создания)"""
+        return {'stages': self.stages, 'counters': self.counters, 'bytes': self.bytes,
+                'seconds': time.perf_counter() - self.started}
+
+
+class NullPageStats:
+    """Заглушка PageStats, когда статистика не собирается"""
+    
+    __slots__ = ()
+    
+    def lap(self, stage: str, started: float) -> float:
+        return started
+    
+    def count(self, name: str, value: int = 1):
+        pass
+
+
+NULL_STATS = NullPageStats()
+
+
+class ParseStats:
+    """Статистика парсинга всего запуска"""
+    
+    def __init__(self, summary_interval: float = None, slowest: int = None):
+        self.summary_interval = config.PARSE_STATS_INTERVAL if summary_interval is None else summary_interval
+        self.profile_limit = config.PARSE_PROFILE_SLOWEST if slowest is None else slowest
+        self.slowest_limit = max(self.profile_limit, REPORT_SLOWEST_PAGES)
+        self.started = time.monotonic()
+        self.stages: Dict[str, List[float]] = {}    # стадия -> [секунды, вызовы]
+        self.counters: Dict[str, int] = {}
+        self.pages_per_second = Histogram(PAGES_PER_SECOND_BUCKETS)
+        self.bytes_per_second = Histogram(BYTES_PER_SECOND_BUCKETS)
+        self.intervals: List[dict] = []
+        self.slowest: List[tuple] = []              # куча (секунды, test_id, байт)
+        self.profiles: List[dict] = []
+        self._window = (self.started, 0, 0)         # (начало, страниц, байт) на начало окна
+    
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        entry = self.stages.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+    
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def merge(self, page: Optional[dict]):
+        """Добавляет время стадий и счетчики страницы (PageStats.as_dict())"""
+        if not page:
+            return
+        for stage, value in page['stages'].items():
+            self.add_time(stage, value)
+        for name, value in page['counters'].items():
+            self.count(name, value)
+    
+    def add_page(self, test_id: int, page: dict):
+        """
+        Добавляет разобранную страницу: стадии, счетчики, скорость обработки
+        и кандидата в самые медленные.
+        
+        Args:
+            test_id: ID теста
+            page: PageStats.as_dict() страницы (в том числе из процесса пула)
+        """
+        self.merge(page)
+        seconds, size = page['seconds'], page['bytes']
+        self.count('pages')
+        self.count('bytes', size)
+        if seconds > 0:
+            self.pages_per_second.observe(1.0 / seconds)
+            self.bytes_per_second.observe(size / seconds)
+        
+        item = (seconds, test_id, size)
+        if len(self.slowest) < self.slowest_limit:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+    
+    def maybe_log_summary(self, force: bool = False):
+        """Выводит сводку в лог раз в summary_interval секунд"""
+        now = time.monotonic()
+        window_started, window_pages, window_bytes = self._window
+        elapsed = now - window_started
+        if not force and (not self.summary_interval or elapsed < self.summary_interval):
+            return
+        
+        pages = self.counters.get('pages', 0)
+        size = self.counters.get('bytes', 0)
+        interval = {
+            'elapsed': round(now - self.started, 1),
+            'pages': pages - window_pages,
+            'pages_per_second': round((pages - window_pages) / elapsed, 2) if elapsed > 0 else 0.0,
+            'bytes_per_second': round((size - window_bytes) / elapsed) if elapsed > 0 else 0,
+        }
+        self.intervals.append(interval)
+        self._window = (now, pages, size)
+        
+        stage_total = sum(value[0] for value in self.stages.values()) or 1.0
+        top = sorted(self.stages.items(), key=lambda item: -item[1][0])[:5]
+        shares = ", ".join(f"{stage} {value[0] / stage_total:.0%}" for stage, value in top)
+        logger.info(f"Статистика парсинга: {pages} страниц, {interval['pages_per_second']} стр/с, "
+                    f"{interval['bytes_per_second'] / 2**20:.1f} МБ/с; время по стадиям: {shares}")
+    
+    def profile_slowest(self, load_page, parse_page, directory: str = None):
+        """
+        Повторно разбирает самые медленные страницы под cProfile.
+        
+        Args:
+            load_page: test_id -> HTML или None
+            parse_page: HTML -> результат парсинга
+            directory: Куда сохранить файлы .prof (по умолчанию config.PARSE_PROFILE_DIR)
+        """
+        if not self.profile_limit or not self.slowest:
+            return
+        directory = directory or config.PARSE_PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        for seconds, test_id, size in sorted(self.slowest, reverse=True)[:self.profile_limit]:
+            html = load_page(test_id)
+            if html is None:
+                continue
+            profiler = cProfile.Profile()
+            profiler.runcall(parse_page, html)
+            path = os.path.join(directory, f"parse_{test_id}.prof")
+            profiler.dump_stats(path)
+            
+            stats = pstats.Stats(profiler)
+            top = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:config.PARSE_PROFILE_TOP_FUNCTIONS]
+            self.profiles.append({
+                'test_id': test_id,
+                'seconds': round(seconds, 4),
+                'bytes': size,
+                'profile': path,
+                'top_functions': [
+                    {'function': f"{os.path.basename(file)}:{line}({name})",
+                     'calls': calls, 'cumulative': round(cumulative, 4)}
+                    for (file, line, name), (_, calls, _, cumulative, _) in top
+                ],
+            })
+            logger.info(f"Профиль разбора теста {test_id} ({seconds:.3f} с): {path}")
+    
+    def report(self) -> dict:
+        """Отчет о запуске в виде словаря (для JSON)"""
+        elapsed = time.monotonic() - self.started
+        pages = self.counters.get('pages', 0)
+        size = self.counters.get('bytes', 0)
+        return {
+            'elapsed': round(elapsed, 2),
+            'pages': pages,
+            'bytes': size,
+            'pages_per_second': round(pages / elapsed, 2) if elapsed > 0 else 0.0,
+            'bytes_per_second': round(size / elapsed) if elapsed > 0 else 0,
+            'stages': {
+                stage: {'seconds': round(seconds, 4), 'calls': calls,
+                        'ms_per_call': round(seconds / calls * 1000, 3) if calls else 0.0}
+                for stage, (seconds, calls) in sorted(self.stages.items(), key=lambda item: -item[1][0])
+            },
+            'counters': dict(sorted(self.counters.items())),
+            'histograms': {
+                'pages_per_second': self.pages_per_second.as_dict(),
+                'bytes_per_second': self.bytes_per_second.as_dict(),
+            },
+            'intervals': self.intervals,
+            'slowest_pages': [{'test_id': test_id, 'seconds': round(seconds, 4), 'bytes': size}
+                              for seconds, test_id, size in sorted(self.slowest, reverse=True)],
+            'profiles': self.profiles,
+        }
+    
+    def write_report(self, path: str):
+        """Сохраняет отчет в JSON"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        logger.info(f"Отчет о парсинге сохранен: {path}")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Семантический поиск по вопросам: TF-IDF по символьным n-граммам.
+
+Поиск по словам не находит перефразированные вопросы и вопросы с другими
+формами слов. Здесь каждый канонический вопрос (таблица questions)
+представлен разреженным вектором TF-IDF по символьным n-граммам
+нормализованного текста (n-граммы хешируются в SEMANTIC_FEATURES
+признаков), строки нормированы, и сходство с запросом - косинус.
+
+Матрица хранится по столбцам (CSC: для каждого признака - номера вопросов
+и веса) в файлах .npy, которые ZinDatabase открывает через mmap. Запрос
+затрагивает только столбцы своих n-грамм: веса собираются одним
+векторным bincount, лучшие k - через argpartition, поэтому время ответа
+зависит от числа совпавших n-грамм, а не от размера корпуса целиком.
+
+Построение: python semantic_index.py (после html_parser.py); после построения
+выборка вопросов проверяется на поиск самих себя (--check-only - только проверка)
+"""
+
+import os
+import json
+import math
+import sqlite3
+import logging
+import time
+import zlib
+import argparse
+from collections import Counter
+from typing import List, Tuple
+import config
+from text_normalize import normalize_text
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILES = ("indptr", "indices", "data", "idf", "question_ids")
+
+# Сколько ненулевых элементов накапливать в списках перед переводом в numpy
+BUILD_CHUNK_SIZE = 1_000_000
+
+
+def ngram_features(text: str, ngram_range: Tuple[int, int] = None, features: int = None) -> Counter:
+    """Счетчик хешей символьных n-грамм нормализованного текста"""
+    low, high = ngram_range or config.SEMANTIC_NGRAM_RANGE
+    features = features or config.SEMANTIC_FEATURES
+    text = normalize_text(text)
+    if not text:
+        return Counter()
+    text = f" {text} "
+    counts = Counter()
+    for size in range(low, high + 1):
+        for i in range(len(text) - size + 1):
+            counts[zlib.crc32(text[i:i + size].encode('utf-8')) % features] += 1
+    return counts
+
+
+def build_index(conn, directory: str = None) -> dict:
+    """
+    Строит матрицу TF-IDF по таблице questions и сохраняет ее в directory.
+    
+    Returns:
+        dict: questions, features (ненулевых столбцов), nnz, seconds
+    """
+    if np is None:
+        raise RuntimeError("Для семантического индекса установите пакет numpy")
+    directory = directory or config.SEMANTIC_INDEX_DIR
+    features = config.SEMANTIC_FEATURES
+    started = time.monotonic()
+    
+    cur = conn.cursor()
+    cur.execute("SELECT question_id, question FROM questions ORDER BY question_id")
+    question_ids = []
+    chunks = []
+    rows, cols, counts = [], [], []
+    for row_index, (question_id, question) in enumerate(cur):
+        question_ids.append(question_id)
+        for feature, count in ngram_features(question).items():
+            rows.append(row_index)
+            cols.append(feature)
+            counts.append(count)
+        # Списки Python периодически переводятся в компактные массивы numpy
+        if len(rows) >= BUILD_CHUNK_SIZE:
+            chunks.append((np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32),
+                           np.array(counts, dtype=np.float32)))
+            rows, cols, counts = [], [], []
+    chunks.append((np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32),
+                   np.array(counts, dtype=np.float32)))
+    
+    total = len(question_ids)
+    rows = np.concatenate([chunk[0] for chunk in chunks])
+    cols = np.concatenate([chunk[1] for chunk in chunks])
+    tf = 1.0 + np.log(np.concatenate([chunk[2] for chunk in chunks]))
+    del chunks, counts
+    
+    # Слишком частые n-граммы почти не различают вопросы, но дают самые длинные столбцы.
+    # Им и n-граммам, которых нет в корпусе, сохраняется idf = 0: query_vector
+    # их пропускает, и вектор запроса нормируется по тем же признакам, что и строки
+    df = np.bincount(cols, minlength=features)
+    idf = (np.log((1.0 + total) / (1.0 + df)) + 1.0).astype(np.float32)
+    idf[(df == 0) | (df > max(1, config.SEMANTIC_MAX_DF * total))] = 0.0
+    keep = idf[cols] > 0
+    rows, cols, tf = rows[keep], cols[keep], tf[keep]
+    column_sizes = np.bincount(cols, minlength=features)
+    
+    data = tf * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=data.astype(np.float64) ** 2, minlength=total))
+    data = (data / np.where(norms > 0, norms, 1.0)[rows]).astype(np.float32)
+    
+    # Хранение по столбцам: для признака j вопросы indices[indptr[j]:indptr[j + 1]]
+    order = np.argsort(cols, kind='stable')
+    arrays = {
+        'indptr': np.concatenate(([0], np.cumsum(column_sizes))).astype(np.int64),
+        'indices': rows[order],
+        'data': data[order],
+        'idf': idf,
+        'question_ids': np.array(question_ids, dtype=np.int64),
+    }
+    
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        tmp_path = os.path.join(directory, f"{name}.tmp.npy")
+        np.save(tmp_path, array)
+        os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+    
+    cur.execute("SELECT value FROM db_meta WHERE key = 'generation'")
+    generation = cur.fetchone()
+    meta = {
+        'questions': total,
+        'features': features,
+        'ngram_range': list(config.SEMANTIC_NGRAM_RANGE),
+        'generation': int(generation[0]) if generation else 0,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'build_id': time.time_ns(),
+    }
+    # meta.json заменяется последним: по его смене ZinDatabase перечитывает индекс
+    tmp_path = os.path.join(directory, "meta.json.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, "meta.json"))
+    
+    return {
+        'questions': total,
+        'features': int(np.count_nonzero(column_sizes)),
+        'nnz': int(len(arrays['data'])),
+        'seconds': round(time.monotonic() - started, 2),
+    }
+
+
+class SemanticIndex:
+    """Матрица TF-IDF, открытая только для чтения через mmap"""
+    
+    def __init__(self, directory: str = None):
+        if np is None:
+            raise RuntimeError("Для семантического поиска установите пакет numpy")
+        directory = directory or config.SEMANTIC_INDEX_DIR
+        with open(os.path.join(directory, "meta.json"), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        for name in INDEX_FILES:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r'))
+        self.features = self.meta['features']
+        self.ngram_range = tuple(self.meta['ngram_range'])
+        # Файлы от разных построений (индекс перестраивается, пока его читают)
+        if (len(self.idf) != self.features or len(self.indptr) != self.features + 1
+                or self.indptr[-1] != len(self.indices) or len(self.indices) != len(self.data)):
+            raise RuntimeError(f"Файлы семантического индекса в {directory} не согласованы, постройте его заново")
+    
+    def __len__(self):
+        return len(self.question_ids)
+    
+    def query_vector(self, text: str) -> Tuple[List[int], List[float]]:
+        """Признаки запроса и их нормированные веса TF-IDF"""
+        counts = ngram_features(text, self.ngram_range, self.features)
+        # Признаки с idf = 0 (слишком частые или не встречавшиеся в корпусе) не учитываются
+        columns = [j for j in sorted(counts) if self.idf[j] > 0]
+        weights = [(1.0 + math.log(counts[j])) * float(self.idf[j]) for j in columns]
+        norm = math.sqrt(sum(w * w for w in weights)) or 1.0
+        return columns, [w / norm for w in weights]
+    
+    def search(self, text: str, limit: int = 20, min_score: float = None) -> List[Tuple[int, float]]:
+        """
+        Ближайшие к запросу вопросы.
+        
+        Returns:
+            List[Tuple[int, float]]: (question_id, косинусное сходство) по убыванию сходства
+        """
+        min_score = config.SEMANTIC_MIN_SCORE if min_score is None else min_score
+        columns, weights = self.query_vector(text)
+        if not columns or not len(self):
+            return []
+        
+        starts = self.indptr[columns]
+        ends = self.indptr[np.asarray(columns) + 1]
+        slices = [(s, e, w) for s, e, w in zip(starts.tolist(), ends.tolist(), weights) if e > s]
+        if not slices:
+            return []
+        rows = np.concatenate([self.indices[s:e] for s, e, _ in slices])
+        values = np.concatenate([self.data[s:e] * np.float32(w) for s, e, w in slices])
+        
+        # Сумма вкладов по вопросам только среди затронутых строк
+        touched, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=values)
+        
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.question_ids[touched[i]]), float(scores[i]))
+                for i in top if scores[i] >= min_score]
+
+
+def check_self_similarity(index: SemanticIndex, conn, sample: int = 200) -> dict:
+    """
+    Проверка индекса: вопрос из индекса, заданный как запрос, должен
+    находить сам себя со сходством ~1 (вектор запроса строится так же,
+    как строка матрицы).
+    
+    Returns:
+        dict: checked, min_score, failed (question_id вопросов, не нашедших себя)
+    """
+    step = max(1, len(index) // sample) if sample else 1
+    question_ids = [int(question_id) for question_id in index.question_ids[::step]]
+    cur = conn.cursor()
+    checked, min_score, failed = 0, 1.0, []
+    for question_id in question_ids:
+        cur.execute("SELECT question FROM questions WHERE question_id = ?", (question_id,))
+        row = cur.fetchone()
+        if row is None or not index.query_vector(row[0])[0]:
+            continue
+        scores = dict(index.search(row[0], limit=10, min_score=0.0))
+        score = scores.get(question_id, 0.0)
+        checked += 1
+        min_score = min(min_score, score)
+        if score < 0.999:
+            failed.append(question_id)
+    return {'checked': checked, 'min_score': round(min_score, 6), 'failed': failed}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description="Построение семантического индекса TF-IDF по вопросам")
+    parser.add_argument("--db", default=config.DB_PATH, help="путь к БД (по умолчанию config.DB_PATH)")
+    parser.add_argument("--dir", default=config.SEMANTIC_INDEX_DIR, help="каталог индекса")
+    parser.add_argument("--check-only", action="store_true", help="только проверить построенный индекс")
+    parser.add_argument("--check-sample", type=int, default=200, help="сколько вопросов проверить (0 - все)")
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(args.db)
+    try:
+        if not args.check_only:
+            result = build_index(conn, args.dir)
+            logger.info(f"Семантический индекс построен: {result}")
+        check = check_self_similarity(SemanticIndex(args.dir), conn, args.check_sample)
+    finally:
+        conn.close()
+    if check['failed']:
+        logger.error(f"Вопросы не находят сами себя: {check}")
+        raise SystemExit(1)
+    logger.info(f"Проверка индекса: {check}")
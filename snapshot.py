@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Снимок базы ответов в памяти для бота.
+
+SnapshotDatabase один раз загружает таблицу tests и отвечает на запросы
+чтения ZinDatabase без обращения к SQLite. Числовые колонки хранятся в
+массивах numpy, одинаковые строки (повторяющиеся вопросы, ответы, пути к
+HTML) - в одном экземпляре. Для поиска строятся:
+
+- обратный индекс по словам нормализованного текста в формате CSR
+  (словарь отсортирован, поэтому префикс слова - непрерывный диапазон
+  строк индекса); ранжирование - bm25 с теми же весами колонок, что у
+  tests_fts, так что порядок результатов совпадает с ZinDatabase;
+- триграммный индекс по различным нормализованным вопросам с bm25
+  tests_trigram, поэтому и нечеткий поиск отбирает тех же кандидатов.
+
+Слова разбиваются так же, как токенизатором unicode61 remove_diacritics 2
+(см. TokenFolding). Совпадение выдачи с ZinDatabase проверяет
+benchmarks/bench_snapshot.py.
+
+Фоновый поток следит за поколением БД (db_meta.generation). Когда парсер
+публикует новое поколение, новый снимок строится рядом со старым и
+подменяется одним присваиванием ссылки: запросы, начатые на старом
+снимке, дорабатывают на нем, перезапуск бота не нужен.
+
+Методы, которым нужны файлы (HTML тестов) или внешние индексы
+(search_semantic), передаются в ZinDatabase.
+
+Пример:
+    from snapshot import SnapshotDatabase
+    db = SnapshotDatabase()
+    db.search_questions("закон ома")
+"""
+
+import array
+import bisect
+import math
+import os
+import random
+import sqlite3
+import logging
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import config
+from database import ZinDatabase, BM25_WEIGHTS, FUZZY_MAX_TRIGRAMS, FUZZY_CANDIDATE_FACTOR, text_trigrams
+from text_normalize import normalize_text
+from metrics import instrumented
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Параметры bm25 как в FTS5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class TokenFolding(dict):
+    """
+    Таблица для str.translate: что токенизатор tests_fts (unicode61
+    remove_diacritics 2) делает с символом - оставляет, заменяет буквой
+    без диакритики, удаляет (комбинируемые знаки) или считает
+    разделителем. Правила берутся у самого SQLite: для нового символа c
+    в памяти индексируется слово "qcq" и читается получившийся токен.
+    Так, й и ў остаются отдельными буквами, а é и ï сворачиваются в e и i
+    ровно так же, как в tests_fts.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def __missing__(self, code: int) -> str:
+        with self._lock:
+            if code not in self:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+                    self._conn.execute("CREATE VIRTUAL TABLE fold USING fts5(text, "
+                                       "tokenize='unicode61 remove_diacritics 2')")
+                    self._conn.execute("CREATE VIRTUAL TABLE fold_terms USING fts5vocab(fold, 'instance')")
+                self._conn.execute("INSERT INTO fold(rowid, text) VALUES (?, ?)", (code, f"q{chr(code)}q"))
+                terms = self._conn.execute("SELECT term FROM fold_terms WHERE doc = ? ORDER BY offset",
+                                           (code,)).fetchall()
+                # "qq" - символ удаляется, "q q" - разделитель
+                dict.__setitem__(self, code, " ".join(term for term, in terms)[1:-1])
+            return dict.__getitem__(self, code)
+
+
+FOLDING = TokenFolding()
+
+
+def index_tokens(normalized: str) -> List[str]:
+    """Слова нормализованного текста так, как их видит токенизатор tests_fts"""
+    if normalized.isascii():
+        return normalized.split()
+    return normalized.translate(FOLDING).split()
+
+
+def read_generation(cur) -> int:
+    """Поколение БД из db_meta (0 для БД без db_meta)"""
+    try:
+        cur.execute("SELECT value FROM db_meta WHERE key = 'generation'")
+    except sqlite3.OperationalError:
+        return 0
+    row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+class PostingIndex:
+    """
+    Обратный индекс в формате CSR: для ключа номер k - номера документов
+    docs[indptr[k]:indptr[k + 1]] (по возрастанию) и их веса.
+    """
+    
+    def __init__(self, keys: List[str], key_ids: array.array, docs: array.array, weights: array.array = None):
+        """
+        Args:
+            keys: Ключи в порядке первого появления
+            key_ids, docs, weights: Пары (ключ, документ) в порядке возрастания документа
+        """
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        remap = np.empty(len(keys), dtype=np.int32)
+        remap[order] = np.arange(len(keys), dtype=np.int32)
+        
+        key_ids = remap[np.frombuffer(key_ids, dtype=np.int32)]
+        postings = np.argsort(key_ids, kind='stable')
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(key_ids, minlength=len(keys))))).astype(np.int64)
+        self.docs = np.frombuffer(docs, dtype=np.int32)[postings]
+        self.weights = np.frombuffer(weights, dtype=np.float32)[postings] if weights is not None else None
+    
+    def prefix_range(self, prefix: str) -> Tuple[int, int, int]:
+        """Ключи, начинающиеся с prefix: (число ключей, начало и конец их позиций в docs)"""
+        first = bisect.bisect_left(self.keys, prefix)
+        last = first
+        while last < len(self.keys) and self.keys[last].startswith(prefix):
+            last += 1
+        return last - first, int(self.indptr[first]), int(self.indptr[last])
+    
+    def exact_range(self, key: str) -> Tuple[int, int]:
+        """Позиции ключа key в docs"""
+        position = bisect.bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return 0, 0
+        return int(self.indptr[position]), int(self.indptr[position + 1])
+
+
+class SnapshotRow:
+    """Строка снимка: ссылка на колонки и номер строки вместо отдельного кортежа"""
+    
+    __slots__ = ('snapshot', 'index')
+    
+    def __init__(self, snapshot: 'Snapshot', index: int):
+        self.snapshot = snapshot
+        self.index = index
+    
+    @property
+    def test_id(self) -> int:
+        return int(self.snapshot.test_ids[self.index])
+    
+    @property
+    def question(self) -> str:
+        return self.snapshot.questions[self.index]
+    
+    @property
+    def answer(self) -> str:
+        return self.snapshot.answers[self.index]
+    
+    @property
+    def question_idx(self) -> int:
+        return int(self.snapshot.question_idxs[self.index])
+    
+    @property
+    def html_file_path(self) -> Optional[str]:
+        return self.snapshot.paths[self.index]
+    
+    def as_tuple(self) -> Tuple:
+        """Кортеж в формате результатов ZinDatabase"""
+        return (self.test_id, self.question, self.answer, self.question_idx, self.html_file_path)
+
+
+class Snapshot:
+    """
+    Неизменяемый снимок таблицы tests с поисковыми индексами.
+    
+    Строки упорядочены по (test_id, question_idx), номер строки в снимке -
+    общий ключ колонок и индексов.
+    """
+    
+    def __init__(self, conn: sqlite3.Connection):
+        started = time.monotonic()
+        cur = conn.cursor()
+        # Все чтения в одной транзакции: строки, кластеры и поколение согласованы
+        cur.execute("BEGIN")
+        try:
+            self.generation = read_generation(cur)
+            self._load_rows(cur)
+            self._load_clusters(cur)
+        finally:
+            conn.rollback()
+        
+        self._build_trigrams()
+        self.stats = self._compute_stats()
+        self.load_seconds = round(time.monotonic() - started, 2)
+    
+    def _load_rows(self, cur):
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(tests)")}
+        norm = "question_norm, answer_norm" if "question_norm" in columns else "NULL, NULL"
+        question_id = "question_id" if "question_id" in columns else "NULL"
+        
+        test_ids = array.array('i')
+        rowids = array.array('q')
+        question_idxs = array.array('h')
+        question_ids = array.array('q')
+        doc_lengths = array.array('i')
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.paths: List[Optional[str]] = []
+        self.daily: Dict[str, int] = {}
+        interned: Dict[str, str] = {}
+        self._question_norms: Dict[str, List[int]] = {}
+        
+        tokens: Dict[str, int] = {}
+        token_ids, token_rows, token_weights = array.array('i'), array.array('i'), array.array('f')
+        
+        cur.execute(f"""
+            SELECT rowid, test_id, question_idx, question, answer, html_file_path,
+                   {norm}, {question_id}, DATE(fetched_at)
+            FROM tests
+            ORDER BY test_id, question_idx
+        """)
+        for index, (rowid, test_id, idx, question, answer, path, q_norm, a_norm, qid, fetched_date) in enumerate(cur):
+            question = interned.setdefault(question or "", question or "")
+            answer = interned.setdefault(answer or "", answer or "")
+            if path is not None:
+                path = interned.setdefault(path, path)
+            if q_norm is None:
+                q_norm, a_norm = normalize_text(question), normalize_text(answer)
+            
+            test_ids.append(test_id)
+            rowids.append(rowid)
+            question_idxs.append(idx)
+            question_ids.append(qid or 0)
+            self.questions.append(question)
+            self.answers.append(answer)
+            self.paths.append(path)
+            if fetched_date and idx == 0:
+                self.daily[fetched_date] = self.daily.get(fetched_date, 0) + 1
+            if question:
+                self._question_norms.setdefault(q_norm, []).append(index)
+            
+            # Как и в tests_fts, индексируются все строки (это влияет на idf),
+            # а строки без вопроса отбрасываются при выдаче
+            q_tokens = index_tokens(q_norm)
+            a_tokens = index_tokens(a_norm)
+            doc_lengths.append(len(q_tokens) + len(a_tokens))
+            weights: Dict[str, float] = {}
+            for token in q_tokens:
+                weights[token] = weights.get(token, 0.0) + BM25_WEIGHTS[0]
+            for token in a_tokens:
+                weights[token] = weights.get(token, 0.0) + BM25_WEIGHTS[1]
+            for token, weight in weights.items():
+                token_ids.append(tokens.setdefault(token, len(tokens)))
+                token_rows.append(index)
+                token_weights.append(weight)
+        
+        self.test_ids = np.frombuffer(test_ids, dtype=np.int32)
+        # rowid в tests: порядок строк с равной оценкой в выдаче SQLite
+        self.rowids = np.frombuffer(rowids, dtype=np.int64)
+        self.question_idxs = np.frombuffer(question_idxs, dtype=np.int16)
+        self.question_ids = np.frombuffer(question_ids, dtype=np.int64)
+        self.has_question = np.fromiter((bool(q) for q in self.questions), dtype=bool, count=len(self.questions))
+        self.eligible = np.flatnonzero(self.has_question).astype(np.int32)
+        
+        self.words = PostingIndex(list(tokens), token_ids, token_rows, token_weights)
+        del tokens, token_ids, token_rows, token_weights
+        # Знаменатель bm25 по длине строки: k1 * (1 - b + b * D / avgdl)
+        lengths = np.frombuffer(doc_lengths, dtype=np.int32).astype(np.float64)
+        avg_length = lengths.mean() if len(lengths) else 0.0
+        self.length_norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (avg_length or 1.0))
+        
+        # Строки по question_id: строки вопроса q - by_question[start:end],
+        # где start и end - границы q в sorted_question_ids
+        self.by_question = np.argsort(self.question_ids, kind='stable').astype(np.int32)
+        self.sorted_question_ids = self.question_ids[self.by_question]
+    
+    def _load_clusters(self, cur):
+        """Кластеры похожих вопросов (clustering.py), если они построены"""
+        self.cluster_of: Dict[int, int] = {}
+        self.cluster_members: Dict[int, List[int]] = {}
+        try:
+            cur.execute("SELECT question_id, cluster_id FROM question_clusters")
+        except sqlite3.OperationalError:
+            return
+        for question_id, cluster_id in cur:
+            self.cluster_of[question_id] = cluster_id
+            self.cluster_members.setdefault(cluster_id, []).append(question_id)
+    
+    def _build_trigrams(self):
+        """
+        Триграммный индекс по различным нормализованным вопросам с тем же
+        bm25, что у tests_trigram: частоты триграмм в вопросе, длина
+        вопроса в триграммах и число строк tests с каждой триграммой
+        (вопрос, повторенный в n строках, - n документов FTS5).
+        """
+        self.distinct_questions = list(self._question_norms)
+        self.distinct_rows = [array.array('i', rows) for rows in self._question_norms.values()]
+        del self._question_norms
+        
+        trigrams: Dict[str, int] = {}
+        trigram_ids, numbers, counts = array.array('i'), array.array('i'), array.array('f')
+        lengths = array.array('i')
+        for number, q_norm in enumerate(self.distinct_questions):
+            lengths.append(max(len(q_norm) - 2, 0))
+            for trigram, count in Counter(q_norm[i:i + 3] for i in range(len(q_norm) - 2)).items():
+                trigram_ids.append(trigrams.setdefault(trigram, len(trigrams)))
+                numbers.append(number)
+                counts.append(count)
+        self.trigrams = PostingIndex(list(trigrams), trigram_ids, numbers, counts)
+        
+        # tests_trigram индексирует все строки tests, в том числе без вопроса
+        row_counts = np.array([len(rows) for rows in self.distinct_rows], dtype=np.float64)
+        lengths = np.frombuffer(lengths, dtype=np.int32).astype(np.float64)
+        avg_length = (lengths * row_counts).sum() / len(self) if len(self) else 0.0
+        self.trigram_length_norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (avg_length or 1.0))
+        cumulative = np.concatenate(([0.0], np.cumsum(row_counts[self.trigrams.docs])))
+        self.trigram_rows = cumulative[self.trigrams.indptr[1:]] - cumulative[self.trigrams.indptr[:-1]]
+    
+    def _compute_stats(self) -> dict:
+        total = len(self.test_ids)
+        with_questions = len(self.eligible)
+        return {
+            'total_records': total,
+            'unique_tests': int(np.count_nonzero(self.question_idxs == 0)),
+            'records_with_questions': with_questions,
+            'last_test_id': int(self.test_ids[-1]) if total else 0,
+            'fill_percentage': (with_questions / total * 100) if total > 0 else 0
+        }
+    
+    def __len__(self):
+        return len(self.test_ids)
+    
+    def row(self, index: int) -> SnapshotRow:
+        return SnapshotRow(self, int(index))
+    
+    def question_rows(self, question_id: int):
+        """Номера строк с данным question_id по возрастанию"""
+        start = np.searchsorted(self.sorted_question_ids, question_id, 'left')
+        end = np.searchsorted(self.sorted_question_ids, question_id, 'right')
+        return np.sort(self.by_question[start:end])
+    
+    def test_rows(self, test_id: int) -> range:
+        """Номера строк теста"""
+        start = np.searchsorted(self.test_ids, test_id, 'left')
+        end = np.searchsorted(self.test_ids, test_id, 'right')
+        return range(int(start), int(end))
+    
+    # --- поиск по словам ---
+    
+    def term_scores(self, prefix: str):
+        """
+        Вклад префиксного терма в bm25 для каждой строки, где он встречается.
+        
+        Returns:
+            (rows, scores): номера строк по возрастанию и вклады
+        """
+        expanded, start, end = self.words.prefix_range(prefix)
+        rows = self.words.docs[start:end]
+        weights = self.words.weights[start:end].astype(np.float64)
+        if expanded > 1:
+            # Префикс раскрылся в несколько слов: вхождения одной строки складываются
+            rows, inverse = np.unique(rows, return_inverse=True)
+            weights = np.bincount(inverse, weights=weights)
+        
+        total = len(self.test_ids)
+        found = len(rows)
+        idf = max(math.log((total - found + 0.5) / (found + 0.5)), 1e-6) if found else 0.0
+        # Порядок операций как в bm25 FTS5: равные там оценки остаются равными и здесь
+        return rows, idf * ((weights * (BM25_K1 + 1.0)) / (weights + self.length_norms[rows]))
+    
+    def match(self, groups: List[List[str]], any_group: bool = False):
+        """
+        Строки, подходящие под группы слов, с оценкой bm25.
+        
+        Внутри группы все слова обязательны (префиксное AND, как в
+        build_fts_query); группы объединяются через AND или, при
+        any_group, через OR.
+        
+        Returns:
+            (rows, scores): номера строк по возрастанию и оценки
+        """
+        result = None
+        for tokens in groups:
+            rows, scores = None, None
+            for token in tokens:
+                token_rows, token_scores = self.term_scores(token)
+                if rows is None:
+                    rows, scores = token_rows, token_scores
+                else:
+                    rows, left, right = np.intersect1d(rows, token_rows, assume_unique=True, return_indices=True)
+                    scores = scores[left] + token_scores[right]
+                if not len(rows):
+                    break
+            
+            if result is None:
+                result = (rows, scores)
+            elif any_group:
+                merged, inverse = np.unique(np.concatenate((result[0], rows)), return_inverse=True)
+                result = (merged, np.bincount(inverse, weights=np.concatenate((result[1], scores))))
+            else:
+                merged, left, right = np.intersect1d(result[0], rows, assume_unique=True, return_indices=True)
+                result = (merged, result[1][left] + scores[right])
+            if not len(result[0]) and not any_group:
+                break
+        return result
+    
+    def ranked(self, rows, scores):
+        """Строки с вопросом по убыванию оценки, при равенстве - по test_id"""
+        keep = self.has_question[rows]
+        rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((self.test_ids[rows], -scores))
+        return rows[order], scores[order]
+    
+    def top_rows(self, rows, scores, limit: int) -> List[Tuple]:
+        rows, _ = self.ranked(rows, scores)
+        return [self.row(index).as_tuple() for index in rows[:limit]]
+    
+    # --- триграммы ---
+    
+    def fuzzy_candidates(self, match_trigrams: List[str], limit: int) -> List[int]:
+        """
+        Строки-кандидаты нечеткого поиска в порядке выдачи ZinDatabase:
+        по bm25(tests_trigram) для запроса из триграмм через OR, при
+        равенстве - по rowid, не больше limit строк.
+        """
+        total = len(self)
+        numbers, contributions = [], []
+        # Вклады триграмм суммируются в порядке фраз запроса, как в bm25 FTS5
+        for trigram in match_trigrams:
+            position = bisect.bisect_left(self.trigrams.keys, trigram)
+            if position == len(self.trigrams.keys) or self.trigrams.keys[position] != trigram:
+                continue
+            start, end = int(self.trigrams.indptr[position]), int(self.trigrams.indptr[position + 1])
+            hits = self.trigram_rows[position]
+            idf = math.log((total - hits + 0.5) / (hits + 0.5))
+            if idf <= 0.0:
+                idf = 1e-6
+            docs = self.trigrams.docs[start:end]
+            freqs = self.trigrams.weights[start:end].astype(np.float64)
+            numbers.append(docs)
+            contributions.append(idf * ((freqs * (BM25_K1 + 1.0)) / (freqs + self.trigram_length_norms[docs])))
+        if not numbers:
+            return []
+        numbers = np.concatenate(numbers)
+        scores = np.bincount(numbers, weights=np.concatenate(contributions))
+        found = np.unique(numbers)
+        if len(found) > limit:
+            # У каждого вопроса хотя бы одна строка: строки с оценкой ниже limit-го вопроса не нужны
+            threshold = scores[found[np.argpartition(-scores[found], limit - 1)[limit - 1]]]
+            found = found[scores[found] >= threshold]
+        
+        rows = np.concatenate([np.frombuffer(self.distinct_rows[number], dtype=np.int32) for number in found.tolist()])
+        row_scores = np.repeat(scores[found], [len(self.distinct_rows[number]) for number in found.tolist()])
+        order = np.lexsort((self.rowids[rows], -row_scores))[:limit]
+        return rows[order].tolist()
+
+
+class SnapshotDatabase:
+    """
+    Методы чтения ZinDatabase поверх снимка в памяти.
+    
+    Методы возвращают те же структуры, что и ZinDatabase. Текущий снимок
+    читается одной ссылкой в начале каждого метода, поэтому подмена
+    снимка фоновым потоком атомарна для запросов.
+    """
+    
+    # Метка бэкенда в метриках запросов (metrics.py)
+    metrics_backend = "snapshot"
+    
+    def __init__(self, db_path: str = None, poll_interval: float = None, watch: bool = True):
+        if np is None:
+            raise RuntimeError("Для режима снимка установите пакет numpy")
+        self.db_path = db_path or config.DB_PATH
+        self.poll_interval = poll_interval or config.SNAPSHOT_POLL_INTERVAL
+        self._db = ZinDatabase(self.db_path)
+        self.metrics = self._db.metrics
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loaded_at = 0.0
+        self._snapshot = self._load()
+        
+        self._watcher = None
+        if watch:
+            self._watcher = threading.Thread(target=self._watch, name="zin-snapshot", daemon=True)
+            self._watcher.start()
+    
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{urllib.parse.quote(os.path.abspath(self.db_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True)
+    
+    def _load(self) -> Snapshot:
+        conn = self._connect()
+        try:
+            snapshot = Snapshot(conn)
+        finally:
+            conn.close()
+        self._loaded_at = time.monotonic()
+        logger.info(f"Снимок БД загружен: {len(snapshot)} строк, поколение {snapshot.generation}, "
+                    f"{snapshot.load_seconds} с")
+        return snapshot
+    
+    def _read_generation(self) -> int:
+        conn = self._connect()
+        try:
+            return read_generation(conn.cursor())
+        finally:
+            conn.close()
+    
+    def reload(self, force: bool = False) -> bool:
+        """
+        Перезагружает снимок, если парсер опубликовал новое поколение БД.
+        
+        Returns:
+            bool: True, если снимок был подменен
+        """
+        with self._reload_lock:
+            if not force and self._read_generation() == self._snapshot.generation:
+                return False
+            self._snapshot = self._load()
+            return True
+    
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            # Пока парсер пишет пакеты, поколение растет каждые несколько секунд:
+            # снимок перестраивается не чаще SNAPSHOT_MIN_RELOAD_INTERVAL
+            if time.monotonic() - self._loaded_at < config.SNAPSHOT_MIN_RELOAD_INTERVAL:
+                continue
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Ошибка обновления снимка БД: {e}")
+    
+    @property
+    def generation(self) -> int:
+        return self._snapshot.generation
+    
+    def get_snapshot_stats(self) -> dict:
+        """Параметры текущего снимка"""
+        snapshot = self._snapshot
+        return {
+            'generation': snapshot.generation,
+            'rows': len(snapshot),
+            'words': len(snapshot.words.keys),
+            'distinct_questions': len(snapshot.distinct_questions),
+            'load_seconds': snapshot.load_seconds,
+        }
+    
+    def close(self):
+        """Останавливает фоновый поток и закрывает соединения ZinDatabase"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+        self._db.close()
+    
+    def serves_from_snapshot(self, name: str) -> bool:
+        """Выполняется ли метод на снимке в памяти (остальные передаются в ZinDatabase)"""
+        return name in vars(SnapshotDatabase) and not name.startswith('_')
+    
+    def __getattr__(self, name):
+        # Остальные методы (HTML тестов, search_semantic, статистика пула) - из ZinDatabase
+        return getattr(self._db, name)
+    
+    @instrumented
+    def search_questions(self, query: str, limit: int = 20) -> List[Tuple]:
+        """Полнотекстовый поиск (см. ZinDatabase.search_questions)"""
+        tokens = index_tokens(normalize_text(query))
+        if not tokens:
+            return []
+        snapshot = self._snapshot
+        return snapshot.top_rows(*snapshot.match([tokens]), limit)
+    
+    @instrumented
+    def search_by_keywords(self, keywords: List[str], limit: int = 20) -> List[Tuple]:
+        """Поиск по всем ключевым словам (см. ZinDatabase.search_by_keywords)"""
+        groups = [tokens for tokens in (index_tokens(normalize_text(keyword)) for keyword in keywords or []) if tokens]
+        if not groups:
+            return []
+        snapshot = self._snapshot
+        return snapshot.top_rows(*snapshot.match(groups), limit)
+    
+    @instrumented
+    def search_by_any_keywords(self, keywords: List[str], limit: int = 20) -> List[Tuple]:
+        """Поиск по любому из ключевых слов (см. ZinDatabase.search_by_any_keywords)"""
+        groups = [tokens for tokens in (index_tokens(normalize_text(keyword)) for keyword in keywords or []) if tokens]
+        if not groups:
+            return []
+        snapshot = self._snapshot
+        return snapshot.top_rows(*snapshot.match(groups, any_group=True), limit)
+    
+    @instrumented
+    def search_fuzzy(self, query: str, limit: int = 20) -> List[Tuple]:
+        """
+        Нечеткий поиск по триграммам (см. ZinDatabase.search_fuzzy)
+        
+        Кандидаты отбираются тем же bm25, что у tests_trigram, и
+        ранжируются так же, как в ZinDatabase.
+        """
+        query_trigrams = sorted(text_trigrams(query))
+        if not query_trigrams:
+            return self.search_questions(query, limit)
+        if len(query_trigrams) > FUZZY_MAX_TRIGRAMS:
+            step = len(query_trigrams) / FUZZY_MAX_TRIGRAMS
+            match_trigrams = [query_trigrams[int(i * step)] for i in range(FUZZY_MAX_TRIGRAMS)]
+        else:
+            match_trigrams = query_trigrams
+        
+        snapshot = self._snapshot
+        query_set = set(query_trigrams)
+        question_sets: Dict[str, set] = {}
+        scored = []
+        for index in snapshot.fuzzy_candidates(match_trigrams, limit * FUZZY_CANDIDATE_FACTOR):
+            question = snapshot.questions[index]
+            if question not in question_sets:
+                question_sets[question] = text_trigrams(question)
+            question_set = question_sets[question]
+            common = len(query_set & question_set)
+            scored.append((-common / len(query_set), -common / len(query_set | question_set),
+                           int(snapshot.test_ids[index]), index))
+        scored.sort(key=lambda item: item[:3])
+        return [snapshot.row(item[3]).as_tuple() for item in scored[:limit]]
+    
+    @instrumented
+    def search_unique_questions(self, query: str, limit: int = 20) -> List[Tuple]:
+        """Поиск с объединением одинаковых вопросов (см. ZinDatabase.search_unique_questions)"""
+        tokens = index_tokens(normalize_text(query))
+        if not tokens:
+            return []
+        snapshot = self._snapshot
+        rows, scores = snapshot.ranked(*snapshot.match([tokens]))
+        
+        # Оценка вопроса - лучшая среди его строк, то есть первая в порядке убывания
+        question_ids = snapshot.question_ids[rows]
+        _, first = np.unique(question_ids, return_index=True)
+        best = first[np.lexsort((question_ids[first], -scores[first]))][:limit]
+        
+        result = []
+        for question_id in question_ids[best].tolist():
+            question_rows = snapshot.question_rows(question_id)
+            answers: Dict[str, list] = {}
+            for index in question_rows.tolist():
+                answer = snapshot.answers[index]
+                entry = answers.setdefault(normalize_text(answer), [answer, 0])
+                entry[0] = min(entry[0], answer)
+                entry[1] += 1
+            ordered = sorted(answers.values(), key=lambda item: (-item[1], item[0]))
+            result.append((question_id, snapshot.questions[question_rows[0]], len(question_rows),
+                           [answer for answer, _ in ordered]))
+        return result
+    
+    @instrumented
+    def get_test_by_id(self, test_id: int) -> List[Tuple]:
+        """Вопросы теста (см. ZinDatabase.get_test_by_id)"""
+        snapshot = self._snapshot
+        return [snapshot.row(index).as_tuple() for index in snapshot.test_rows(test_id)
+                if snapshot.questions[index]]
+    
+    @instrumented
+    def get_random_questions(self, count: int = 5, seed: Optional[int] = None) -> List[Tuple]:
+        """Случайные вопросы (см. ZinDatabase.get_random_questions)"""
+        snapshot = self._snapshot
+        if count <= 0 or not len(snapshot.eligible):
+            return []
+        sample = random.Random(seed).sample(range(len(snapshot.eligible)), min(count, len(snapshot.eligible)))
+        return [snapshot.row(snapshot.eligible[i]).as_tuple() for i in sample]
+    
+    @instrumented
+    def get_statistics(self) -> dict:
+        """Статистика базы (см. ZinDatabase.get_statistics)"""
+        return dict(self._snapshot.stats)
+    
+    @instrumented
+    def get_tests_count_by_date(self) -> List[Tuple]:
+        """Количество тестов по датам добавления (см. ZinDatabase.get_tests_count_by_date)"""
+        return sorted(self._snapshot.daily.items(), reverse=True)[:30]
+    
+    @instrumented
+    def get_similar_questions(self, test_id: int, question_idx: int, limit: int = 20) -> List[Tuple]:
+        """Похожие вопросы из кластера (см. ZinDatabase.get_similar_questions)"""
+        snapshot = self._snapshot
+        source = next((index for index in snapshot.test_rows(test_id)
+                       if snapshot.question_idxs[index] == question_idx), None)
+        if source is None:
+            return []
+        question_id = int(snapshot.question_ids[source])
+        cluster_id = snapshot.cluster_of.get(question_id)
+        if not question_id or cluster_id is None:
+            return []
+        
+        rows = []
+        for member in snapshot.cluster_members[cluster_id]:
+            for index in snapshot.question_rows(member).tolist():
+                if index != source:
+                    rows.append((member != question_id, int(snapshot.test_ids[index]),
+                                 int(snapshot.question_idxs[index]), index))
+        rows.sort()
+        return [snapshot.row(item[3]).as_tuple() for item in rows[:limit]]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""Общие настройки модульных тестов: путь к модулям проекта и импорт модулей с логом в файл"""
+
+import os
+import sys
+import importlib
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def import_quietly(tmp_path_factory):
+    """
+    Импорт модуля, который при импорте открывает лог в текущем каталоге
+    (downloader.log, html_parser.log): лог создается во временном каталоге.
+    """
+    log_dir = tmp_path_factory.mktemp("logs")
+    
+    def load(name):
+        cwd = os.getcwd()
+        os.chdir(log_dir)
+        try:
+            return importlib.import_module(name)
+        finally:
+            os.chdir(cwd)
+    
+    return load
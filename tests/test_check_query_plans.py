@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""Проверка планов запросов (check_query_plans.py)"""
+
+import pytest
+
+# Проход по частичному индексу почти всех строк с вопросами
+SCAN_WITH_QUESTION = "SELECT test_id FROM tests WHERE question != '' ORDER BY test_id"
+
+
+@pytest.fixture(scope="module")
+def check_query_plans(import_quietly):
+    return import_quietly("check_query_plans")
+
+
+@pytest.fixture(scope="module")
+def db_path(check_query_plans, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("plans") / "plans.db")
+    check_query_plans.build_sample_db(path)
+    return path
+
+
+def test_current_queries_pass(check_query_plans, db_path):
+    statements = check_query_plans.run_queries(db_path)
+    assert check_query_plans.check_plans(db_path, statements) == 0
+
+
+def test_partial_index_scan_allowed_only_for_listed_methods(check_query_plans, db_path):
+    assert check_query_plans.check_plans(db_path, [("get_random_questions", SCAN_WITH_QUESTION)]) == 0
+    assert check_query_plans.check_plans(db_path, [("get_test_by_id", SCAN_WITH_QUESTION)]) == 1
+    assert check_query_plans.check_plans(db_path, [("load_parse_state", SCAN_WITH_QUESTION)]) == 1
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""Кластеризация похожих вопросов (clustering.py)"""
+
+import sqlite3
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture(scope="module")
+def clustering(import_quietly):
+    return import_quietly("clustering")
+
+
+def test_similar_pair_in_shared_bucket(clustering):
+    """
+    Вопросы 1 и 2 совпадают в 8 из 9 позиций, но делят полосу только с
+    непохожим вопросом 0 - пара все равно объединяется
+    """
+    signatures = np.array([
+        [1, 1, 1, 1, 10, 11, 12, 13, 14],
+        [1, 1, 1, 1, 20, 21, 22, 23, 24],
+        [1, 1, 1, 1, 20, 21, 22, 99, 24],
+    ], dtype=np.uint32)
+    clusters, stats = clustering.cluster_signatures(signatures, bands=2, threshold=0.8)
+    assert clusters.find(1) == clusters.find(2)
+    assert clusters.find(0) != clusters.find(1)
+    assert stats['merged_pairs'] == 1
+
+
+def test_near_duplicates_recall(clustering):
+    """Перестановка и опечатка в формулировке не мешают найти все пары"""
+    base = [f"Какое значение имеет параметр номер {number} в законе Ома для полной цепи" for number in range(30)]
+    variants = [text.replace("Какое значение", "Какое же значение") for text in base]
+    hasher = clustering.MinHasher()
+    signatures = hasher.signatures([clustering.shingles(text) for text in base + variants])
+    clusters, _ = clustering.cluster_signatures(signatures, threshold=0.5)
+    found = sum(clusters.find(i) == clusters.find(i + len(base)) for i in range(len(base)))
+    assert found == len(base)
+
+
+def test_build_clusters_bumps_generation(clustering, import_quietly):
+    html_parser = import_quietly("html_parser")
+    conn = sqlite3.connect(":memory:")
+    html_parser.init_db(conn)
+    for test_id in range(1, 4):
+        html_parser.save_test_to_db(conn, test_id, [{"question": f"Закон Ома, вопрос {test_id}", "answer": "U = IR"}],
+                                    None, f"test_{test_id}.html")
+    html_parser.rebuild_questions(conn)
+    
+    def generation():
+        return int(conn.execute("SELECT value FROM db_meta WHERE key = 'generation'").fetchone()[0])
+    
+    before = generation()
+    clustering.build_clusters(conn)
+    assert generation() == before + 1
+    assert conn.execute("SELECT COUNT(*) FROM question_clusters").fetchone()[0] == 3
+    conn.close()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""Кэш результатов поиска ZinDatabase (cached_query)"""
+
+import sqlite3
+import pytest
+
+import config
+
+
+@pytest.fixture
+def db(tmp_path, import_quietly):
+    html_parser = import_quietly("html_parser")
+    import database
+    
+    path = str(tmp_path / "tests.db")
+    conn = sqlite3.connect(path)
+    html_parser.init_db(conn)
+    for test_id in range(config.START_ID, config.START_ID + 5):
+        questions = [{"question": "Закон Ома для участка цепи", "answer": f"Ответ {test_id}"}]
+        html_parser.save_test_to_db(conn, test_id, questions, "<html></html>", f"test_{test_id}.html")
+    conn.close()
+    
+    db = database.ZinDatabase(path, cache=True)
+    yield db
+    db.close()
+
+
+def test_cached_rows_are_not_shared(db):
+    """Изменение результата вызывающим не влияет на кэш и на другие попадания"""
+    first = db.search_unique_questions("закон ома")
+    expected = [(row[0], row[1], row[2], list(row[3])) for row in first]
+    first[0][3].append("чужой ответ")
+    first.clear()
+    
+    second = db.search_unique_questions("закон ома")
+    assert second == expected
+    second[0][3].clear()
+    
+    assert db.search_unique_questions("закон ома") == expected
+    assert db.cache.stats()["hits"] == 2
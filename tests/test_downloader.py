@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""Журнал скачивания, TokenBucket и AdaptiveBackoff (downloader.py)"""
+
+import os
+import asyncio
+import pytest
+
+import config
+
+
+@pytest.fixture
+def downloader(import_quietly):
+    return import_quietly("downloader")
+
+
+def overload(downloader, workers):
+    """workers запросов в работе одновременно получают 429"""
+    async def run():
+        bucket = downloader.TokenBucket(16.0, capacity=workers)
+        backoff = downloader.AdaptiveBackoff(bucket)
+        
+        async def request():
+            await bucket.acquire()
+            await asyncio.sleep(0)
+            backoff.on_server_error(429)
+        
+        await asyncio.gather(*(request() for _ in range(workers)))
+        return bucket, backoff
+    
+    return asyncio.run(run())
+
+
+def test_concurrent_errors_back_off_once(downloader):
+    bucket, backoff = overload(downloader, 8)
+    assert bucket.rate == 8.0
+    assert backoff.consecutive_errors == 1
+    assert bucket.paused_until - downloader.time.monotonic() == pytest.approx(5.0, abs=0.5)
+
+
+def test_error_after_pause_backs_off_again(downloader):
+    bucket, backoff = overload(downloader, 4)
+    bucket.paused_until = 0.0
+    backoff.on_server_error(503)
+    assert bucket.rate == 4.0
+    assert backoff.consecutive_errors == 2
+    assert bucket.paused_until - downloader.time.monotonic() == pytest.approx(10.0, abs=0.5)
+
+
+def test_rate_limits(downloader):
+    bucket = downloader.TokenBucket(16.0)
+    backoff = downloader.AdaptiveBackoff(bucket, recovery_after=2)
+    for _ in range(10):
+        bucket.paused_until = 0.0
+        backoff.on_server_error(429)
+    assert bucket.rate == backoff.min_rate == 1.0
+    assert bucket.paused_until - downloader.time.monotonic() <= backoff.max_pause
+    
+    for _ in range(100):
+        backoff.on_success()
+    assert bucket.rate == backoff.max_rate == 16.0
+    assert backoff.consecutive_errors == 0
+
+
+def test_recovery_is_gradual(downloader):
+    bucket = downloader.TokenBucket(16.0)
+    backoff = downloader.AdaptiveBackoff(bucket, recovery_after=3)
+    backoff.on_server_error(429)
+    assert bucket.rate == 8.0
+    
+    for _ in range(2):
+        backoff.on_success()
+    assert bucket.rate == 8.0
+    backoff.on_success()
+    assert bucket.rate == 10.0
+
+
+@pytest.fixture
+def journal_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "HTML_STORAGE_DIR", str(tmp_path))
+    return str(tmp_path / "download_journal.jsonl")
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_journal_replay(downloader, journal_path):
+    journal = downloader.DownloadJournal(journal_path)
+    journal.record_failure(1, "timeout", None)
+    journal.record_success(2, 200, 100)
+    journal.record_success(1, 200, 120)
+    journal.record_failure(3, "HTTP 404", 404)
+    journal.set_last_processed(3)
+    journal.close()
+    
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"id": 4, "ok": tr')  # недописанная строка после сбоя
+    
+    replayed = downloader.DownloadJournal(journal_path)
+    assert replayed.downloaded == {1, 2}
+    assert replayed.failed == {3}
+    assert replayed.last_processed == 3
+    replayed.close()
+
+
+def test_journal_compact(downloader, journal_path):
+    journal = downloader.DownloadJournal(journal_path)
+    for attempt in range(3):
+        for test_id in range(1, 6):
+            if attempt < 2 and test_id % 2:
+                journal.record_failure(test_id, "timeout", None)
+            else:
+                journal.record_success(test_id, 200, attempt)
+        journal.set_last_processed(5)
+        journal.checkpoint()
+    journal.compact()
+    
+    lines = read_lines(journal_path)
+    assert len(lines) == 6
+    assert lines[-1] == '{"last_processed":5}'
+    assert not os.path.exists(journal_path + ".tmp")
+    
+    # После сжатия журнал открыт для дозаписи и проигрывается в то же состояние
+    journal.record_failure(6, "HTTP 500", 500)
+    journal.set_last_processed(6)
+    journal.close()
+    replayed = downloader.DownloadJournal(journal_path)
+    assert replayed.downloaded == {1, 2, 3, 4, 5}
+    assert replayed.failed == {6}
+    assert replayed.last_processed == 6
+    replayed.close()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""Инкрементальная выгрузка tests (export.py --since)"""
+
+import json
+import sqlite3
+import pytest
+
+import export
+
+FIRST_RUN = "2024-09-01T10:00:00+00:00"
+SECOND_RUN = "2024-09-02T10:00:00+00:00"
+
+
+@pytest.fixture
+def db_path(tmp_path, import_quietly):
+    html_parser = import_quietly("html_parser")
+    path = str(tmp_path / "tests.db")
+    conn = sqlite3.connect(path)
+    html_parser.init_db(conn)
+    for test_id in range(1, 7):
+        questions = [{"question": f"Вопрос {test_id}.{idx}", "answer": f"Ответ {idx}"} for idx in range(2)]
+        html_parser.save_test_to_db(conn, test_id, questions, None, f"test_{test_id}.html")
+    conn.execute("UPDATE tests SET parsed_at = CASE WHEN test_id <= 4 THEN ? ELSE ? END", (FIRST_RUN, SECOND_RUN))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_since_exports_only_newer_rows(db_path, tmp_path):
+    output = str(tmp_path / "new.jsonl")
+    result = export.export(output, since=FIRST_RUN, db_path=db_path)
+    rows = read_jsonl(output)
+    assert result["rows"] == 4
+    assert result["max_parsed_at"] == SECOND_RUN
+    assert [(row["test_id"], row["question_idx"]) for row in rows] == [(5, 0), (5, 1), (6, 0), (6, 1)]
+
+
+def test_since_chain(db_path, tmp_path):
+    """max_parsed_at полной выгрузки, переданный в --since, дает пустую выгрузку"""
+    full = export.export(str(tmp_path / "full.jsonl"), db_path=db_path, chunk_size=3)
+    assert full["rows"] == 12
+    assert full["max_parsed_at"] == SECOND_RUN
+    
+    again = export.export(str(tmp_path / "again.jsonl"), since=full["max_parsed_at"], db_path=db_path)
+    assert again["rows"] == 0
+    assert again["max_parsed_at"] == SECOND_RUN
+    assert read_jsonl(str(tmp_path / "again.jsonl")) == []
+
+
+def test_since_parquet_metadata(db_path, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = str(tmp_path / "new.parquet")
+    export.export(output, since=FIRST_RUN, db_path=db_path)
+    metadata = pq.read_metadata(output).metadata
+    assert metadata[b"since"].decode() == FIRST_RUN
+    assert metadata[b"max_parsed_at"].decode() == SECOND_RUN
+    assert pq.read_table(output).column("test_id").to_pylist() == [5, 5, 6, 6]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""Инкрементальный перепарсинг (html_parser.main)"""
+
+import pytest
+
+import config
+import html_store
+
+PAGE = '<html><body><div class="question">Вопрос {}</div></body></html>'
+
+
+@pytest.fixture
+def html_parser(import_quietly):
+    return import_quietly("html_parser")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DB_PATH", str(tmp_path / "tests.db"))
+    monkeypatch.setattr(config, "HTML_STORAGE_BACKEND", "files")
+    monkeypatch.setattr(config, "HTML_STORAGE_DIR", str(tmp_path / "html_files"))
+    monkeypatch.setattr(config, "PARSE_CHECK_CONTENT_HASH", True)
+    monkeypatch.setattr(html_store, "_stores", {})
+    (tmp_path / "html_files").mkdir()
+    store = html_store.get_html_store()
+    for test_id in range(1, 11):
+        store.save(test_id, PAGE.format(test_id))
+    return store
+
+
+@pytest.fixture
+def loads(store, monkeypatch):
+    """ID страниц, прочитанных из хранилища"""
+    loaded = []
+    load = store.load
+    monkeypatch.setattr(store, "load", lambda test_id: loaded.append(test_id) or load(test_id))
+    return loaded
+
+
+def test_unchanged_pages_are_not_read(html_parser, store, loads):
+    html_parser.main()
+    assert sorted(loads) == list(range(1, 11))
+    
+    loads.clear()
+    html_parser.main()
+    assert loads == []
+
+
+def test_changed_pages_are_reread(html_parser, store, loads):
+    html_parser.main()
+    store.save(3, PAGE.format("измененный"))
+    
+    loads.clear()
+    html_parser.main()
+    assert loads == [3]
+    
+    loads.clear()
+    html_parser.main()
+    assert loads == []
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""Хранилища HTML страниц (html_store.py)"""
+
+import os
+import threading
+import pytest
+
+import html_store
+
+PAGE = "<html><body>" + "Вопрос и ответ " * 200 + "</body></html>"
+
+
+@pytest.fixture
+def pack(tmp_path):
+    return html_store.PackHtmlStore(str(tmp_path / "pages.db"))
+
+
+def test_file_path_concurrent_readers(pack):
+    """Потоки, выгружающие одну страницу, всегда читают файл целиком"""
+    pack.save(7, PAGE)
+    errors = []
+    
+    def export():
+        for _ in range(20):
+            with open(pack.file_path(7), encoding="utf-8") as f:
+                if f.read() != PAGE:
+                    errors.append(7)
+    
+    threads = [threading.Thread(target=export) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    directory = os.path.dirname(pack.file_path(7))
+    assert errors == []
+    assert not [name for name in os.listdir(directory) if name.startswith("test_7.") and name.endswith(".tmp")]
+
+
+def test_file_path_missing_page(pack):
+    assert pack.file_path(404) is None
+
+
+def test_file_signatures(tmp_path):
+    store = html_store.FileHtmlStore(str(tmp_path))
+    store.save(1, PAGE)
+    store.save(2, PAGE)
+    (tmp_path / "notes.txt").write_text("не страница")
+    before = store.signatures()
+    assert sorted(before) == [1, 2]
+    
+    store.save(2, PAGE + "<!-- изменено -->")
+    after = store.signatures()
+    assert after[1] == before[1]
+    assert after[2] != before[2]
+
+
+def test_pack_signatures(pack):
+    pack.save(1, PAGE)
+    pack.save(2, PAGE)
+    before = pack.signatures()
+    assert before[1] == before[2]
+    
+    pack.save(2, PAGE + "<!-- изменено -->")
+    pack.save(1, PAGE)
+    after = pack.signatures()
+    assert after[1] == before[1]
+    assert after[2] != before[2]
+
+
+def test_pack_signatures_without_hashes(pack):
+    """Страницы, сохраненные до появления page_hashes, получают сигнатуру до перезаписи"""
+    pack.save(1, PAGE)
+    pack.commit()
+    pack._conn().execute("DELETE FROM page_hashes")
+    legacy = pack.signatures()
+    assert legacy == pack.signatures()
+    
+    pack.save(1, PAGE)
+    assert pack.signatures() != legacy
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd", "zstd-dict"])
+def test_pack_codec_round_trip(pack, codec, monkeypatch):
+    if codec != "zlib":
+        pytest.importorskip("zstandard")
+    if codec == "zstd-dict":
+        pack.train_dictionary([PAGE.replace("Вопрос", f"Вопрос {number}") for number in range(200)])
+    elif codec == "zlib":
+        monkeypatch.setattr(html_store, "zstandard", None)
+    
+    pages = {test_id: PAGE.replace("ответ", f"ответ {test_id} ё й ✓") for test_id in range(1, 6)}
+    for test_id, html in pages.items():
+        pack.save(test_id, html)
+    
+    codecs = {row[0] for row in pack._conn().execute("SELECT codec FROM pages")}
+    assert {value.split(":")[0] for value in codecs} == {codec}
+    assert {test_id: pack.load(test_id) for test_id in pages} == pages
+    assert dict(pack.iter_pages()) == pages
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Нормализация текста вопросов и ответов для поиска.
+
+Одна и та же функция используется парсером при заполнении колонок
+question_norm/answer_norm и ZinDatabase при разборе запроса, поэтому
+текст в БД и текст запроса всегда приводятся к одному виду.
+"""
+
+import re
+import hashlib
+
+PUNCTUATION_RE = re.compile(r'[\W_]+')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Приводит текст к виду для сравнения и поиска.
+    
+    Регистр сворачивается через str.casefold (в отличие от LOWER() в
+    SQLite работает и для кириллицы), ё заменяется на е, знаки препинания
+    и прочие символы, кроме букв и цифр, заменяются пробелами, пробелы
+    схлопываются.
+    
+    Пример: "Что такое  Ёмкость?" -> "что такое емкость"
+    """
+    if not text:
+        return ""
+    text = text.casefold().replace("ё", "е")
+    return PUNCTUATION_RE.sub(" ", text).strip()
+
+
+def question_hash(normalized: str):
+    """
+    Ключ вопроса в таблице questions: 64-битный хеш нормализованного текста
+    (знаковое целое, чтобы поместиться в INTEGER SQLite). Для пустого
+    текста возвращает None.
+    """
+    if not normalized:
+        return None
+    digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)